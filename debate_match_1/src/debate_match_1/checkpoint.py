@@ -0,0 +1,45 @@
+# 辩论检查点
+# 每场辩论一个JSONL：第一行记录辩题等基本信息，之后每完成一轮追加一行（双方发言、裁判评判、轮末血量）。
+# 中途出错时从最后一个完整的轮次继续，已完成轮次的发言和评判不再重新生成
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class DebateCheckpoint:
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """读取 (基本信息, 已完成的轮次)；写到一半的最后一行直接忽略"""
+        if not os.path.exists(self.path):
+            return None, []
+        header, rounds = None, []
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get("type") == "header":
+                    header = record
+                elif record.get("type") == "round":
+                    rounds.append(record)
+        return header, rounds
+
+    def start(self, topic: str, **info: Any) -> None:
+        self._append({"type": "header", "topic": topic, **info}, mode="w")
+
+    def save_round(self, round_no: int, **record: Any) -> None:
+        self._append({"type": "round", "round": round_no, **record})
+
+    def _append(self, record: Dict[str, Any], mode: str = "a") -> None:
+        # 每轮的LLM输出都是花钱买来的，写完立即落盘
+        with open(self.path, mode, encoding="utf-8") as file:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
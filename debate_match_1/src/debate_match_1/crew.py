@@ -2,9 +2,18 @@ from crewai import Agent, Task, Crew, Process
 from crewai.project import CrewBase, agent, crew
 from crewai.tools import BaseTool
 from random import randint
-from typing import Type, Optional
-from dataclasses import dataclass
+from typing import Any, Type, Optional, Dict, List
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pydantic import BaseModel, Field
+from debate_match_1.checkpoint import DebateCheckpoint
+from debate_match_1.debate_context import DebateContext, estimate_tokens
+from debate_match_1.judges import JudgePanel, MEDIAN, batch_prompt, parse_batch_scores
+import statistics
 # from deprecated import deprecated
 
 # @deprecated
@@ -30,31 +39,72 @@ class DebateCrew:
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
     
-    def __init__(self, max_rounds: int = 5):
+    def __init__(self, max_rounds: int = 5, player_a_config: Optional[Dict[str, Any]] = None,
+                 player_b_config: Optional[Dict[str, Any]] = None, verbose: bool = True,
+                 pipelined: bool = False, transcript_dir: str = "transcripts", context_tokens: int = 1500,
+                 judge_panel: Optional[List[Dict[str, Any]]] = None, judge_aggregate: str = MEDIAN,
+                 batch_judging: bool = False, checkpoint_dir: Optional[str] = "checkpoints"):
+        """
+        Args:
+            player_a_config / player_b_config: 覆盖agents.yaml中正反方的配置（如llm），用于比较不同模型
+            verbose: 关闭后不打印过程信息（并发跑大量辩论时使用）
+            pipelined: 裁判评判与下一段发言同时进行，血量仍按发言顺序结算
+            transcript_dir: 完整发言记录的保存目录，每场辩论一个JSONL
+            context_tokens: 发言提示词中辩论进程摘要与对手发言的token预算
+            judge_panel: 裁判团，每项覆盖agents.yaml中panel_judge的配置（如llm）；不传时使用单个judge
+            judge_aggregate: 裁判团打分的聚合方式，median 或 trimmed_mean
+            batch_judging: 一轮双方发言完成后一次请求评判两段发言，伤害仍按正方、反方的顺序结算
+            checkpoint_dir: 每轮结束后保存检查点的目录，None表示不保存
+        """
         self.max_rounds = max_rounds
+        self.player_a_config = player_a_config or {}
+        self.player_b_config = player_b_config or {}
+        self.verbose = verbose
         self.current_round = 1
         self.hp_A = 100
         self.hp_B = 100
+        # 单agent crew缓存：agent.role -> crew，轮次之间只替换任务
+        self._crews: Dict[str, Crew] = {}
+        self._crews_lock = threading.Lock() # 流水线模式下裁判在工作线程中取crew
+        self.crew_build_seconds = 0.0
+        self.crew_reuse_count = 0
+        self.pipelined = pipelined
+        self.round_seconds: List[float] = []
+        self.discarded_speeches = 0 # 流水线模式下提前生成、但比赛已结束而丢弃的发言
+        self.transcript_dir = transcript_dir
+        self.context_tokens = context_tokens
+        self.context: Optional[DebateContext] = None
+        self._speech_usage: Dict[str, tuple] = {} # agent.role -> 累计的 (prompt_tokens, cached_prompt_tokens)
+        self.judge_panel_config = judge_panel
+        self.judge_aggregate = judge_aggregate
+        self.batch_judging = batch_judging
+        self._judge_panel: Optional[JudgePanel] = None
+        self.judge_requests = 0 # 单裁判模式的评判请求数
+        self.judge_seconds: List[float] = [] # 单裁判模式每次评判请求的耗时
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint: Optional[DebateCheckpoint] = None
+        self.debate_id: Optional[str] = None
+        self.resumed_rounds = 0 # 从检查点恢复的轮次数
 
     @agent
     def judge(self) -> Agent:
         return Agent(
             config=self.agents_config['judge'],
-            verbose=True
+            verbose=self.verbose
         )
 
     @agent
     def player_a(self) -> Agent:
         return Agent(
-            config=self.agents_config['player_a'],
-            verbose=True
+            config={**self.agents_config['player_a'], **self.player_a_config},
+            verbose=self.verbose
         )
 
     @agent
     def player_b(self) -> Agent:
         return Agent(
-            config=self.agents_config['player_b'],
-            verbose=True
+            config={**self.agents_config['player_b'], **self.player_b_config},
+            verbose=self.verbose
         )
 
     @crew
@@ -71,86 +121,323 @@ class DebateCrew:
             agents=[self.judge(), self.player_a(), self.player_b()],
             tasks=[simple_task],
             process=Process.sequential,
-            verbose=True
+            verbose=self.verbose
         )
 
-    def run_debate(self, topic: str):
-        self._print_agent_info() 
-        """运行辩论流程"""
-        print(f"=== 辩论开始：{topic} ===")
-        print(f"正方(A)血量: {self.hp_A}, 反方(B)血量: {self.hp_B}")
+    def run_debate(self, topic: str, debate_id: Optional[str] = None):
+        """
+        运行辩论流程
+        Args:
+            debate_id: 辩论id，决定检查点和发言记录的文件名；该id已有检查点时从最后一个完整的轮次继续
+        """
+        if self.verbose:
+            self._print_agent_info()
+        self.debate_id = debate_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        header, rounds = None, []
+        if self.checkpoint_dir:
+            self.checkpoint = DebateCheckpoint(os.path.join(self.checkpoint_dir, f"{self.debate_id}.jsonl"))
+            header, rounds = self.checkpoint.load()
+        if header is not None and header["topic"] != topic:
+            raise ValueError(f"检查点 {self.debate_id} 的辩题是'{header['topic']}'，与'{topic}'不一致")
+        transcript_path = header["transcript_path"] if header else os.path.join(self.transcript_dir, f"{self.debate_id}.jsonl")
+        self.context = DebateContext(topic, transcript_path, token_budget=self.context_tokens)
+        if header is None and self.checkpoint is not None:
+            self.checkpoint.start(topic, transcript_path=transcript_path, max_rounds=self.max_rounds)
+        self._log(f"=== 辩论开始：{topic} ===")
+        self._log(f"正方(A)血量: {self.hp_A}, 反方(B)血量: {self.hp_B}")
+        if rounds:
+            self._restore_rounds(rounds)
         
-        while self.current_round <= self.max_rounds and self.hp_A > 0 and self.hp_B > 0:
-            print(f"\n--- 第 {self.current_round} 轮 ---")
+        if self.pipelined:
+            self._run_rounds_pipelined(topic)
+            return self._determine_winner()
+
+        while self._debate_continues():
+            self._log(f"\n--- 第 {self.current_round} 轮 ---")
+            start_time = time.perf_counter()
             
             # 正方发言
-            speech_a = self._get_speech(self.player_a(), topic, "正方", self.hp_A, self.hp_B)
-            # print(f"正方发言: {speech_a}")
+            speech_a = self._get_speech(self.player_a(), "正方", self.current_round)
+            self._record_speech(speech_a)
+            # print(f"正方发言: {speech_a.text}")
             
             # 裁判评判正方发言
-            summary_a = self._judge_speech(topic, speech_a)
-            self.hp_B -= summary_a.damage
-            print(
-                f"正方造成 {summary_a.damage} 点伤害，反方剩余血量: {self.hp_B}；评判理由：{summary_a.rationale}"
-            )
+            if not self.batch_judging:
+                summary_a = self._judge_speeches(topic, [speech_a.text])[0]
+                self._apply_judgement("正方", summary_a)
             
             # 反方发言
-            speech_b = self._get_speech(self.player_b(), topic, "反方", self.hp_B, self.hp_A)
-            # print(f"反方发言: {speech_b}")
+            speech_b = self._get_speech(self.player_b(), "反方", self.current_round)
+            self._record_speech(speech_b)
+            # print(f"反方发言: {speech_b.text}")
             
-            # 裁判评判反方发言
-            summary_b = self._judge_speech(topic, speech_b)
-            self.hp_A -= summary_b.damage
-            print(
-                f"反方造成 {summary_b.damage} 点伤害，正方剩余血量: {self.hp_A}；评判理由：{summary_b.rationale}"
-            )
+            # 裁判评判反方发言（批量评判时一起评判双方）
+            if self.batch_judging:
+                summary_a, summary_b = self._judge_speeches(topic, [speech_a.text, speech_b.text])
+                self._apply_judgement("正方", summary_a)
+            else:
+                summary_b = self._judge_speeches(topic, [speech_b.text])[0]
+            self._apply_judgement("反方", summary_b)
+            self.round_seconds.append(time.perf_counter() - start_time)
+            self._save_round(speech_a, speech_b, summary_a, summary_b)
             
-            if self.hp_A <= 0 and self.hp_A < self.hp_B:
-                print("反方获胜！")
-                break
-
-            if self.hp_B <= 0 and self.hp_B < self.hp_A:
-                print("正方获胜！")
+            if self._round_ends_debate():
                 break
             
             self.current_round += 1
         
         return self._determine_winner()
 
-    def _get_speech(self, agent: Agent, topic: str, side: str, own_hp: int, opponent_hp: int) -> str:
-        """获取辞手发言"""
+    def _run_rounds_pipelined(self, topic: str) -> None:
+        """
+        流水线轮次：反方发言不依赖裁判对正方的评判，只有血量依赖，所以
+        评判正方与反方发言同时进行，评判反方与下一轮正方发言同时进行。
+        伤害仍按 正方 -> 反方 的顺序结算，每轮结束时的胜负判定与串行模式一致；
+        本轮分出胜负时，提前生成的下一轮正方发言直接丢弃。
+        发言都在主线程记录进上下文，下一段发言总是在上一段记录之后才开始生成
+        """
+        # 在主线程构建agent和crew，工作线程只复用
+        for ag in (self.player_a(), self.player_b(), self.judge()):
+            self._get_crew(ag)
+        if self.judge_panel_config:
+            self._panel()
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="debate-pipeline")
+        speech_a: Optional[Future] = None
+        try:
+            if self._debate_continues():
+                speech_a = executor.submit(self._get_speech, self.player_a(), "正方", self.current_round)
+            while speech_a is not None:
+                self._log(f"\n--- 第 {self.current_round} 轮 ---")
+                start_time = time.perf_counter()
+
+                round_a = speech_a.result()
+                self._record_speech(round_a)
+                judge_a = None
+                if not self.batch_judging:
+                    judge_a = executor.submit(self._judge_speeches, topic, [round_a.text])
+                speech_b = executor.submit(self._get_speech, self.player_b(), "反方", self.current_round)
+                if judge_a is not None:
+                    summary_a = judge_a.result()[0]
+                    self._apply_judgement("正方", summary_a)
+
+                round_b = speech_b.result()
+                self._record_speech(round_b)
+                speeches = [round_a.text, round_b.text] if self.batch_judging else [round_b.text]
+                judge_b = executor.submit(self._judge_speeches, topic, speeches)
+                speech_a = None
+                if self.current_round < self.max_rounds:
+                    speech_a = executor.submit(self._get_speech, self.player_a(), "正方", self.current_round + 1)
+                summaries = judge_b.result()
+                if self.batch_judging:
+                    summary_a = summaries[0]
+                    self._apply_judgement("正方", summary_a)
+                summary_b = summaries[-1]
+                self._apply_judgement("反方", summary_b)
+                self.round_seconds.append(time.perf_counter() - start_time)
+                self._save_round(round_a, round_b, summary_a, summary_b)
+
+                if self._round_ends_debate():
+                    ended = True
+                else:
+                    self.current_round += 1
+                    ended = not self._debate_continues()
+                if ended and speech_a is not None:
+                    speech_a.cancel()
+                    speech_a = None
+                    self.discarded_speeches += 1
+        finally:
+            # 不等待被丢弃的发言生成完
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_speech(self, agent: Agent, side: str, round_no: int) -> "DebateCrew.SpeechResult":
+        """获取辞手发言：提示词由辩论上下文给出（固定前缀 + 滚动摘要 + 对手上一段发言）"""
+        description = self.context.prompt(side)
         task = Task(
-            description=f"作为{side}，针对辩题'{topic}'进行发言。请提出有力的论据。",
+            description=description,
             expected_output=f"一段有力的{side}辩论发言",
             agent=agent
         )
         
-        crew = Crew(
-            agents=[agent],
-            tasks=[task],
-            verbose=False
-        )
+        crew = self._get_crew(agent)
+        crew.tasks = [task]
         
         result = crew.kickoff()
-        return result.raw
+        # crew的token用量是agent创建以来的累计值，取与上一次的差
+        usage = result.token_usage
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        cached_tokens = getattr(usage, "cached_prompt_tokens", 0) or 0
+        last_prompt, last_cached = self._speech_usage.get(agent.role, (0, 0))
+        self._speech_usage[agent.role] = (prompt_tokens, cached_tokens)
+        return self.SpeechResult(
+            text=result.raw, side=side, round_no=round_no, context_tokens=estimate_tokens(description),
+            prompt_tokens=prompt_tokens - last_prompt, cached_prompt_tokens=cached_tokens - last_cached
+        )
+
+    def resume_debate(self, debate_id: str):
+        """从检查点继续一场中断的辩论，辩题从检查点读取"""
+        if not self.checkpoint_dir:
+            raise ValueError("未设置checkpoint_dir，无法恢复辩论")
+        header, _ = DebateCheckpoint(os.path.join(self.checkpoint_dir, f"{debate_id}.jsonl")).load()
+        if header is None:
+            raise FileNotFoundError(f"找不到辩论 {debate_id} 的检查点")
+        return self.run_debate(header["topic"], debate_id=debate_id)
+
+    def _save_round(self, speech_a: "DebateCrew.SpeechResult", speech_b: "DebateCrew.SpeechResult",
+                    summary_a: "DebateCrew.JudgeSummary", summary_b: "DebateCrew.JudgeSummary") -> None:
+        if self.checkpoint is None:
+            return
+        self.checkpoint.save_round(
+            self.current_round, speech_a=asdict(speech_a), speech_b=asdict(speech_b),
+            summary_a=asdict(summary_a), summary_b=asdict(summary_b), hp_A=self.hp_A, hp_B=self.hp_B
+        )
+
+    def _restore_rounds(self, rounds: List[Dict[str, Any]]) -> None:
+        """恢复已完成的轮次：重建发言上下文和血量，不重新生成发言与评判"""
+        # 发言记录可能包含中断那一轮的半轮发言，按检查点重写
+        open(self.context.transcript_path, "w", encoding="utf-8").close()
+        for record in rounds:
+            for key in ("speech_a", "speech_b"):
+                self._record_speech(self.SpeechResult(**record[key]))
+        last = rounds[-1]
+        self.hp_A, self.hp_B = last["hp_A"], last["hp_B"]
+        self.current_round = last["round"]
+        self.resumed_rounds = len(rounds)
+        self._log(f"从检查点恢复：已完成 {len(rounds)} 轮，正方(A)血量: {self.hp_A}, 反方(B)血量: {self.hp_B}")
+        if not self._round_ends_debate():
+            self.current_round += 1
+
+    def _record_speech(self, speech: "DebateCrew.SpeechResult") -> None:
+        self.context.record(speech.round_no, speech.side, speech.text)
+        self.context.record_prompt(speech.round_no, speech.side, speech.context_tokens,
+                                   speech.prompt_tokens, speech.cached_prompt_tokens)
 
     def _judge_speech(self, topic: str, speech: str) -> "DebateCrew.JudgeSummary":
         """裁判评判发言，返回裁判评判摘要"""
         task = Task(
             description=f"评价以下辩论发言，并打出伤害值。辩题：{topic}，发言：{speech}",
-            expected_output="伤害评判结果，包含具体的伤害数值和评判理由，伤害值范围为10-30，输出格式为一段json:，比如{'damage': 10, 'rationale': '评判理由'}",
+            expected_output='伤害评判结果，包含具体的伤害数值和评判理由，伤害值范围为10-30，输出格式为一段json:，比如{"damage": 10, "rationale": "评判理由"}',
             agent=self.judge()
         )
         
-        crew = Crew(
-            agents=[self.judge()],
-            tasks=[task],
-            verbose=False
-        )
+        crew = self._get_crew(self.judge())
+        crew.tasks = [task]
         
         result = crew.kickoff()
+        self.judge_requests += 1
         return self._parse_judge_summary(result.raw)
 
+    def _judge_speeches(self, topic: str, speeches: List[str]) -> List["DebateCrew.JudgeSummary"]:
+        """评判一批发言：有裁判团时交给裁判团，否则由单个judge评判（多段发言时合并成一次请求）"""
+        if self.judge_panel_config:
+            verdicts = self._panel().judge(topic, speeches)
+            return [self.JudgeSummary(damage=verdict.damage, rationale=verdict.rationale) for verdict in verdicts]
+
+        start_time = time.perf_counter()
+        if len(speeches) == 1:
+            summaries = [self._judge_speech(topic, speeches[0])]
+        else:
+            raw = self._run_task(self.judge(), batch_prompt(topic, speeches), "每段发言的伤害评判结果，JSON数组")
+            self.judge_requests += 1
+            scores = parse_batch_scores(raw, len(speeches))
+            # 缺失的项单独重新评判这一段发言，不能从批量输出中取数字（可能是另一段发言的伤害）
+            summaries = []
+            for idx, score in enumerate(scores):
+                if score:
+                    summaries.append(self.JudgeSummary(damage=score[0], rationale=score[1]))
+                else:
+                    summaries.append(self._judge_speech(topic, speeches[idx]))
+        self.judge_seconds.append(time.perf_counter() - start_time)
+        return summaries
+
+    def compare_judging(self, topic: str, speeches: List[str], repeats: int = 3) -> Dict[str, Dict[str, float]]:
+        """
+        用同一批发言重复评判repeats次，对比单裁判与裁判团：
+        score_stdev为同一段发言多次评判的伤害标准差（越小越稳定），seconds_per_speech为平均每段发言的评判耗时
+        """
+        def measure(judge_fn) -> Dict[str, float]:
+            runs, start_time = [], time.perf_counter()
+            for _ in range(repeats):
+                runs.append([summary.damage for summary in judge_fn()])
+            elapsed = time.perf_counter() - start_time
+            stdevs = [statistics.pstdev(scores) for scores in zip(*runs)]
+            return {
+                "score_stdev": round(statistics.mean(stdevs), 2) if stdevs else 0.0,
+                "seconds_per_speech": round(elapsed / (repeats * len(speeches)), 3) if speeches else 0.0,
+            }
+
+        result = {"single": measure(lambda: [self._judge_speech(topic, speech) for speech in speeches])}
+        if self.judge_panel_config:
+            result["panel"] = measure(lambda: self._judge_speeches(topic, speeches))
+        return result
+
+    def _panel(self) -> JudgePanel:
+        """首次使用时构建裁判团，每个裁判一个单agent crew"""
+        if self._judge_panel is None:
+            judges = []
+            for idx, overrides in enumerate(self.judge_panel_config):
+                config = {**self.agents_config['panel_judge'], **overrides}
+                config["role"] = f"{config['role']}{idx + 1}" # crew按role缓存，每个裁判需要不同的role
+                judge_agent = Agent(config=config, verbose=self.verbose)
+                self._get_crew(judge_agent)
+                judges.append(lambda prompt, judge_agent=judge_agent:
+                              self._run_task(judge_agent, prompt, "每段发言的伤害评判结果，JSON数组"))
+            self._judge_panel = JudgePanel(judges, method=self.judge_aggregate)
+        return self._judge_panel
+
+    def _run_task(self, agent: Agent, description: str, expected_output: str) -> str:
+        crew = self._get_crew(agent)
+        crew.tasks = [Task(description=description, expected_output=expected_output, agent=agent)]
+        return crew.kickoff().raw
+
+    def _judge_report(self) -> Dict[str, Any]:
+        if self._judge_panel is not None:
+            return self._judge_panel.report()
+        return {
+            "judges": 1,
+            "judge_requests": self.judge_requests,
+            "avg_judge_seconds": round(statistics.mean(self.judge_seconds), 3) if self.judge_seconds else 0.0,
+        }
+
+    def _apply_judgement(self, side: str, summary: "DebateCrew.JudgeSummary") -> None:
+        """结算一次评判：side为发言方，伤害扣在对方身上"""
+        if side == "正方":
+            self.hp_B -= summary.damage
+            self._log(f"正方造成 {summary.damage} 点伤害，反方剩余血量: {self.hp_B}；评判理由：{summary.rationale}")
+        else:
+            self.hp_A -= summary.damage
+            self._log(f"反方造成 {summary.damage} 点伤害，正方剩余血量: {self.hp_A}；评判理由：{summary.rationale}")
+
+    def _debate_continues(self) -> bool:
+        return self.current_round <= self.max_rounds and self.hp_A > 0 and self.hp_B > 0
+
+    def _round_ends_debate(self) -> bool:
+        """一轮结束后的胜负判定"""
+        if self.hp_A <= 0 and self.hp_A < self.hp_B:
+            self._log("反方获胜！")
+            return True
+        if self.hp_B <= 0 and self.hp_B < self.hp_A:
+            self._log("正方获胜！")
+            return True
+        return False
+
+    def _get_crew(self, agent: Agent) -> Crew:
+        """获取复用的单agent crew，首次使用时构建（加锁，同一role只构建一次）"""
+        with self._crews_lock:
+            crew = self._crews.get(agent.role)
+            if crew is not None:
+                self.crew_reuse_count += 1
+                return crew
+
+            start_time = time.perf_counter()
+            crew = Crew(
+                agents=[agent],
+                tasks=[],
+                verbose=False
+            )
+            self.crew_build_seconds += time.perf_counter() - start_time
+            self._crews[agent.role] = crew
+            return crew
+
     def _parse_judge_summary(self, summary_text: str) -> "DebateCrew.JudgeSummary":
         """解析裁判输出，提取伤害值与评判理由"""
         import json, re
@@ -169,15 +456,9 @@ class DebateCrew:
             # 如果 JSON 解析失败则忽略
             pass
 
-        # 兜底：正则提取数字
-        if damage is None:
-            nums = re.findall(r"\d+", summary_text)
-            if nums:
-                damage = int(nums[0])
-
-        # 最终兜底随机
+        # 与裁判团一致：没有有效评分时按中间值计，不从文本中取第一个数字（可能是轮次或引用的数字），也不随机
         if damage is None:
-            damage = randint(10, 30)
+            return self.JudgeSummary(damage=(10 + 30) // 2, rationale="裁判未给出有效评分，按中间值计")
 
         # 伤害范围修正
         damage = max(10, min(damage, 30))
@@ -196,15 +477,33 @@ class DebateCrew:
                 winner = "反方获胜！"
             else:
                 winner = "平局！"
-            print(winner)
+            self._log(winner)
         
         return {
             "winner": "A" if self.hp_A > self.hp_B else "B" if self.hp_B > self.hp_A else "平局",
             "final_hp_A": self.hp_A,
             "final_hp_B": self.hp_B,
-            "rounds": self.current_round - 1
+            "rounds": self.current_round - 1,
+            "crew_setup_saved_seconds": self._crew_setup_saved_seconds(),
+            "avg_round_seconds": round(sum(self.round_seconds) / len(self.round_seconds), 3) if self.round_seconds else 0.0,
+            "pipelined": self.pipelined,
+            "discarded_speeches": self.discarded_speeches,
+            "debate_id": self.debate_id,
+            "resumed_rounds": self.resumed_rounds,
+            **(self.context.report() if self.context else {}),
+            **self._judge_report()
         }
 
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def _crew_setup_saved_seconds(self) -> float:
+        """按平均构建耗时估算复用crew节省的时间"""
+        if not self._crews:
+            return 0.0
+        return round(self.crew_reuse_count * self.crew_build_seconds / len(self._crews), 4)
+
     # ================= 内部数据结构 =================
     @dataclass
     class JudgeSummary:
@@ -212,6 +511,16 @@ class DebateCrew:
         damage: int
         rationale: str
 
+    @dataclass
+    class SpeechResult:
+        """一段发言及其提示词token"""
+        text: str
+        side: str
+        round_no: int
+        context_tokens: int
+        prompt_tokens: int
+        cached_prompt_tokens: int
+
     # --- 在 DebateCrew 类里加一段辅助方法 ---
     def _print_agent_info(self):
         print("\n=== 运行时 Agent 信息 ===")
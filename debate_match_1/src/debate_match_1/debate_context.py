@@ -0,0 +1,150 @@
+# 辩论上下文
+# 完整发言记录逐条追加写入磁盘（JSONL），提示词中只放三部分：固定前缀（身份、辩题、规则，跨轮不变，便于服务端前缀缓存）、
+# 更早发言压缩成的滚动摘要、对手上一段发言原文。摘要和原文整体受token预算限制，提示词长度不随轮数增长
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SUMMARIZE_FN = Callable[[str, int], str] # (发言, token上限) -> 要点
+
+
+# 粗略估算token：中文字符按1个token，其余按4个字符1个token
+def estimate_tokens(text: str) -> int:
+    cjk = len(re.findall(r"[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]", text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+# 截断到token预算以内
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+
+# 默认的发言压缩：按句子取开头的论点，直到token上限
+def compress_speech(speech: str, max_tokens: int) -> str:
+    sentences = [part.strip() for part in re.split(r"(?<=[。！？；!?;])|\n", speech) if part.strip()]
+    points, tokens = [], 0
+    for sentence in sentences:
+        sentence_tokens = estimate_tokens(sentence)
+        if tokens + sentence_tokens > max_tokens:
+            break
+        points.append(sentence)
+        tokens += sentence_tokens
+    if not points and sentences:
+        return truncate_tokens(sentences[0], max_tokens)
+    return "".join(points)
+
+
+class DebateContext:
+
+    def __init__(self, topic: str, transcript_path: str, token_budget: int = 1500, summary_tokens: int = 600,
+                 point_tokens: int = 80, summarize_fn: Optional[SUMMARIZE_FN] = None):
+        """
+        Args:
+            transcript_path: 完整发言记录的JSONL路径
+            token_budget: 提示词中摘要与对手发言的token预算（不含固定前缀）
+            summary_tokens: 滚动摘要的token上限，超出时丢弃最早的要点；最多占token_budget的一半，另一半留给对手发言
+            point_tokens: 每段发言压缩成要点的token上限
+            summarize_fn: 发言压缩函数，默认按句子截取开头的论点；可换成LLM摘要
+        """
+        self.topic = topic
+        self.transcript_path = transcript_path
+        self.token_budget = token_budget
+        self.summary_tokens = min(summary_tokens, token_budget // 2)
+        self.point_tokens = point_tokens
+        self.summarize_fn = summarize_fn or compress_speech
+        self._points: List[Tuple[int, str, str]] = [] # (轮次, 发言方, 要点)
+        self._dropped_points = 0
+        self._last_speech: Dict[str, str] = {} # 发言方 -> 最近一段发言原文
+        self._prefixes: Dict[str, str] = {}
+        self.prompt_stats: List[Dict[str, Any]] = []
+        directory = os.path.dirname(transcript_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # 记录一段发言：原文写入磁盘，摘要中只保留要点
+    def record(self, round_no: int, side: str, speech: str) -> None:
+        with open(self.transcript_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"round": round_no, "side": side, "speech": speech, "time": time.time()},
+                                  ensure_ascii=False) + "\n")
+        self._last_speech[side] = speech
+        self._points.append((round_no, side, self.summarize_fn(speech, self.point_tokens)))
+        while len(self._points) > 1 and self._points_tokens(self._points) > self.summary_tokens:
+            self._points.pop(0)
+            self._dropped_points += 1
+
+    # 发言提示词：固定前缀 + 滚动摘要 + 对手上一段发言
+    def prompt(self, side: str) -> str:
+        opponent = "反方" if side == "正方" else "正方"
+        last_opponent = self._last_speech.get(opponent)
+        points = self._points
+        if last_opponent is not None and points and points[-1][1] == opponent:
+            points = points[:-1] # 对手上一段发言给原文，不再重复要点
+        parts = [self.static_prefix(side)]
+        budget = self.token_budget
+        if points or self._dropped_points:
+            summary = self._render_points(points)
+            budget -= estimate_tokens(summary)
+            parts.append(summary)
+        if last_opponent is not None:
+            parts.append(f"【{opponent}上一段发言】\n{truncate_tokens(last_opponent, max(budget, 0))}")
+        return "\n\n".join(parts)
+
+    def static_prefix(self, side: str) -> str:
+        """同一发言方每轮相同，放在提示词最前面"""
+        if side not in self._prefixes:
+            self._prefixes[side] = (
+                f"作为{side}，针对辩题'{self.topic}'进行发言。请提出有力的论据。\n"
+                f"如果对方已经发言，先针对其上一段发言中的论点进行反驳，再补充新的论据；不要重复己方已经说过的内容。"
+            )
+        return self._prefixes[side]
+
+    def record_prompt(self, round_no: int, side: str, context_tokens: int,
+                      prompt_tokens: Optional[int] = None, cached_prompt_tokens: Optional[int] = None) -> None:
+        self.prompt_stats.append({
+            "round": round_no, "side": side, "context_tokens": context_tokens,
+            "prompt_tokens": prompt_tokens, "cached_prompt_tokens": cached_prompt_tokens,
+        })
+
+    def transcript(self) -> List[Dict[str, Any]]:
+        """从磁盘读取完整发言记录"""
+        if not os.path.exists(self.transcript_path):
+            return []
+        with open(self.transcript_path, "r", encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def report(self) -> Dict[str, Any]:
+        """按轮次汇总提示词token：context_tokens为本模块拼出的任务描述，prompt_tokens为服务端返回的实际用量"""
+        rounds: Dict[int, Dict[str, int]] = {}
+        for stat in self.prompt_stats:
+            total = rounds.setdefault(stat["round"], {"round": stat["round"], "context_tokens": 0,
+                                                      "prompt_tokens": 0, "cached_prompt_tokens": 0})
+            for key in ("context_tokens", "prompt_tokens", "cached_prompt_tokens"):
+                total[key] += stat[key] or 0
+        return {
+            "transcript_path": self.transcript_path,
+            "prompt_tokens_per_round": [rounds[round_no] for round_no in sorted(rounds)],
+            "summary_dropped_points": self._dropped_points,
+        }
+
+    ## ----------- 辅助小函数 -----------
+    def _render_points(self, points: List[Tuple[int, str, str]]) -> str:
+        lines = ["【辩论进程摘要】"]
+        if self._dropped_points:
+            lines.append(f"（更早的{self._dropped_points}段发言已省略）")
+        lines.extend(f"第{round_no}轮{side}：{point}" for round_no, side, point in points)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _points_tokens(points: List[Tuple[int, str, str]]) -> int:
+        return sum(estimate_tokens(point) + 6 for _, _, point in points)
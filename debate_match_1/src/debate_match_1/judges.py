@@ -0,0 +1,143 @@
+# 裁判团
+# 多个较便宜的裁判并发给同一段发言打分，按中位数或截尾均值聚合，单个裁判输出异常时只丢弃这一票，
+# 不再退回到"取第一个数字"或随机伤害；一次请求可以同时评判多段发言（例如一轮中正反双方的发言），减少请求次数
+import json
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MEDIAN = "median"
+TRIMMED_MEAN = "trimmed_mean"
+
+JudgeFn = Callable[[str], str] # 评判提示词 -> 裁判原始输出
+
+
+@dataclass
+class PanelVerdict:
+    """裁判团对一段发言的评判"""
+    damage: int
+    rationale: str
+    scores: List[int] # 各裁判的有效打分
+
+
+# 聚合打分：截尾均值去掉一个最高分和一个最低分（不足3个打分时等同均值）
+def aggregate(scores: List[int], method: str = MEDIAN) -> float:
+    if method == MEDIAN:
+        return statistics.median(scores)
+    if method == TRIMMED_MEAN:
+        ordered = sorted(scores)
+        if len(ordered) >= 3:
+            ordered = ordered[1:-1]
+        return statistics.mean(ordered)
+    raise ValueError(f"未知的聚合方式: {method}")
+
+
+def batch_prompt(topic: str, speeches: List[str], min_damage: int = 10, max_damage: int = 30) -> str:
+    """一次评判多段发言的提示词，要求按序号输出JSON数组"""
+    body = "\n\n".join(f"【发言{idx}】\n{speech}" for idx, speech in enumerate(speeches, 1))
+    return (
+        f"辩题：{topic}\n请逐段评价以下{len(speeches)}段辩论发言，按发言质量打出伤害值（{min_damage}-{max_damage}的整数，"
+        f"质量越高伤害越高）。\n\n{body}\n\n"
+        f"只输出一个JSON数组，每段发言一项，例如："
+        f'[{{"index": 1, "damage": 20, "rationale": "评判理由"}}]'
+    )
+
+
+# 解析批量评判输出：按index对应到发言，缺失或无效的项为None
+def parse_batch_scores(text: str, count: int, min_damage: int = 10,
+                       max_damage: int = 30) -> List[Optional[Tuple[int, str]]]:
+    scores: List[Optional[Tuple[int, str]]] = [None] * count
+    match = re.search(r"\[.*\]", text, re.S)
+    if not match:
+        return scores
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return scores
+    for position, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("index", position + 1)) - 1
+            damage = int(item["damage"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= idx < count:
+            scores[idx] = (max(min_damage, min(damage, max_damage)), str(item.get("rationale", "")))
+    return scores
+
+
+class JudgePanel:
+
+    def __init__(self, judges: List[JudgeFn], method: str = MEDIAN, min_damage: int = 10, max_damage: int = 30):
+        """
+        Args:
+            judges: 裁判函数，每个裁判接收评判提示词、返回原始输出
+            method: 聚合方式，MEDIAN 或 TRIMMED_MEAN
+        """
+        if not judges:
+            raise ValueError("裁判团至少需要一个裁判")
+        aggregate([min_damage], method) # 提前校验聚合方式
+        self.judges = judges
+        self.method = method
+        self.min_damage = min_damage
+        self.max_damage = max_damage
+        self.requests = 0 # 评判请求数（每个裁判每批算一次）
+        self.invalid_scores = 0 # 裁判输出中缺失或无法解析的打分
+        self.fallback_verdicts = 0 # 所有裁判都没有给出有效打分、使用中间值的发言
+        self.judge_seconds: List[float] = [] # 每批评判的耗时
+        self.score_stdevs: List[float] = [] # 每段发言各裁判打分的标准差
+
+    # 评判一批发言：所有裁判并发请求，每段发言的伤害为有效打分的聚合值
+    def judge(self, topic: str, speeches: List[str]) -> List[PanelVerdict]:
+        prompt = batch_prompt(topic, speeches, self.min_damage, self.max_damage)
+        start_time = time.perf_counter()
+        outputs: List[Optional[str]] = [None] * len(self.judges)
+        errors: List[Exception] = []
+        with ThreadPoolExecutor(max_workers=len(self.judges), thread_name_prefix="judge") as executor:
+            futures = [executor.submit(judge, prompt) for judge in self.judges]
+            for idx, future in enumerate(futures):
+                try:
+                    outputs[idx] = future.result()
+                except Exception as e:
+                    errors.append(e)
+        if len(errors) == len(self.judges):
+            raise errors[0]
+        self.requests += len(self.judges)
+        self.judge_seconds.append(time.perf_counter() - start_time)
+
+        parsed = [parse_batch_scores(output, len(speeches), self.min_damage, self.max_damage)
+                  for output in outputs if output is not None]
+        verdicts = []
+        for idx in range(len(speeches)):
+            votes = [scores[idx] for scores in parsed if scores[idx] is not None]
+            self.invalid_scores += len(self.judges) - len(votes)
+            verdicts.append(self._verdict(votes))
+        return verdicts
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "judges": len(self.judges),
+            "aggregate": self.method,
+            "judge_requests": self.requests,
+            "avg_judge_seconds": round(statistics.mean(self.judge_seconds), 3) if self.judge_seconds else 0.0,
+            "judge_score_stdev": round(statistics.mean(self.score_stdevs), 2) if self.score_stdevs else 0.0,
+            "invalid_scores": self.invalid_scores,
+            "fallback_verdicts": self.fallback_verdicts,
+        }
+
+    ## ----------- 辅助小函数 -----------
+    def _verdict(self, votes: List[Tuple[int, str]]) -> PanelVerdict:
+        if not votes:
+            self.fallback_verdicts += 1
+            middle = (self.min_damage + self.max_damage) // 2
+            return PanelVerdict(damage=middle, rationale="裁判团未给出有效评分，按中间值计", scores=[])
+        scores = [score for score, _ in votes]
+        damage = int(round(aggregate(scores, self.method)))
+        self.score_stdevs.append(statistics.pstdev(scores))
+        # 理由取打分最接近聚合结果的裁判
+        _, rationale = min(votes, key=lambda vote: abs(vote[0] - damage))
+        return PanelVerdict(damage=damage, rationale=rationale, scores=scores)
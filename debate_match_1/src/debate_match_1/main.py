@@ -1,6 +1,10 @@
 #!/usr/bin/env python
+import argparse
+import asyncio
+import json
 import sys
 from debate_match_1.crew import DebateCrew
+from debate_match_1.tournament import DebateTournament, load_topics, load_contestants, ROUND_ROBIN, BRACKET
 
 def run():
     """
@@ -19,6 +23,27 @@ def main():
     """主函数"""
     run()
 
+def tournament():
+    """
+    锦标赛模式：从文件读取辩题和参赛配置，并发运行多场辩论.
+    """
+    parser = argparse.ArgumentParser(description="辩论锦标赛")
+    parser.add_argument("topics", help="辩题文件，每行一个辩题")
+    parser.add_argument("contestants", help="参赛配置YAML，每项包含name及要覆盖的辩手配置（如llm）")
+    parser.add_argument("-o", "--output", default="tournament_results.jsonl", help="结果JSONL，重新运行时跳过已完成的场次")
+    parser.add_argument("-m", "--mode", choices=[ROUND_ROBIN, BRACKET], default=ROUND_ROBIN, help="赛制")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="同时进行的辩论数上限")
+    parser.add_argument("-r", "--rounds", type=int, default=3, help="每场辩论的最大轮数")
+    parser.add_argument("--no-swap", action="store_true", help="循环赛中不交换正反方")
+    args = parser.parse_args(sys.argv[1:])
+
+    debate_tournament = DebateTournament(
+        load_topics(args.topics), load_contestants(args.contestants), args.output,
+        max_concurrency=args.concurrency, max_rounds=args.rounds, swap_sides=not args.no_swap
+    )
+    report = asyncio.run(debate_tournament.run(args.mode))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
 def train():
     """
     训练 crew 以获得更好的结果.
@@ -0,0 +1,236 @@
+# 辩论锦标赛
+# 从文件读取辩题和参赛配置，按循环赛或淘汰赛配对，在全局并发上限内同时运行多场DebateCrew辩论；
+# 每场结果完成后立即追加写入JSONL（重新运行时跳过已完成的场次），最后按场次顺序计算Elo评分并统计吞吐量
+import asyncio
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from debate_match_1.crew import DebateCrew
+
+ROUND_ROBIN = "round_robin"
+BRACKET = "bracket"
+
+
+def load_topics(path: str) -> List[str]:
+    """每行一个辩题，忽略空行和#开头的注释"""
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith("#")]
+
+
+def load_contestants(path: str) -> List[Dict[str, Any]]:
+    """
+    参赛配置（YAML列表），每项需要name，其余字段覆盖agents.yaml中的辩手配置，例如：
+        - name: deepseek-chat
+          llm: deepseek/deepseek-chat
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        contestants = yaml.safe_load(file)
+    names = [contestant["name"] for contestant in contestants]
+    if len(set(names)) != len(names):
+        raise ValueError("参赛配置的name不能重复")
+    return contestants
+
+
+class EloRating:
+
+    def __init__(self, k: float = 32.0, initial: float = 1500.0):
+        self.k = k
+        self.initial = initial
+        self.ratings: Dict[str, float] = {}
+
+    def get(self, name: str) -> float:
+        return self.ratings.get(name, self.initial)
+
+    def update(self, a: str, b: str, score_a: float) -> None:
+        """score_a: A胜1，平0.5，负0"""
+        rating_a, rating_b = self.get(a), self.get(b)
+        expected_a = 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+        self.ratings[a] = rating_a + self.k * (score_a - expected_a)
+        self.ratings[b] = rating_b + self.k * ((1 - score_a) - (1 - expected_a))
+
+    def table(self) -> List[Dict[str, Any]]:
+        return [{"name": name, "rating": round(rating, 1)}
+                for name, rating in sorted(self.ratings.items(), key=lambda item: -item[1])]
+
+
+class DebateTournament:
+
+    def __init__(self, topics: List[str], contestants: List[Dict[str, Any]], results_path: str,
+                 max_concurrency: int = 8, max_rounds: int = 3, swap_sides: bool = True,
+                 debate_fn: Optional[Callable[[str, Dict[str, Any], Dict[str, Any], int, str], Dict[str, Any]]] = None):
+        """
+        Args:
+            contestants: 参赛配置，见load_contestants
+            results_path: 结果JSONL，已有的场次在重新运行时跳过
+            max_concurrency: 同时进行的辩论数上限
+            swap_sides: 循环赛中每对选手在同一辩题上交换正反方各辩一场，抵消正方先手的优势
+            debate_fn: 运行单场辩论的函数 (辩题, 正方, 反方, 最大轮数, 辩论id)，默认使用DebateCrew；
+                同一场比赛的辩论id固定，失败重跑时从检查点继续
+        """
+        if len(contestants) < 2:
+            raise ValueError("至少需要两个参赛配置")
+        self.topics = topics
+        self.contestants = {contestant["name"]: contestant for contestant in contestants}
+        self.results_path = results_path
+        self.max_concurrency = max_concurrency
+        self.max_rounds = max_rounds
+        self.swap_sides = swap_sides
+        self.debate_fn = debate_fn or run_single_debate
+        self.results: Dict[str, Dict[str, Any]] = self._load_results()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.started_at = 0.0
+        self.completed = 0 # 本次运行成功完成的场次（不含跳过的和失败的）
+        self.failed_this_time = 0 # 本次运行失败的场次
+
+    # 循环赛：每个辩题上每对选手辩一场（swap_sides时两场）
+    def round_robin_matches(self) -> List[Dict[str, Any]]:
+        matches = []
+        for topic_idx, topic in enumerate(self.topics):
+            for a, b in itertools.combinations(self.contestants, 2):
+                sides = [(a, b), (b, a)] if self.swap_sides else [(a, b)]
+                for side_a, side_b in sides:
+                    matches.append(self._match(f"rr-{topic_idx}-{side_a}-{side_b}", topic, side_a, side_b))
+        return matches
+
+    async def run(self, mode: str = ROUND_ROBIN) -> Dict[str, Any]:
+        if mode not in (ROUND_ROBIN, BRACKET):
+            raise ValueError(f"未知的赛制: {mode}")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._write_lock = asyncio.Lock()
+        # 默认线程池只有 min(32, CPU+4) 个线程，会把并发压到上限以下
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="debate")
+        self.started_at = time.perf_counter()
+        try:
+            if mode == ROUND_ROBIN:
+                matches = self.round_robin_matches()
+                await asyncio.gather(*(self._play(match) for match in matches))
+                champion = None
+            else:
+                matches, champion = await self._run_bracket()
+        finally:
+            self._executor.shutdown(wait=False)
+        return self.report(matches, champion)
+
+    def report(self, matches: List[Dict[str, Any]], champion: Optional[str] = None) -> Dict[str, Any]:
+        """按场次顺序计算Elo（与完成顺序无关），并统计吞吐量（只计成功完成的场次）"""
+        elo = EloRating()
+        for name in self.contestants:
+            elo.ratings[name] = elo.initial
+        played = [self.results[match["match_id"]] for match in matches if match["match_id"] in self.results]
+        finished = [result for result in played if not result.get("error")]
+        for result in finished:
+            elo.update(result["a"], result["b"], self._score_a(result))
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            "matches": len(matches),
+            "finished": len(finished),
+            "failed": len(played) - len(finished),
+            "run_this_time": self.completed,
+            "failed_this_time": self.failed_this_time,
+            "elapsed_seconds": round(elapsed, 2),
+            "debates_per_hour": round(self.completed / elapsed * 3600, 1) if elapsed > 0 else 0.0,
+            "ratings": elo.table(),
+            "champion": champion,
+        }
+
+    ## ----------- 淘汰赛 -----------
+    async def _run_bracket(self):
+        """单败淘汰：按名单顺序配对，轮空者直接晋级；每场使用下一个辩题，平局按剩余血量差、再按种子顺序决出"""
+        alive = list(self.contestants)
+        topics = itertools.cycle(enumerate(self.topics))
+        matches: List[Dict[str, Any]] = []
+        bracket_round = 0
+        while len(alive) > 1:
+            bracket_round += 1
+            pairs = [(alive[idx], alive[idx + 1]) for idx in range(0, len(alive) - 1, 2)]
+            round_matches = []
+            for a, b in pairs:
+                topic_idx, topic = next(topics)
+                round_matches.append(self._match(f"br-{bracket_round}-{topic_idx}-{a}-{b}", topic, a, b))
+            await asyncio.gather(*(self._play(match) for match in round_matches))
+            matches.extend(round_matches)
+            winners = [self._bracket_winner(match) for match in round_matches]
+            if len(alive) % 2:
+                winners.append(alive[-1])
+            alive = winners
+        return matches, alive[0] if alive else None
+
+    def _bracket_winner(self, match: Dict[str, Any]) -> str:
+        result = self.results.get(match["match_id"], {})
+        # 失败的场次由种子靠前的正方晋级
+        if not result or result.get("error"):
+            return match["a"]
+        score = self._score_a(result)
+        if score == 0.5:
+            diff = result.get("final_hp_A", 0) - result.get("final_hp_B", 0)
+            score = 1.0 if diff >= 0 else 0.0
+        return match["a"] if score == 1.0 else match["b"]
+
+    ## ----------- 单场 -----------
+    async def _play(self, match: Dict[str, Any]) -> None:
+        if match["match_id"] in self.results:
+            return
+        async with self._semaphore:
+            start_time = time.perf_counter()
+            result = dict(match)
+            try:
+                outcome = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.debate_fn, match["topic"], self.contestants[match["a"]],
+                    self.contestants[match["b"]], self.max_rounds, self._debate_id(match)
+                )
+                result.update(outcome)
+            except Exception as e:
+                result["error"] = repr(e)
+            result["seconds"] = round(time.perf_counter() - start_time, 3)
+        async with self._write_lock:
+            self.results[match["match_id"]] = result
+            with open(self.results_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if result.get("error"):
+                self.failed_this_time += 1
+            else:
+                self.completed += 1
+
+    def _load_results(self) -> Dict[str, Dict[str, Any]]:
+        """读取已有结果；失败的场次不算完成，重新运行时会再试"""
+        results: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        result = json.loads(line)
+                        if not result.get("error"):
+                            results[result["match_id"]] = result
+        return results
+
+    def _debate_id(self, match: Dict[str, Any]) -> str:
+        stem = os.path.splitext(os.path.basename(self.results_path))[0]
+        return f"{stem}-{match['match_id']}"
+
+    @staticmethod
+    def _match(match_id: str, topic: str, a: str, b: str) -> Dict[str, Any]:
+        return {"match_id": match_id, "topic": topic, "a": a, "b": b}
+
+    @staticmethod
+    def _score_a(result: Dict[str, Any]) -> float:
+        return {"A": 1.0, "B": 0.0}.get(result.get("winner"), 0.5)
+
+
+def _player_config(contestant: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in contestant.items() if key != "name"}
+
+
+# 默认的单场辩论：contestant_a为正方，contestant_b为反方
+def run_single_debate(topic: str, contestant_a: Dict[str, Any], contestant_b: Dict[str, Any],
+                      max_rounds: int, debate_id: Optional[str] = None) -> Dict[str, Any]:
+    debate_crew = DebateCrew(max_rounds=max_rounds, player_a_config=_player_config(contestant_a),
+                             player_b_config=_player_config(contestant_b), verbose=False, pipelined=True)
+    return debate_crew.run_debate(topic, debate_id=debate_id)
@@ -0,0 +1,258 @@
+# 游戏循环基准测试
+# 所有玩家换成本地确定性模型（mock_llm），在不访问网络的情况下完整运行WerewolfGameFlow，
+# 统计各阶段耗时、flow框架开销、crew和agent构建开销、进入第一夜的耗时和每局内存分配，用于发现游戏循环本身的性能回退
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from flow import WerewolfGameFlow
+from llm_registry import ModelLimiter, ModelMetrics, PooledLLM
+import logging
+logger = logging.getLogger(__name__)
+
+MOCK_MODEL = "mock/bench"
+
+
+# 当前进程的常驻内存（KB），Linux读/proc，其它平台退回到峰值常驻内存
+def resident_memory_kb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if sys.platform == "darwin" else float(peak)
+
+
+# 记录每个flow方法自身的执行时间，方法之外的时间（状态深拷贝、事件分发等）计为框架开销
+# flow的元类只从类自身收集@start/@listen方法，不能用子类改写，因此替换实例上的_execute_method
+class PhaseTimer:
+
+    def __init__(self, flow: WerewolfGameFlow):
+        self.phase_seconds: Dict[str, List[float]] = defaultdict(list)
+        self.memory_after_kb: Dict[str, float] = {} # 开启tracemalloc时，各方法第一次结束后的已分配内存
+        self._execute_method = flow._execute_method
+        flow._execute_method = self.execute_method
+
+    async def execute_method(self, method_name: str, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        phase_seconds = self.phase_seconds[method_name]
+        if asyncio.iscoroutinefunction(method):
+            async def timed(*inner_args: Any, **inner_kwargs: Any) -> Any:
+                start_time = time.perf_counter()
+                try:
+                    return await method(*inner_args, **inner_kwargs)
+                finally:
+                    phase_seconds.append(time.perf_counter() - start_time)
+                    self._sample_memory(method_name)
+        else:
+            def timed(*inner_args: Any, **inner_kwargs: Any) -> Any:
+                start_time = time.perf_counter()
+                try:
+                    return method(*inner_args, **inner_kwargs)
+                finally:
+                    phase_seconds.append(time.perf_counter() - start_time)
+                    self._sample_memory(method_name)
+        return await self._execute_method(method_name, timed, *args, **kwargs)
+
+    def _sample_memory(self, method_name: str) -> None:
+        if tracemalloc.is_tracing() and method_name not in self.memory_after_kb:
+            self.memory_after_kb[method_name] = tracemalloc.get_traced_memory()[0] / 1024
+
+
+# 基于游戏配置生成基准测试配置：所有玩家使用mock模型，关闭memory和verbose
+def make_mock_config(config_file: str, seed: int, latency: float, jitter: float,
+                     malformed_rate: float, max_concurrency: int) -> Dict[str, Any]:
+    with open(config_file, "r", encoding="utf-8") as file:
+        config = yaml.safe_load(file)
+    for player_info in config["game_settings"]["player_info"]:
+        player_info["llm"] = MOCK_MODEL
+    config["game_settings"]["memory"] = False
+    config["game_settings"]["verbose"] = False
+    config["llm_settings"] = {MOCK_MODEL: {
+        "seed": seed,
+        "latency": latency,
+        "jitter": jitter,
+        "malformed_rate": malformed_rate,
+        "max_concurrency": max_concurrency,
+    }}
+    return config
+
+
+# 运行一局，返回该局的指标
+def run_game(config: Dict[str, Any], concurrent_night: bool = False, vote_concurrency: int = 4,
+             max_days: int = 20, trace_memory: bool = False) -> Dict[str, Any]:
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", encoding="utf-8", delete=False) as file:
+        yaml.safe_dump(config, file, allow_unicode=True)
+        config_file = file.name
+
+    try:
+        gc.collect()
+        if trace_memory:
+            tracemalloc.start()
+        flow = WerewolfGameFlow(config_file=config_file, concurrent_night=concurrent_night,
+                                vote_concurrency=vote_concurrency, max_days=max_days)
+        timer = PhaseTimer(flow)
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            flow.kickoff()
+        wall_seconds = time.perf_counter() - start_time
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        os.unlink(config_file)
+
+    method_seconds = sum(sum(times) for times in timer.phase_seconds.values())
+    mock_llm = flow.game_room.llm_registry.get(MOCK_MODEL)
+    llm_metrics = flow.game_room.llm_metrics()[MOCK_MODEL]
+    crew_stats = flow.game_room.crew_pool_stats()
+    agent_stats = flow.game_room.agent_stats()
+    result = {
+        "winner": flow.state.winner.value if flow.state.winner else None,
+        "days": flow.state.day_count,
+        "wall_seconds": wall_seconds,
+        "first_night_seconds": flow.time_to_first_night,
+        "flow_overhead_seconds": wall_seconds - method_seconds,
+        "llm_sleep_seconds": mock_llm.sleep_seconds,
+        "llm_calls": llm_metrics["calls"],
+        "prompt_tokens": llm_metrics["prompt_tokens"],
+        "crew_builds": crew_stats["misses"],
+        "crew_build_seconds": crew_stats["build_seconds"],
+        "agents_built": agent_stats["built"],
+        "agent_build_seconds": agent_stats["build_seconds"],
+        "phase_seconds": {phase: list(times) for phase, times in timer.phase_seconds.items()},
+    }
+    if trace_memory:
+        result["memory_current_kb"] = current / 1024
+        result["memory_peak_kb"] = peak / 1024
+        result["memory_first_night_kb"] = timer.memory_after_kb.get("initialize_game", 0.0)
+    return result
+
+
+def run_benchmark(games: int = 5, seed: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                  malformed_rate: float = 0.0, max_concurrency: int = 8, concurrent_night: bool = False,
+                  vote_concurrency: int = 4, max_days: int = 20, memory_games: int = 1,
+                  config_file: str = "config/werewolf_config.yaml") -> Dict[str, Any]:
+    """
+    运行基准测试
+
+    Args:
+        games: 计时的对局数，第i局使用种子seed+i
+        latency / jitter: mock模型的人工延迟及浮动
+        malformed_rate: mock模型返回无法解析回答的概率
+        memory_games: 额外开启tracemalloc统计内存的对局数（与计时分开运行，避免影响耗时）
+    """
+    def config_for(game_seed: int) -> Dict[str, Any]:
+        return make_mock_config(config_file, game_seed, latency, jitter, malformed_rate, max_concurrency)
+
+    results = [run_game(config_for(seed + idx), concurrent_night, vote_concurrency, max_days)
+               for idx in range(games)]
+    memory_results = [run_game(config_for(seed + idx), concurrent_night, vote_concurrency, max_days,
+                               trace_memory=True)
+                      for idx in range(memory_games)]
+    return summarize(results, memory_results)
+
+
+def summarize(results: List[Dict[str, Any]], memory_results: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """汇总各局指标：每局均值、各阶段单次耗时分布"""
+    def mean(key: str) -> float:
+        return round(statistics.mean(result[key] for result in results), 4) if results else 0.0
+
+    phases: Dict[str, List[float]] = defaultdict(list)
+    for result in results:
+        for phase, times in result["phase_seconds"].items():
+            phases[phase].extend(times)
+
+    summary = {
+        "games": len(results),
+        "winners": {winner: sum(1 for result in results if result["winner"] == winner)
+                    for winner in sorted({str(result["winner"]) for result in results})},
+        "per_game": {
+            "days": mean("days"),
+            "wall_seconds": mean("wall_seconds"),
+            "first_night_seconds": mean("first_night_seconds"),
+            "flow_overhead_seconds": mean("flow_overhead_seconds"),
+            "llm_sleep_seconds": mean("llm_sleep_seconds"),
+            "llm_calls": mean("llm_calls"),
+            "prompt_tokens": mean("prompt_tokens"),
+            "crew_builds": mean("crew_builds"),
+            "crew_build_seconds": mean("crew_build_seconds"),
+            "agents_built": mean("agents_built"),
+            "agent_build_seconds": mean("agent_build_seconds"),
+        },
+        "phases": {
+            phase: {
+                "calls": len(times),
+                "mean_ms": round(statistics.mean(times) * 1000, 3),
+                "p50_ms": round(statistics.median(times) * 1000, 3),
+                "max_ms": round(max(times) * 1000, 3),
+                "total_seconds": round(sum(times), 4),
+            }
+            for phase, times in sorted(phases.items(), key=lambda item: -sum(item[1]))
+        },
+    }
+    if memory_results:
+        summary["memory"] = {
+            "games": len(memory_results),
+            "first_night_kb": round(statistics.mean(result["memory_first_night_kb"] for result in memory_results), 1),
+            "peak_kb": round(statistics.mean(result["memory_peak_kb"] for result in memory_results), 1),
+            "retained_kb": round(statistics.mean(result["memory_current_kb"] for result in memory_results), 1),
+        }
+    return summary
+
+
+# 用litellm的mock_response走一遍真实的PooledLLM流式路径（限流、参数组装、用量统计），不访问网络
+def check_stream(text: str = "我认为3号发言很可疑，今天投3号。") -> Dict[str, Any]:
+    metrics = ModelMetrics()
+    llm = PooledLLM("deepseek/deepseek-chat", ModelLimiter(max_concurrency=1), metrics, mock_response=text)
+    chunks = list(llm.stream_text([{"role": "user", "content": "请发言"}], max_tokens=50))
+    if "".join(chunks) != text:
+        raise RuntimeError(f"流式输出与预期不一致: {chunks}")
+    snapshot = metrics.snapshot()
+    if snapshot.get("calls") != 1:
+        raise RuntimeError(f"流式调用未记入模型指标: {snapshot}")
+    return {"chunks": len(chunks), "metrics": snapshot}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="狼人杀游戏循环基准测试（本地mock模型，不访问网络）")
+    parser.add_argument("-n", "--games", type=int, default=5, help="计时对局数")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="起始随机种子")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock模型每次调用的延迟秒数")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟浮动秒数")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="返回无法解析回答的概率")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="mock模型并发上限")
+    parser.add_argument("--concurrent-night", action="store_true", help="使用并发夜晚模式")
+    parser.add_argument("--vote-concurrency", type=int, default=4, help="白天投票并发数")
+    parser.add_argument("--max-days", type=int, default=20, help="单局最大天数")
+    parser.add_argument("--memory-games", type=int, default=1, help="统计内存分配的对局数，0为不统计")
+    parser.add_argument("-c", "--config", default="config/werewolf_config.yaml", help="游戏配置文件")
+    parser.add_argument("--check-stream", action="store_true", help="只检查PooledLLM的流式发言路径")
+    args = parser.parse_args()
+
+    if args.check_stream:
+        print(json.dumps(check_stream(), indent=2, ensure_ascii=False))
+        return
+
+    stats = run_benchmark(args.games, seed=args.seed, latency=args.latency, jitter=args.jitter,
+                          malformed_rate=args.malformed_rate, max_concurrency=args.max_concurrency,
+                          concurrent_night=args.concurrent_night, vote_concurrency=args.vote_concurrency,
+                          max_days=args.max_days, memory_games=args.memory_games, config_file=args.config)
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# 紧凑游戏状态
+# 玩家用整数下标表示，角色/存活/物品数量存放在定长字节数组中，agent单独保存
+# 复制只需拷贝几个bytearray，适合rollout、回放和批量模拟中大量克隆规则引擎
+from __future__ import annotations
+import struct
+from typing import List, Optional, Sequence, Tuple
+from game_state import GameState, Player, Role, Team, Item, PlayerStatus
+from game_rules import GameRules
+import logging
+logger = logging.getLogger(__name__)
+
+# 枚举 <-> 整数编码，顺序固定，序列化格式依赖它
+ROLES: Tuple[Role, ...] = tuple(Role)
+TEAMS: Tuple[Team, ...] = tuple(Team)
+ITEMS: Tuple[Item, ...] = tuple(Item)
+ROLE_CODE = {role: code for code, role in enumerate(ROLES)}
+TEAM_CODE = {team: code for code, team in enumerate(TEAMS)}
+ITEM_CODE = {item: code for code, item in enumerate(ITEMS)}
+ROLE_TEAM_CODE = bytes(TEAM_CODE[Team.get_team(role)] for role in ROLES)
+WEREWOLF_TEAM = TEAM_CODE[Team.WEREWOLF]
+GOOD_TEAM = TEAM_CODE[Team.GOOD]
+NO_WINNER = 255
+
+# 头部：day_count(H) 玩家数(H) winner(B)
+_HEADER = struct.Struct("<HHB")
+
+
+class CompactGameState:
+    """规则引擎使用的紧凑状态，玩家以座位下标 0..n-1 表示"""
+
+    __slots__ = ("player_ids", "roles", "alive", "items", "day_count", "winner", "alive_by_team")
+
+    def __init__(self, player_ids: Tuple[str, ...], roles: bytes, alive: bytearray,
+                 items: bytearray, day_count: int = 1, winner: int = NO_WINNER,
+                 alive_by_team: Optional[List[int]] = None):
+        self.player_ids = player_ids # 不可变，所有副本共享
+        self.roles = roles # 不可变，所有副本共享
+        self.alive = alive # 每个玩家1字节：1存活 0死亡
+        self.items = items # 每个玩家 len(ITEMS) 字节，按ITEMS顺序保存物品数量
+        self.day_count = day_count
+        self.winner = winner
+        if alive_by_team is None:
+            alive_by_team = [0] * len(TEAMS)
+            for idx, role_code in enumerate(roles):
+                if alive[idx]:
+                    alive_by_team[ROLE_TEAM_CODE[role_code]] += 1
+        self.alive_by_team = alive_by_team
+
+    # 从GameState构建（agent不进入紧凑状态，见agents_of）
+    @classmethod
+    def from_game_state(cls, game_state: GameState) -> CompactGameState:
+        players = game_state.players
+        items = bytearray(len(players) * len(ITEMS))
+        for idx, player in enumerate(players):
+            for item, count in player.items.items():
+                items[idx * len(ITEMS) + ITEM_CODE[item]] = count
+        return cls(
+            player_ids=tuple(player.id for player in players),
+            roles=bytes(ROLE_CODE[player.role] for player in players),
+            alive=bytearray(player.status == PlayerStatus.ALIVE for player in players),
+            items=items,
+            day_count=game_state.day_count,
+            winner=TEAM_CODE[game_state.winner] if game_state.winner else NO_WINNER,
+        )
+
+    @staticmethod
+    def agents_of(game_state: GameState) -> List:
+        """按座位下标对齐的agent表，与紧凑状态分开保存"""
+        return [player.agent for player in game_state.players]
+
+    # 还原为GameState（agents可选，按下标对齐）
+    def to_game_state(self, agents: Optional[Sequence] = None) -> GameState:
+        game_state = GameState(day_count=self.day_count)
+        for idx, player_id in enumerate(self.player_ids):
+            player = Player(id=player_id, role=ROLES[self.roles[idx]],
+                            agent=agents[idx] if agents else None)
+            player.items = {item: self.item_count(idx, item) for item in player.items}
+            game_state.add_player(player)
+            if not self.alive[idx]:
+                game_state.kill_player(player_id)
+        if self.winner != NO_WINNER:
+            game_state.game_over = True
+            game_state.winner = TEAMS[self.winner]
+        return game_state
+
+    def copy(self) -> CompactGameState:
+        return CompactGameState(self.player_ids, self.roles, self.alive[:], self.items[:],
+                                self.day_count, self.winner, self.alive_by_team[:])
+
+    __copy__ = copy
+
+    # 序列化：头部 + 角色 + 存活 + 物品，玩家id表由调用方保存
+    def to_bytes(self) -> bytes:
+        return b"".join((
+            _HEADER.pack(self.day_count, len(self.roles), self.winner),
+            self.roles, self.alive, self.items,
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, player_ids: Optional[Tuple[str, ...]] = None) -> CompactGameState:
+        day_count, n, winner = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        roles = bytes(data[offset:offset + n])
+        offset += n
+        alive = bytearray(data[offset:offset + n])
+        offset += n
+        items = bytearray(data[offset:offset + n * len(ITEMS)])
+        player_ids = player_ids or tuple(str(idx + 1) for idx in range(n))
+        return cls(player_ids, roles, alive, items, day_count, winner)
+
+    ## ----------- 查询 -----------
+    @property
+    def game_over(self) -> bool:
+        return self.winner != NO_WINNER
+
+    def index_of(self, player_id: str) -> int:
+        return self.player_ids.index(player_id)
+
+    def role(self, idx: int) -> Role:
+        return ROLES[self.roles[idx]]
+
+    def team(self, idx: int) -> int:
+        return ROLE_TEAM_CODE[self.roles[idx]]
+
+    def alive_indices(self, role: Optional[Role] = None) -> List[int]:
+        if role is None:
+            return [idx for idx, alive in enumerate(self.alive) if alive]
+        role_code = ROLE_CODE[role]
+        return [idx for idx, alive in enumerate(self.alive) if alive and self.roles[idx] == role_code]
+
+    def item_count(self, idx: int, item: Item) -> int:
+        return self.items[idx * len(ITEMS) + ITEM_CODE[item]]
+
+    ## ----------- 状态变更 -----------
+    def kill(self, idx: int) -> bool:
+        if not self.alive[idx]:
+            return False
+        self.alive[idx] = 0
+        self.alive_by_team[self.team(idx)] -= 1
+        return True
+
+    def revive(self, idx: int) -> bool:
+        if self.alive[idx]:
+            return False
+        self.alive[idx] = 1
+        self.alive_by_team[self.team(idx)] += 1
+        return True
+
+    def use_item(self, idx: int, item: Item) -> bool:
+        pos = idx * len(ITEMS) + ITEM_CODE[item]
+        if self.items[pos] == 0:
+            return False
+        self.items[pos] -= 1
+        return True
+
+    # 夜间结算，规则与GameRules.process_night_results一致
+    def apply_night(self, werewolf_target: Optional[int], witch_save_target: Optional[int],
+                    witch_poison_target: Optional[int], guard_protect_target: Optional[int]) -> List[int]:
+        night_result = GameRules.process_night_results(
+            werewolf_target=werewolf_target,
+            witch_save_target=witch_save_target,
+            witch_poison_target=witch_poison_target,
+            guard_protect_target=guard_protect_target
+        )
+        for idx in night_result["dead_players"]:
+            self.kill(idx)
+        return night_result["dead_players"]
+
+    # 胜负判定，规则与GameRules.check_game_end一致
+    def check_game_end(self) -> bool:
+        winner = GameRules.check_winner(self.alive_by_team[WEREWOLF_TEAM], self.alive_by_team[GOOD_TEAM])
+        if winner is None:
+            return False
+        self.winner = TEAM_CODE[winner]
+        return True
@@ -0,0 +1,70 @@
+# Crew缓存池
+# 按 (用途, 存活成员) 缓存Crew，回合之间只替换tasks；成员有人死亡时key变化，旧Crew被淘汰后重建
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Set, Tuple
+from crewai import Crew
+import logging
+logger = logging.getLogger(__name__)
+
+CrewKey = Tuple[str, FrozenSet[str]] # (用途, 成员player_id集合)
+
+
+class CrewPool:
+
+    def __init__(self):
+        self._crews: Dict[CrewKey, Crew] = {}
+        self._lock = threading.Lock() # 并发夜晚/投票会在线程中取crew
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.build_seconds = 0.0 # 实际构建Crew花费的时间
+
+    @staticmethod
+    def make_key(kind: str, member_ids: Iterable[str]) -> CrewKey:
+        return kind, frozenset(member_ids)
+
+    def get(self, kind: str, member_ids: Iterable[str], factory: Callable[[], Crew]) -> Crew:
+        """取出缓存的Crew，不存在时调用factory构建"""
+        key = self.make_key(kind, member_ids)
+        with self._lock:
+            crew = self._crews.get(key)
+            if crew is not None:
+                self.hits += 1
+                return crew
+            self.misses += 1
+
+        start_time = time.perf_counter()
+        crew = factory()
+        cost = time.perf_counter() - start_time
+
+        with self._lock:
+            self.build_seconds += cost
+            # 同一用途只保留当前成员的Crew
+            for stale_key in [k for k in self._crews if k[0] == kind and k != key]:
+                del self._crews[stale_key]
+                self.evictions += 1
+            self._crews[key] = crew
+        return crew
+
+    def prune(self, alive_ids: Set[str]) -> int:
+        """淘汰包含死亡成员的Crew，返回淘汰数量"""
+        with self._lock:
+            stale_keys = [key for key in self._crews if not key[1] <= alive_ids]
+            for key in stale_keys:
+                del self._crews[key]
+            self.evictions += len(stale_keys)
+        return len(stale_keys)
+
+    def stats(self) -> Dict[str, float]:
+        """缓存统计，saved_seconds按平均构建耗时估算命中节省的时间"""
+        with self._lock:
+            avg_cost = self.build_seconds / self.misses if self.misses else 0.0
+            return {
+                "cached_crews": len(self._crews),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "build_seconds": round(self.build_seconds, 4),
+                "saved_seconds": round(self.hits * avg_cost, 4),
+            }
@@ -0,0 +1,176 @@
+# 流式白天讨论
+# 存活玩家按座位顺序发言，每段发言直接调用玩家的LLM流式生成，逐块产出 (玩家, 文本块) 事件供观战界面实时展示。
+# 每段发言受token和时间预算限制，超出即中断生成；当前发言输出时，下一位玩家的发言已经在后台推测生成
+# （看不到当前这段发言），当前发言点名了下一位玩家时丢弃推测结果、带上完整上下文重新生成
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from game_state import Player
+from game_context import GameContextBuilder, estimate_tokens
+from game_memory import PUBLIC
+import logging
+logger = logging.getLogger(__name__)
+
+
+class DiscussionEvent(NamedTuple):
+    player: Player
+    chunk: str
+
+
+# 一段正在生成的发言：LLM在线程中流式生成，文本块通过asyncio.Queue交给事件循环
+class _Speech:
+
+    def __init__(self, player: Player, messages: List[Dict[str, str]], llm: Any, max_tokens: int):
+        self.player = player
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.stop = threading.Event()
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        loop = asyncio.get_running_loop()
+
+        def produce() -> None:
+            try:
+                for chunk in llm.stream_text(messages, stop=self.stop, max_tokens=max_tokens):
+                    loop.call_soon_threadsafe(self.queue.put_nowait, chunk)
+            except Exception as e:
+                logger.warning(f"玩家 {player.id} 发言生成失败: {e}")
+            finally:
+                loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+        self.task = asyncio.create_task(asyncio.to_thread(produce))
+
+    def cancel(self) -> None:
+        self.stop.set()
+
+
+class StreamingDiscussion:
+
+    def __init__(self, game_room: Any, max_tokens: int = 150, max_seconds: float = 20.0,
+                 speculative: bool = True, memory_hits: int = 3):
+        """
+        Args:
+            game_room: 提供玩家的LLM、角色设定和共享记忆
+            max_tokens: 每段发言的token上限
+            max_seconds: 每段发言从开始生成起的时间上限
+            speculative: 当前发言输出时提前生成下一位玩家的发言
+            memory_hits: 每段发言检索的共享记忆条数
+        """
+        self.game_room = game_room
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.speculative = speculative
+        self.memory_hits = memory_hits
+        self.speeches: List[Tuple[str, str]] = [] # 本轮已完成的发言 (玩家id, 内容)
+        self.stats: Dict[str, float] = {
+            "speeches": 0, "interrupted": 0, "speculated": 0, "speculation_discarded": 0,
+            "first_chunk_seconds": 0.0, "handoff_seconds": 0.0,
+        }
+
+    async def stream(self) -> AsyncIterator[DiscussionEvent]:
+        """按座位顺序产出所有存活玩家的发言块"""
+        speakers = list(self.game_room.game_state.alive_players)
+        if not speakers:
+            return
+        pending: Optional[_Speech] = self._start(speakers[0])
+        current: Optional[_Speech] = None
+        upcoming: Optional[_Speech] = None
+        last_end: Optional[float] = None
+        try:
+            for idx, player in enumerate(speakers):
+                current, pending = pending, None
+                next_player = speakers[idx + 1] if idx + 1 < len(speakers) else None
+                if next_player is not None and self.speculative:
+                    upcoming = self._start(next_player)
+                    self.stats["speculated"] += 1
+
+                text = ""
+                async for chunk in self._chunks(current):
+                    if not text and last_end is not None:
+                        # 上一段发言结束到这一段第一块输出之间的空档
+                        self.stats["handoff_seconds"] += time.perf_counter() - last_end
+                    text += chunk
+                    yield DiscussionEvent(player, chunk)
+                self._finish(player, text)
+                last_end = time.perf_counter()
+
+                if next_player is None:
+                    break
+                # 推测生成时看不到当前发言；当前发言点名了下一位玩家时，让他带着完整上下文重新发言
+                if upcoming is not None and f"{next_player.id}号" in text:
+                    upcoming.cancel()
+                    upcoming = None
+                    self.stats["speculation_discarded"] += 1
+                pending, upcoming = upcoming or self._start(next_player), None
+        finally:
+            # 调用方提前结束迭代时中断所有未完成的生成
+            for speech in (current, pending, upcoming):
+                if speech is not None:
+                    speech.cancel()
+
+    def report(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        if stats["speeches"]:
+            stats["first_chunk_seconds"] = round(stats["first_chunk_seconds"] / stats["speeches"], 4)
+        if stats["speeches"] > 1:
+            stats["handoff_seconds"] = round(stats["handoff_seconds"] / (stats["speeches"] - 1), 4)
+        return stats
+
+    ## ----------- 辅助小函数 -----------
+    def _start(self, player: Player) -> _Speech:
+        return _Speech(player, self._messages(player), self.game_room.player_llm(player), self.max_tokens)
+
+    async def _chunks(self, speech: _Speech) -> AsyncIterator[str]:
+        """按预算读取一段发言的文本块，超出token或时间预算时中断生成"""
+        tokens = 0
+        while True:
+            remaining = self.max_seconds - (time.perf_counter() - speech.started_at)
+            try:
+                chunk = await asyncio.wait_for(speech.queue.get(), max(remaining, 0.0))
+            except asyncio.TimeoutError:
+                speech.cancel()
+                self.stats["interrupted"] += 1
+                return
+            if chunk is None:
+                return
+            if speech.first_chunk_at is None:
+                speech.first_chunk_at = time.perf_counter()
+                self.stats["first_chunk_seconds"] += speech.first_chunk_at - speech.started_at
+            chunk_tokens = estimate_tokens(chunk)
+            if tokens + chunk_tokens > self.max_tokens:
+                # 截断到预算以内
+                while chunk and tokens + estimate_tokens(chunk) > self.max_tokens:
+                    chunk = chunk[:-1]
+                if chunk:
+                    yield chunk
+                speech.cancel()
+                self.stats["interrupted"] += 1
+                return
+            tokens += chunk_tokens
+            yield chunk
+
+    def _finish(self, player: Player, text: str) -> None:
+        self.speeches.append((player.id, text))
+        self.stats["speeches"] += 1
+        game_memory = self.game_room.game_memory
+        if game_memory is not None and text:
+            game_memory.add([f"第{self.game_room.game_state.day_count}天{player.id}号发言：{text}"], PUBLIC)
+
+    def _messages(self, player: Player) -> List[Dict[str, str]]:
+        state = self.game_room.game_state
+        parts = [GameContextBuilder.of(state).render()]
+        game_memory = self.game_room.game_memory
+        if game_memory is not None and self.memory_hits:
+            hits = game_memory.search(f"第{state.day_count}天 发言 怀疑", viewer=player.id, team=player.team,
+                                      limit=self.memory_hits)
+            if hits:
+                parts.append("【你的记忆】\n" + "\n".join(hit["content"] for hit in hits))
+        if self.speeches:
+            parts.append("【本轮发言】\n" + "\n".join(f"{speaker}号：{text}" for speaker, text in self.speeches))
+        parts.append(f"现在轮到{player.id}号发言。请直接说出你的发言内容，分析局势并指出你怀疑的玩家，"
+                     f"不超过{self.max_tokens}字。")
+        return [
+            {"role": "system", "content": self.game_room.player_backstory(player)},
+            {"role": "user", "content": "\n\n".join(parts)},
+        ]
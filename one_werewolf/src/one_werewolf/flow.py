@@ -1,43 +1,98 @@
-﻿from crewai.flow import Flow, start, listen, router
-from crewai import Crew, Process
-from typing import Dict, Any, List, Optional
-import random
-from game_state import GameState, Role, PlayerStatus, GamePhase, Item, NightAction, Team
+﻿from crewai.flow import Flow, start, listen, router, or_
+from crewai import Crew, Process, Task
+from typing import Callable, Dict, Any, List, Optional, Type
+import asyncio
+import os
+import time
+from game_state import GameState, Player, Role, PlayerStatus, GamePhase, Item, NightAction, Team, Vote
 import logging
 from game_room import GameRoom
+from llm_registry import LLMRegistry
+from game_rules import GameRules
+from game_task import GameTask
+from voting import AsyncVotingEngine, VoteTally, TIE_PK, TIE_NONE
+from game_log import GameEventLog, GameReplay
+from task_output import (OutputParser, OutputT, WerewolfVoteOutput, ProphetCheckOutput,
+                         WitchActionOutput, GuardProtectOutput, DayVoteOutput)
 
 logger = logging.getLogger(__name__)
 
 
 class WerewolfGameFlow(Flow[GameState]):
     game_room: GameRoom
+    concurrent_night: bool = False # 并发夜晚模式
+    vote_concurrency: int = 4 # 白天同时进行的投票请求数
+    vote_timeout: float = 60.0 # 单票超时秒数，超时视为弃票
+    max_days: int = 20 # 超过该天数仍未分出胜负时结束对局
+    tie_rule: str = TIE_PK # 白天投票平票规则，见voting.TIE_RULES
+
+    event_log: Optional[GameEventLog] = None # 事件日志，可用于回放和恢复对局
+    resume: bool = False # 从event_log_path中已有的日志恢复崩溃的对局
+    resumed: bool = False # 本局是从日志恢复的，第一次路由按恢复的阶段进行
+    time_to_first_night: Optional[float] = None # 从开始初始化到进入第一夜的秒数
+    speech_listener: Optional[Callable[[Player, str], None]] = None # 接收流式发言块，例如推送给观战界面
+
+    def __init__(self, concurrent_night: bool = False, vote_concurrency: int = 4,
+                 vote_timeout: float = 60.0, event_log_path: Optional[str] = None,
+                 config_file: str = "config/werewolf_config.yaml", max_days: int = 20,
+                 llm_registry: Optional[LLMRegistry] = None, tie_rule: str = TIE_PK,
+                 speech_listener: Optional[Callable[[Player, str], None]] = None, resume: bool = False,
+                 **kwargs: Any):
+        super().__init__(**kwargs)
+        self.config_file = config_file
+        self.llm_registry = llm_registry # 多个房间共享时由RoomManager传入
+        self.max_days = max_days
+        self.vote_tally = VoteTally(tie_rule)
+        self.speech_listener = speech_listener
+        self.concurrent_night = concurrent_night
+        self.vote_concurrency = vote_concurrency
+        self.vote_timeout = vote_timeout
+        self.event_log_path = event_log_path
+        self.resume = resume
+        self.output_parser = OutputParser() # 结构化输出解析及统计
     
     @start()
     def initialize_game(self) -> Dict[str, Any]:
-        self.game_room = GameRoom()
+        start_time = time.perf_counter()
+        # 房间与flow共用同一个游戏状态
+        self.game_room = GameRoom(self.config_file, game_state=self.state, llm_registry=self.llm_registry)
         self.game_room.init_room()
+        if self.event_log_path and self.resume and os.path.exists(self.event_log_path):
+            # 按日志恢复状态和历史记录，之后的事件追加到同一个日志
+            GameReplay.load(self.event_log_path).restore(self.state)
+            self.game_room.release_dead_players()
+            self.event_log = GameEventLog(self.event_log_path, resume=True)
+            self.resumed = True
+        elif self.event_log_path:
+            self.event_log = GameEventLog(self.event_log_path)
+            self.event_log.record_init(self.state)
         
         # 打印初始化信息
-        print("=== 狼人杀游戏开始 ===")
-        print(f"玩家身份分配: {[player.agent.role for player in self.game_room.game_state.players]}")
-        print(f"第{self.game_room.game_state.day_count}夜开始")
+        print("=== 狼人杀游戏恢复 ===" if self.resumed else "=== 狼人杀游戏开始 ===")
+        print(f"玩家身份分配: {[f'{player.id}:{player.role.value}' for player in self.state.players]}")
+        phase = "天白天" if self.state.current_phase == GamePhase.DAY else "夜"
+        print(f"第{self.state.day_count}{phase}开始")
+        self.time_to_first_night = time.perf_counter() - start_time
+
+    @router(initialize_game)
+    def night_router(self) -> str:
+        """选择夜晚模式：依次行动或并发行动；恢复的对局第一次路由到恢复时所处的阶段"""
+        if self._check_game_end():
+            return "game_end"
+        if self.resumed:
+            self.resumed = False
+            if self.state.current_phase == GamePhase.DAY:
+                return "discussion"
+        return "concurrent_night" if self.concurrent_night else "serial_night"
     
-    @listen(initialize_game)
+    @listen("serial_night")
     def werewolf_night_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         夜晚-狼人投票杀人逻辑
         """
-        # 游戏还未结束
-        if self.game_room.check_game_end():
-            return {"phase": "game_over"}
-        
         # 狼人投票
-        result = self.game_room.werewolf_vote()
-        
-        # 解析结果并更新状态
-        target = self._extract_target_from_result(result)
-        self.game_room.game_state.night_action.werewolf_target = target
-        print(f"狼人选择击杀: {self.game_room.game_state.night_action.werewolf_target}")
+        self.state.night_action.werewolf_target = self._decide_werewolf_target()
+        print(f"狼人选择击杀: {self.state.night_action.werewolf_target}")
         
         return {"phase": "prophet_night_action"}
     
@@ -46,42 +101,7 @@ class WerewolfGameFlow(Flow[GameState]):
         """
         夜晚-预言家流程
         """
-        # TODO: 导入模块创建
-        # from tasks.night_tasks import create_prophet_check_task
-        # from agents.prophet_agent import create_prophet_agent
-        
-        # 找到预言家
-        prophet_id = self._find_player_by_role(Role.PROPHET)
-        if not prophet_id or self.state.player_status[prophet_id] == PlayerStatus.DEAD:
-            return {"phase": "witch_night_action"}
-        
-        # TODO: 创建预言家Crew实现
-        # prophet_agent = create_prophet_agent(prophet_id)
-        # prophet_task = create_prophet_check_task(
-        #     self.state.alive_players, 
-        #     {}  # 已查验的玩家信息可以从state中获取
-        # )
-        #
-        # prophet_crew = Crew(
-        #     agents=[prophet_agent],
-        #     tasks=[prophet_task],
-        #     process=Process.sequential,
-        #     memory=True,
-        #     verbose=True
-        # )
-        #
-        # result = prophet_crew.kickoff()
-        
-        # 模拟结果
-        result = {"target": "agent_1", "role": "villager"}
-        
-        # 更新预言家已验证信息
-        target, role_str = self._extract_prophet_result(result)
-        if target:
-            # 这里需要保存预言家查验结果
-            # 可以在night_action中添加一个属性来保存
-            print(f"预言家验证 {target}: {role_str}")
-        
+        self._apply_prophet_check(self._decide_prophet_check())
         return {"phase": "witch_night_action"}
     
     @listen(prophet_night_action)
@@ -89,57 +109,8 @@ class WerewolfGameFlow(Flow[GameState]):
         """
         夜晚-女巫流程
         """
-        # TODO: 导入模块创建
-        # from tasks.night_tasks import create_witch_action_task
-        # from agents.witch_agent import create_witch_agent
-        
-        # 找到女巫
-        witch_id = self._find_player_by_role(Role.WITCH)
-        if not witch_id or self.state.player_status[witch_id] == PlayerStatus.DEAD:
-            return {"phase": "guard_night_action"}
-        
-        # 获取女巫物品信息
-        witch_items = {}
-        if witch_id in self.state.item_manager.player_items:
-            witch_items = self.state.item_manager.player_items[witch_id]
-        
-        # TODO: 创建女巫Crew实现
-        # witch_agent = create_witch_agent(witch_id)
-        # witch_task = create_witch_action_task(
-        #     self.state.night_action.werewolf_target,
-        #     witch_items,
-        #     self.state.alive_players
-        # )
-        #
-        # witch_crew = Crew(
-        #     agents=[witch_agent],
-        #     tasks=[witch_task],
-        #     process=Process.sequential,
-        #     memory=True,
-        #     verbose=True
-        # )
-        #
-        # result = witch_crew.kickoff()
-        
-        # 模拟结果
-        result = {"save_target": self.state.night_action.werewolf_target, "poison_target": None}
-        
-        # 更新女巫行动结果
-        action_result = self._extract_witch_result(result)
-        if action_result.get("save_target"):
-            self.state.night_action.witch_save_target = action_result["save_target"]
-            # 使用解药
-            if witch_id in self.state.item_manager.player_items:
-                self.state.item_manager.use_item(witch_id, Item.ANTIDOTE)
-                
-        if action_result.get("poison_target"):
-            self.state.night_action.witch_poison_target = action_result["poison_target"]
-            # 使用毒药
-            if witch_id in self.state.item_manager.player_items:
-                self.state.item_manager.use_item(witch_id, Item.POISON)
-        
-        print(f"女巫行动: 救助={self.state.night_action.witch_save_target}, 毒杀={self.state.night_action.witch_poison_target}")
-        
+        werewolf_target = self.state.night_action.werewolf_target
+        self._apply_witch_action(self._decide_witch_action(werewolf_target))
         return {"phase": "guard_night_action"}
     
     @listen(witch_night_action)
@@ -147,47 +118,38 @@ class WerewolfGameFlow(Flow[GameState]):
         """
         夜晚-守卫流程
         """
-        # TODO: 导入模块创建
-        # from tasks.night_tasks import create_guard_protect_task
-        # from agents.guard_agent import create_guard_agent
-        
-        # 找到守卫
-        guard_id = self._find_player_by_role(Role.GUARD)
-        if not guard_id or self.state.player_status[guard_id] == PlayerStatus.DEAD:
-            return {"phase": "day_announcement"}
-        
-        # TODO: 创建守卫Crew实现
-        # guard_agent = create_guard_agent(guard_id)
-        # guard_task = create_guard_protect_task(self.state.alive_players)
-        #
-        # guard_crew = Crew(
-        #     agents=[guard_agent],
-        #     tasks=[guard_task],
-        #     process=Process.sequential,
-        #     memory=True,
-        #     verbose=True
-        # )
-        #
-        # result = guard_crew.kickoff()
-        
-        # 模拟结果
-        result = {"target": "agent_2"}
-        
-        # 更新守卫守护目标
-        self.state.night_action.guard_protect_target = self._extract_target_from_result(result)
-        print(f"守卫守护: {self.state.night_action.guard_protect_target}")
-        
+        self._apply_guard_protect(self._decide_guard_target())
         return {"phase": "day_announcement"}
-    
-    @listen(guard_night_action)
-    def day_announcement(self, context: Dict[str, Any]) -> Dict[str, Any]:
+
+    @listen("concurrent_night")
+    async def concurrent_night_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
-        白天-夜晚结果公布
+        夜晚-并发流程：狼人、预言家、守卫互不依赖，同时决策；
+        女巫需要知道狼人目标，在狼人决策完成后加入
+        """
+        werewolf_task = asyncio.create_task(asyncio.to_thread(self._decide_werewolf_target))
+        prophet_task = asyncio.create_task(asyncio.to_thread(self._decide_prophet_check))
+        guard_task = asyncio.create_task(asyncio.to_thread(self._decide_guard_target))
+
+        werewolf_target = await werewolf_task
+        witch_task = asyncio.create_task(asyncio.to_thread(self._decide_witch_action, werewolf_target))
+
+        prophet_target, guard_target, witch_result = await asyncio.gather(prophet_task, guard_task, witch_task)
+
+        # 决策全部完成后按固定顺序写入状态，与串行模式结果一致
+        self.state.night_action.werewolf_target = werewolf_target
+        print(f"狼人选择击杀: {werewolf_target}")
+        self._apply_prophet_check(prophet_target)
+        self._apply_witch_action(witch_result)
+        self._apply_guard_protect(guard_target)
+
+        return {"phase": "day_announcement"}
+
+    @router(or_(guard_night_action, concurrent_night_action))
+    def day_announcement(self, context: Dict[str, Any]) -> str:
+        """
+        白天-夜晚结果公布，路由到讨论或游戏结束
         """
-        # TODO: 导入模块创建
-        # from utils.game_logic import process_night_results
-        # from agents.game_master_agent import create_game_master_agent
-        
         # 处理夜间结果
         night_result = self._process_night_results(
             werewolf_target=self.state.night_action.werewolf_target,
@@ -197,18 +159,26 @@ class WerewolfGameFlow(Flow[GameState]):
         )
         
         # 更新玩家状态
-        for dead_player in night_result["dead_players"]:
-            self.state.player_status[dead_player] = PlayerStatus.DEAD
+        GameRules.apply_deaths(self.state, night_result["dead_players"])
+        self.game_room.release_dead_players()
         
         # 记录夜间行动
         self.state.night_record.add_night_action_record(
             self.state.day_count,
             self.state.night_action
         )
+        if self.event_log:
+            self.event_log.record_night(self.state.day_count, self.state.night_action)
+            for dead_player in night_result["dead_players"]:
+                cause = "poison" if dead_player == self.state.night_action.witch_poison_target else "werewolf"
+                self.event_log.record_deaths(self.state.day_count, [dead_player], cause)
         
         # 准备下一天的夜间行动记录
         self.state.night_action = NightAction()
         self.state.day_count += 1
+        self.state.current_phase = GamePhase.DAY
+        if self.event_log:
+            self.event_log.record_day(self.state)
         
         # 打印结果
         print(f"\n=== 第{self.state.day_count}天白天 ===")
@@ -219,110 +189,103 @@ class WerewolfGameFlow(Flow[GameState]):
         
         # 检查游戏是否结束
         if self._check_game_end():
-            return {"phase": "game_over"}
+            return "game_end"
         
-        return {"phase": "discussion"}
+        return "discussion"
     
-    @listen(day_announcement)
-    def discussion_phase(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    @listen("discussion")
+    async def discussion_phase(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
-        白天-发言讨论阶段
+        白天-发言讨论阶段：存活玩家依次流式发言，每个文本块交给speech_listener（默认打印）
         """
-        # TODO: 导入模块创建
-        # from tasks.day_tasks import create_discussion_tasks
-        # from agents.base_agent import create_agents_by_ids
-        
         # 获取存活玩家
         alive_players = self.state.alive_players
         if len(alive_players) <= 2:
             return {"phase": "game_over"}
         
-        # TODO: 创建讨论Crew - 所有存活玩家参与
-        # discussion_agents = create_agents_by_ids(alive_players, self.state.player_roles)
-        # discussion_tasks = create_discussion_tasks(alive_players, self.state)
-        #
-        # discussion_crew = Crew(
-        #     agents=discussion_agents,
-        #     tasks=discussion_tasks,
-        #     process=Process.sequential,
-        #     memory=True,
-        #     verbose=True
-        # )
-        #
-        # result = discussion_crew.kickoff()
+        discussion = self.game_room.day_discussion()
+        speaker = None
+        async for player, chunk in discussion.stream():
+            if self.speech_listener is not None:
+                self.speech_listener(player, chunk)
+                continue
+            if player is not speaker:
+                speaker = player
+                print(f"\n{player.id}号: ", end="")
+            print(chunk, end="", flush=True)
         
-        # 模拟结果
-        print("讨论阶段完成")
+        print(f"\n讨论阶段完成: {discussion.report()}")
         
         return {"phase": "voting_phase"}
     
-    @listen(discussion_phase)
-    def voting_phase(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    @router(discussion_phase)
+    async def voting_phase(self, context: Dict[str, Any]) -> str:
         """
-        白天-投票阶段
+        白天-投票阶段：所有存活玩家并发投票，路由到下一夜或游戏结束
         """
-        # TODO: 实现投票逻辑
-        # 模拟每个玩家投票
-        for player_id in self.state.alive_players:
-            # 随机选择一个投票目标(除自己外)
-            possible_targets = [p for p in self.state.alive_players if p != player_id]
-            if not possible_targets:
-                continue
-                
-            target = random.choice(possible_targets)
-            # 创建投票并添加到day_vote中
-            from game_state import Vote
-            vote = Vote(voter_id=player_id, target_id=target, reason="模拟投票")
-            self.state.day_vote.add_vote_record(player_id, vote)
-        
-        # 统计投票结果
-        vote_count = {}
-        for _, vote in self.state.day_vote.vote.items():
-            if vote.target_id not in vote_count:
-                vote_count[vote.target_id] = 0
-            vote_count[vote.target_id] += 1
-        
-        # 找出票数最多的玩家
-        max_votes = 0
-        voted_out = None
-        for player, count in vote_count.items():
-            if count > max_votes:
-                max_votes = count
-                voted_out = player
+        engine = AsyncVotingEngine(self._decide_vote, self.vote_concurrency, self.vote_timeout)
+        self.state.day_vote = await engine.collect(self.state)
+        if self.state.day_vote.abstentions:
+            print(f"弃票: {self.state.day_vote.abstentions}")
+        
+        # 统计投票结果，平票按规则处理
+        result = self.vote_tally.tally(self.state.day_vote)
+        voted_out = result.voted_out
+        if result.pk_candidates:
+            # PK轮：平票者不投票，其余玩家只能在平票者中投票，再次平票则无人出局
+            print(f"平票PK: {result.pk_candidates}")
+            pk_vote = await engine.collect(self.state, candidates=result.pk_candidates)
+            self.state.day_vote.pk_vote = pk_vote.vote
+            self.state.day_vote.pk_abstentions = pk_vote.abstentions
+            if pk_vote.abstentions:
+                print(f"PK轮弃票: {pk_vote.abstentions}")
+            voted_out = self.vote_tally.tally(pk_vote, tie_rule=TIE_NONE).voted_out
+        self.state.day_vote.voted_out = voted_out
         
         # 如果有人被投出
         if voted_out:
-            self.state.player_status[voted_out] = PlayerStatus.DEAD
+            GameRules.apply_deaths(self.state, [voted_out])
+            self.game_room.release_dead_players()
             print(f"投票结果: {voted_out} 被投票出局")
+        elif result.is_tie:
+            print(f"投票结果: {result.leaders} 平票，无人出局")
         else:
-            print("投票结果: 平局，无人出局")
+            print("投票结果: 无人投票，无人出局")
         
         # 记录投票
         self.state.day_vote_record.add_day_vote_record(
             self.state.day_count,
             self.state.day_vote
         )
+        if self.event_log:
+            self.event_log.record_votes(self.state.day_count, self.state.day_vote)
+            if voted_out:
+                self.event_log.record_deaths(self.state.day_count, [voted_out], "vote")
         
         # 重置当天投票
         self.state.day_vote = self.state.day_vote.__class__()
         
         # 检查游戏是否结束
         if self._check_game_end():
-            return {"phase": "game_over"}
+            return "game_end"
+        if self.state.day_count >= self.max_days:
+            logger.warning(f"已到第{self.state.day_count}天仍未分出胜负，结束对局")
+            self.state.game_over = True
+            return "game_end"
         
-        return {"phase": "night_phase"}
+        return "night"
     
-    @listen(voting_phase)
-    def night_phase(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    @router("night")
+    def night_phase(self) -> str:
         """
-        进入夜晚阶段
+        进入夜晚阶段，回到夜晚行动形成循环
         """
         print(f"\n=== 第{self.state.day_count}夜 ===")
         self.state.current_phase = GamePhase.NIGHT
         
-        return {"phase": "werewolf_night_action"}
+        return self.night_router()
     
-    @listen(night_phase, discussion_phase, voting_phase)
+    @listen("game_end")
     def game_over(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         游戏结束
@@ -330,75 +293,128 @@ class WerewolfGameFlow(Flow[GameState]):
         print("\n=== 游戏结束 ===")
         if self.state.winner == Team.WEREWOLF:
             print("狼人阵营获胜!")
-        else:
+        elif self.state.winner == Team.GOOD:
             print("好人阵营获胜!")
+        else:
+            print("达到最大天数，未分胜负")
+        print(f"Crew复用统计: {self.game_room.crew_pool_stats()}")
+        if self.game_room.game_memory:
+            print(f"共享记忆统计: {self.game_room.memory_stats()}")
+        print(f"Agent统计: {self.game_room.agent_stats()}，进入第一夜耗时 {self.time_to_first_night:.3f}s")
+        print(f"输出解析统计: {self.output_parser.report()}")
+        print(f"模型调用统计: {self.game_room.llm_metrics()}")
+        if self.event_log:
+            self.event_log.close()
         
         return {"phase": "end"}
     
+    # 夜间决策（只读状态，可在线程中并发执行）
+    def _decide_werewolf_target(self) -> Optional[str]:
+        """狼人群组协商击杀目标"""
+        result = self.game_room.werewolf_vote()
+        werewolves = self.state.alive_werewolves
+        repair = None
+        if werewolves:
+            repair = lambda prompt: self.game_room.single_agent_action(werewolves[0], GameTask.get_repair_task(prompt))
+        output = self.output_parser.parse(result, WerewolfVoteOutput, "werewolf", repair=repair)
+        return self._living_target(output.target_id if output else None, "werewolf", allow_werewolf=False)
+
+    def _decide_prophet_check(self) -> Optional[str]:
+        """预言家选择查验目标"""
+        prophet = self.state.find_player_by_role(Role.PROPHET, alive_only=True)
+        if not prophet:
+            return None
+        output = self._ask(prophet, GameTask.get_prophet_task(self.state), ProphetCheckOutput, "prophet")
+        return output.target_id if output else None
+
+    def _decide_witch_action(self, werewolf_target: Optional[str]) -> Dict[str, Any]:
+        """女巫根据狼人目标决定是否用药"""
+        witch = self.state.find_player_by_role(Role.WITCH, alive_only=True)
+        if not witch:
+            return {}
+        output = self._ask(witch, GameTask.get_witch_task(self.state, witch, werewolf_target), WitchActionOutput, "witch")
+        return self._extract_witch_result(output, werewolf_target)
+
+    def _decide_guard_target(self) -> Optional[str]:
+        """守卫选择守护目标"""
+        guard = self.state.find_player_by_role(Role.GUARD, alive_only=True)
+        if not guard:
+            return None
+        output = self._ask(guard, GameTask.get_guard_task(self.state), GuardProtectOutput, "guard")
+        return output.target_id if output else None
+
+    def _decide_vote(self, voter: Player, candidates: Optional[List[str]] = None) -> Optional[Vote]:
+        """单个玩家投票，candidates为PK轮的平票者"""
+        output = self._ask(voter, GameTask.get_vote_task(self.state, voter, candidates), DayVoteOutput, "vote")
+        if not output:
+            return None
+        return Vote(voter_id=voter.id, target_id=output.target_id, reason=output.reason)
+
+    def _ask(self, player: Player, task: Task, model: Type[OutputT], phase: str) -> Optional[OutputT]:
+        """单个agent执行任务并解析为结构化输出，本地解析失败时让同一个agent修复一次"""
+        result = self.game_room.single_agent_action(player, task)
+        return self.output_parser.parse(
+            result, model, phase,
+            repair=lambda prompt: self.game_room.single_agent_action(player, GameTask.get_repair_task(prompt))
+        )
+
+    # 夜间决策写入状态
+    def _apply_prophet_check(self, target: Optional[str]) -> None:
+        target = self._living_target(target, "prophet")
+        target_player = self.state.get_player(target) if target else None
+        if target_player:
+            self.state.night_action.prophet_check_target = target
+            print(f"预言家验证 {target}: {target_player.role.value}")
+
+    def _apply_witch_action(self, action_result: Dict[str, Any]) -> None:
+        witch = self.state.find_player_by_role(Role.WITCH, alive_only=True)
+        if not witch:
+            return
+        save_target = self._living_target(action_result.get("save_target"), "witch")
+        poison_target = self._living_target(action_result.get("poison_target"), "witch")
+        if save_target and witch.use_item(Item.ANTIDOTE):
+            self.state.night_action.witch_save_target = save_target
+        if poison_target and witch.use_item(Item.POISON):
+            self.state.night_action.witch_poison_target = poison_target
+        print(f"女巫行动: 救助={self.state.night_action.witch_save_target}, 毒杀={self.state.night_action.witch_poison_target}")
+
+    def _apply_guard_protect(self, target: Optional[str]) -> None:
+        target = self._living_target(target, "guard")
+        self.state.night_action.guard_protect_target = target
+        print(f"守卫守护: {target}")
+
     # 辅助方法
-    def _find_player_by_role(self, role: Role) -> Optional[str]:
-        """查找指定角色的玩家ID"""
-        for player_id, player_role in self.state.player_roles.items():
-            if player_role == role:
-                return player_id
-        return None
-    
-    def _extract_target_from_result(self, result: Dict[str, Any]) -> Optional[str]:
-        """从结果中提取目标玩家"""
-        return result.get("target")
-    
-    def _extract_prophet_result(self, result: Dict[str, Any]) -> tuple:
-        """从结果中提取预言家查验结果"""
-        target = result.get("target")
-        role = result.get("role")
-        return target, role
-    
-    def _extract_witch_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
-        """从结果中提取女巫行动结果"""
-        return {
-            "save_target": result.get("save_target"),
-            "poison_target": result.get("poison_target")
-        }
+    def _living_target(self, target: Optional[str], phase: str, allow_werewolf: bool = True) -> Optional[str]:
+        """校验夜间目标是存活玩家（狼人击杀时还不能是狼人），不合法时记录警告并视为无目标"""
+        if not target:
+            return None
+        player = self.state.get_player(target)
+        if player is None or not self.state.is_alive(target) or (not allow_werewolf and player.role == Role.WEREWOLF):
+            logger.warning(f"{phase}目标 {target} 不合法，视为无目标")
+            return None
+        return target
+
+    def _extract_witch_result(self, output: Optional[WitchActionOutput],
+                              werewolf_target: Optional[str]) -> Dict[str, Any]:
+        """从结构化输出中提取女巫行动结果，解药默认用在今晚被杀的玩家身上"""
+        if output is None or output.item is None:
+            return {"save_target": None, "poison_target": None}
+        if output.item == "antidote":
+            return {"save_target": output.target_id or werewolf_target, "poison_target": None}
+        return {"save_target": None, "poison_target": output.target_id}
     
     def _process_night_results(self, werewolf_target: Optional[str], 
                                witch_save_target: Optional[str],
                                witch_poison_target: Optional[str],
                                guard_protect_target: Optional[str]) -> Dict[str, Any]:
         """处理夜间行动结果"""
-        dead_players = []
-        protection_successful = False
-        
-        # 处理狼人击杀
-        if werewolf_target:
-            # 如果被女巫救或被守卫守护，则不会死亡
-            if werewolf_target == witch_save_target or werewolf_target == guard_protect_target:
-                protection_successful = True
-            else:
-                dead_players.append(werewolf_target)
-        
-        # 处理女巫毒杀
-        if witch_poison_target and witch_poison_target not in dead_players:
-            dead_players.append(witch_poison_target)
-        
-        return {
-            "dead_players": dead_players,
-            "protection_successful": protection_successful
-        }
+        return GameRules.process_night_results(
+            werewolf_target=werewolf_target,
+            witch_save_target=witch_save_target,
+            witch_poison_target=witch_poison_target,
+            guard_protect_target=guard_protect_target
+        )
     
     def _check_game_end(self) -> bool:
         """检查游戏是否结束"""
-        # 计算存活的狼人和好人数量
-        alive_werewolves = len(self.state.alive_werewolves)
-        alive_villagers = len(self.state.alive_villagers)
-        
-        # 判断游戏是否结束
-        if alive_werewolves == 0:
-            self.state.game_over = True
-            self.state.winner = Team.GOOD
-            return True
-        elif alive_werewolves >= alive_villagers:
-            self.state.game_over = True
-            self.state.winner = Team.WEREWOLF
-            return True
-        
-        return False
\ No newline at end of file
+        return GameRules.check_game_end(self.state)
\ No newline at end of file
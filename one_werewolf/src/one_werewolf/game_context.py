@@ -0,0 +1,170 @@
+# 增量游戏上下文
+# 公开历史按天增量追加并缓存渲染结果，旧的天数压缩成滚动摘要，整体控制在token预算内
+# 所有GameTask共用同一段前缀（规则 + 摘要 + 近期记录），角色相关的指令放在最后，便于模型服务商做prompt缓存
+import copy
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from game_state import GameState, GamePhase, Role
+from game_rules import GameRules
+import logging
+logger = logging.getLogger(__name__)
+
+_builder_lock = threading.Lock() # 并发夜晚/投票时多个线程可能同时首次获取上下文
+
+
+# 粗略估算token数：中文约1字1token，其它字符约4个1token
+def estimate_tokens(text: str) -> int:
+    cjk = sum(1 for char in text if '一' <= char <= '鿿' or '　' <= char <= '｠')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class GameContextBuilder:
+
+    def __init__(self, game_state: GameState, max_tokens: int = 1500, summary_max_tokens: int = 300):
+        """
+        Args:
+            max_tokens: 前缀（规则 + 摘要 + 近期记录）的token预算
+            summary_max_tokens: 滚动摘要的token预算，超出时丢弃最早的摘要
+        """
+        self.game_state = game_state
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+
+        self._rules = self._render_rules()
+        # 近期记录：(轮次, 完整描述, 摘要)；第N轮是第N夜和紧随其后的第N+1天白天，与flow记录的天数一致
+        self._days: List[Tuple[int, str, str]] = []
+        self._rounds: Dict[int, Dict[str, Tuple[str, str]]] = {} # 轮次 -> {"night"/"vote": (完整描述, 摘要)}
+        self._summary: List[str] = [] # 已压缩的旧记录
+        self._summary_dropped = False
+        self._synced_nights: set = set()
+        self._synced_votes: set = set()
+        self._prefix: Optional[str] = None # 渲染好的前缀缓存
+        self._lock = threading.Lock() # 增量同步和前缀重建会在多个线程中同时触发
+        self.prefix_builds = 0 # 前缀重建次数
+        self.last_prompt_tokens = 0
+
+    # flow每个阶段都会深拷贝状态（连同绑定的上下文）；锁不能拷贝，副本使用新的锁
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "GameContextBuilder":
+        copied = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copied
+        for key, value in self.__dict__.items():
+            setattr(copied, key, threading.Lock() if key == "_lock" else copy.deepcopy(value, memo))
+        return copied
+
+    # 获取游戏状态绑定的上下文（每局一个，首次调用时按settings创建，之后忽略settings）
+    @classmethod
+    def of(cls, game_state: GameState, **settings: Any) -> "GameContextBuilder":
+        with _builder_lock:
+            builder = game_state._context_builder
+            if builder is None:
+                builder = cls(game_state, **settings)
+                game_state._context_builder = builder
+            return builder
+
+    # 共享前缀：规则 + 历史摘要 + 近期记录，只在有新记录时重建
+    @property
+    def prefix(self) -> str:
+        with self._lock:
+            self._sync()
+            if self._prefix is None:
+                parts = [self._rules]
+                if self._summary:
+                    dropped = "（更早的记录已省略）\n" if self._summary_dropped else ""
+                    parts.append("【历史摘要】\n" + dropped + "\n".join(self._summary))
+                if self._days:
+                    parts.append("【近期记录】\n" + "\n".join(full for _, full, _ in self._days))
+                self._prefix = "\n\n".join(parts)
+                self.prefix_builds += 1
+            return self._prefix
+
+    # 完整上下文：共享前缀 + 当前状态
+    def render(self) -> str:
+        state = self.game_state
+        phase = "夜晚" if state.current_phase == GamePhase.NIGHT else "白天"
+        status = (f"【当前状态】第{state.day_count}天{phase}，"
+                  f"存活玩家：{', '.join(player.id + '号' for player in state.alive_players)}")
+        text = f"{self.prefix}\n\n{status}"
+        self.last_prompt_tokens = estimate_tokens(text)
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "prefix_tokens": estimate_tokens(self.prefix),
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "recent_days": len(self._days),
+            "summarized_days": len(self._summary),
+            "prefix_builds": self.prefix_builds,
+        }
+
+    ## ----------- 增量同步 -----------
+    def _sync(self) -> None:
+        """把night_record/day_vote_record中新增的记录按轮次追加到近期记录，调用方需持有self._lock
+        第N夜记在第N天、之后白天的投票记在第N+1天，两者同属第N轮，先夜晚后白天"""
+        state = self.game_state
+        changed = set()
+        for day, night_action in state.night_record.night_action.items():
+            if day not in self._synced_nights:
+                self._synced_nights.add(day)
+                self._rounds.setdefault(day, {})["night"] = self._render_night(day, night_action)
+                changed.add(day)
+        for day, day_vote in state.day_vote_record.day_vote.items():
+            if day not in self._synced_votes:
+                self._synced_votes.add(day)
+                self._rounds.setdefault(day - 1, {})["vote"] = self._render_vote(day, day_vote)
+                changed.add(day - 1)
+        if not changed:
+            return
+
+        positions = {round_no: idx for idx, (round_no, _, _) in enumerate(self._days)}
+        for round_no in sorted(changed):
+            parts = [self._rounds[round_no][kind] for kind in ("night", "vote") if kind in self._rounds[round_no]]
+            entry = (round_no, "\n".join(full for full, _ in parts), "；".join(brief for _, brief in parts))
+            # 同一轮的投票晚于夜晚同步时，更新已有的记录
+            if round_no in positions:
+                self._days[positions[round_no]] = entry
+            else:
+                self._days.append(entry)
+        self._compact()
+        self._prefix = None
+
+    def _compact(self) -> None:
+        """超出预算时把最早的近期记录压缩进摘要"""
+        def history_tokens() -> int:
+            return estimate_tokens(self._rules) + sum(estimate_tokens(line) for line in self._summary) \
+                + sum(estimate_tokens(full) for _, full, _ in self._days)
+
+        # 至少保留最近一天的完整记录
+        while len(self._days) > 1 and history_tokens() > self.max_tokens:
+            _, _, brief = self._days.pop(0)
+            self._summary.append(brief)
+        while len(self._summary) > 1 and sum(estimate_tokens(line) for line in self._summary) > self.summary_max_tokens:
+            self._summary.pop(0)
+            self._summary_dropped = True
+
+    ## ----------- 渲染 -----------
+    def _render_rules(self) -> str:
+        state = self.game_state
+        role_counts = "，".join(
+            f"{role.value}{len(state.players_by_role(role))}人" for role in Role if state.players_by_role(role)
+        )
+        return (f"【游戏规则】狼人杀，共{len(state.players)}名玩家（{role_counts}）。"
+                f"狼人阵营在存活好人数不多于狼人数时获胜，好人阵营在所有狼人出局时获胜。")
+
+    def _render_night(self, day: int, night_action) -> Tuple[str, str]:
+        # 只公开死亡结果，不泄露各角色的夜间行动
+        dead = GameRules.process_night_results(
+            werewolf_target=night_action.werewolf_target,
+            witch_save_target=night_action.witch_save_target,
+            witch_poison_target=night_action.witch_poison_target,
+            guard_protect_target=night_action.guard_protect_target
+        )["dead_players"]
+        result = f"{'、'.join(dead)}号死亡" if dead else "平安夜"
+        return f"第{day}夜：{result}", f"第{day}夜{result}"
+
+    def _render_vote(self, day: int, day_vote) -> Tuple[str, str]:
+        voted_out = day_vote.voted_out
+        result = f"{voted_out}号被放逐" if voted_out else "无人出局"
+        votes = "，".join(f"{voter_id}→{vote.target_id}" for voter_id, vote in day_vote.vote.items())
+        if day_vote.pk_vote:
+            votes += "；PK：" + "，".join(f"{voter_id}→{vote.target_id}" for voter_id, vote in day_vote.pk_vote.items())
+        return f"第{day}天投票：{votes or '无人投票'}；{result}", f"第{day}天{result}"
@@ -0,0 +1,214 @@
+# 事件溯源的对局日志
+# 击杀、救人、毒杀、守护、查验、投票、死亡等事件以紧凑JSON行追加写入，定期写入CompactGameState快照
+# 回放时从最近的快照开始重放事件，不需要调用任何模型，可用于恢复崩溃的对局或离线分析
+import base64
+import json
+from typing import Any, Dict, Iterable, List, Optional
+from game_state import GameState, Player, NightAction, DayVote, Vote, Role, Item, GamePhase
+from game_rules import GameRules
+from compact_state import CompactGameState, ROLES
+import logging
+logger = logging.getLogger(__name__)
+
+# 事件类型
+INIT = "init" # 玩家与角色表
+DAY = "day" # 进入新的一天
+KILL = "kill" # 狼人击杀目标
+SAVE = "save" # 女巫救人
+POISON = "poison" # 女巫毒杀
+PROTECT = "protect" # 守卫守护
+CHECK = "check" # 预言家查验
+VOTE = "vote" # 白天投票
+DEATH = "death" # 玩家死亡
+SNAPSHOT = "snapshot" # 状态快照
+
+
+class GameEventLog:
+    """只追加的事件日志，每个事件一行JSON并立即flush，进程崩溃最多丢失正在写的一行。
+    一个文件只记录一局：新对局打开时清空已有内容，恢复崩溃的对局时（resume=True）在原日志后继续追加"""
+
+    def __init__(self, path: str, snapshot_interval: int = 3, resume: bool = False):
+        self.path = path
+        self.snapshot_interval = snapshot_interval # 每隔多少天写一次快照
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        self.seq = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def record(self, event_type: str, day: int, **fields: Any) -> None:
+        event = {"t": event_type, "d": day}
+        event.update({key: value for key, value in fields.items() if value is not None})
+        self._file.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.seq += 1
+
+    # 对局开始：记录玩家表并写入初始快照
+    def record_init(self, game_state: GameState) -> None:
+        self.record(INIT, game_state.day_count,
+                    ids=[player.id for player in game_state.players],
+                    roles=[player.role.value for player in game_state.players])
+        self.record_snapshot(game_state)
+
+    # 没有目标的行动（狼人未选出目标、预言家或守卫已出局等）不记录
+    def record_night(self, day: int, night_action: NightAction) -> None:
+        for event_type, target in ((KILL, night_action.werewolf_target),
+                                   (CHECK, night_action.prophet_check_target),
+                                   (SAVE, night_action.witch_save_target),
+                                   (POISON, night_action.witch_poison_target),
+                                   (PROTECT, night_action.guard_protect_target)):
+            if target:
+                self.record(event_type, day, x=target)
+
+    def record_votes(self, day: int, day_vote: DayVote) -> None:
+        for voter_id, vote in day_vote.vote.items():
+            self.record(VOTE, day, p=voter_id, x=vote.target_id)
+        for voter_id, vote in day_vote.pk_vote.items():
+            self.record(VOTE, day, p=voter_id, x=vote.target_id, c="pk")
+
+    def record_deaths(self, day: int, dead_players: Iterable[str], cause: str) -> None:
+        for player_id in dead_players:
+            self.record(DEATH, day, x=player_id, c=cause)
+
+    # 进入新的一天，按间隔写入快照
+    def record_day(self, game_state: GameState) -> None:
+        self.record(DAY, game_state.day_count)
+        if (game_state.day_count - 1) % self.snapshot_interval == 0:
+            self.record_snapshot(game_state)
+
+    def record_snapshot(self, game_state: GameState) -> None:
+        compact = CompactGameState.from_game_state(game_state)
+        self.record(SNAPSHOT, game_state.day_count, s=base64.b64encode(compact.to_bytes()).decode("ascii"))
+
+
+class GameReplay:
+    """从事件日志重建任意一天的游戏状态"""
+
+    def __init__(self, events: List[Dict[str, Any]]):
+        self.events = events
+        init = next((event for event in events if event["t"] == INIT), None)
+        if init is None:
+            raise ValueError("事件日志缺少init事件")
+        self.player_ids = tuple(init["ids"])
+        self.roles = [Role(role) for role in init["roles"]]
+        self._index = {player_id: idx for idx, player_id in enumerate(self.player_ids)}
+        self._snapshots = [pos for pos, event in enumerate(events) if event["t"] == SNAPSHOT]
+
+    @classmethod
+    def load(cls, path: str) -> "GameReplay":
+        events = []
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 崩溃时可能留下写了一半的最后一行
+                    logger.warning(f"忽略无法解析的事件: {line}")
+        return cls(events)
+
+    @property
+    def last_day(self) -> int:
+        return max((event["d"] for event in self.events), default=1)
+
+    def state_at(self, day: Optional[int] = None) -> CompactGameState:
+        """重建第day天结束时（所有day <= 该天的事件之后）的状态，默认重建最新状态"""
+        day = self.last_day if day is None else day
+
+        # 找到不晚于该天的最近快照
+        start, state = 0, None
+        for pos in self._snapshots:
+            if self.events[pos]["d"] > day:
+                break
+            start = pos + 1
+            state = CompactGameState.from_bytes(base64.b64decode(self.events[pos]["s"]), self.player_ids)
+        if state is None:
+            state = self._initial_state()
+
+        for event in self.events[start:]:
+            if event["d"] > day:
+                break
+            self._apply(state, event)
+        return state
+
+    # 把日志中的状态写回已有的GameState（例如重新创建agent后恢复崩溃的对局）：
+    # 存活状态、药物、天数，以及上下文和记忆依赖的夜间行动与投票历史；对局已结束时写入winner
+    def restore(self, game_state: GameState, day: Optional[int] = None) -> GameState:
+        day = self.last_day if day is None else day
+        compact = self.state_at(day)
+        for idx, player_id in enumerate(compact.player_ids):
+            player = game_state.get_player(player_id)
+            if player is None:
+                raise ValueError(f"玩家 {player_id} 不存在")
+            if player.role != self.roles[idx]:
+                raise ValueError(f"玩家 {player_id} 的身份与日志不一致：{player.role.value} != {self.roles[idx].value}")
+            if compact.alive[idx]:
+                game_state.revive_player(player_id)
+            else:
+                game_state.kill_player(player_id)
+            player.items = {item: compact.item_count(idx, item) for item in player.items}
+        game_state.day_count = compact.day_count
+        game_state.night_action = NightAction()
+        game_state.day_vote = DayVote()
+        self._restore_records(game_state, day)
+        game_state.current_phase = self.phase_at(day)
+        game_state.game_over = False
+        game_state.winner = None
+        GameRules.check_game_end(game_state)
+        return game_state
+
+    def phase_at(self, day: Optional[int] = None) -> GamePhase:
+        """该天结束时所处的阶段：最近一次天亮之后已有放逐投票则已进入夜晚，否则仍是白天；还没天亮过则是第一夜"""
+        day = self.last_day if day is None else day
+        day_events = [event for event in self.events if event["t"] == DAY and event["d"] <= day]
+        if not day_events:
+            return GamePhase.NIGHT
+        current = day_events[-1]["d"]
+        voted = any(event["d"] == current and (event["t"] == VOTE or (event["t"] == DEATH and event.get("c") == "vote"))
+                    for event in self.events)
+        return GamePhase.NIGHT if voted else GamePhase.DAY
+
+    def events_of(self, event_type: str, day: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [event for event in self.events
+                if event["t"] == event_type and (day is None or event["d"] == day)]
+
+    def _restore_records(self, game_state: GameState, day: int) -> None:
+        """按事件重建night_record和day_vote_record，天数编号与flow写入时一致"""
+        night_fields = {KILL: "werewolf_target", CHECK: "prophet_check_target", SAVE: "witch_save_target",
+                        POISON: "witch_poison_target", PROTECT: "guard_protect_target"}
+        nights: Dict[int, NightAction] = {}
+        votes: Dict[int, DayVote] = {}
+        for event in self.events:
+            if event["d"] > day:
+                break
+            event_type = event["t"]
+            if event_type in night_fields and event.get("x"):
+                setattr(nights.setdefault(event["d"], NightAction()), night_fields[event_type], event["x"])
+            elif event_type == VOTE:
+                day_vote = votes.setdefault(event["d"], DayVote())
+                ballots = day_vote.pk_vote if event.get("c") == "pk" else day_vote.vote
+                ballots[event["p"]] = Vote(voter_id=event["p"], target_id=event["x"], reason="")
+            elif event_type == DEATH and event.get("c") == "vote":
+                votes.setdefault(event["d"], DayVote()).voted_out = event["x"]
+        game_state.night_record.night_action = nights
+        game_state.day_vote_record.day_vote = votes
+
+    def _initial_state(self) -> CompactGameState:
+        template = GameState()
+        for player_id, role in zip(self.player_ids, self.roles):
+            template.add_player(Player(id=player_id, role=role))
+        return CompactGameState.from_game_state(template)
+
+    def _apply(self, state: CompactGameState, event: Dict[str, Any]) -> None:
+        event_type = event["t"]
+        if event_type == DEATH:
+            state.kill(self._index[event["x"]])
+        elif event_type == DAY:
+            state.day_count = event["d"]
+        elif event_type in (SAVE, POISON):
+            witches = [idx for idx, role_code in enumerate(state.roles) if ROLES[role_code] == Role.WITCH]
+            if witches:
+                state.use_item(witches[0], Item.ANTIDOTE if event_type == SAVE else Item.POISON)
@@ -0,0 +1,258 @@
+# 对局级共享记忆
+# 一局游戏只有一个记忆库：每条事件只embedding一次，按可见范围（公开 / 狼人阵营 / 个人）打标签存进同一个矩阵，
+# 检索时按查看者的阵营和id用掩码过滤，embedding次数和存储量与事件数成正比，而不是事件数 × 玩家数。
+# 通过crewai的ExternalMemory接入：每个crew拿到绑定了查看者的GameMemoryView，crew自身不再开启memory
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from crewai.memory.external.external_memory import ExternalMemory
+from crewai.memory.storage.interface import Storage
+
+from game_state import GameState, Player, Role, Team
+from game_rules import GameRules
+import logging
+logger = logging.getLogger(__name__)
+
+# 可见范围
+PUBLIC = 0 # 所有玩家可见
+TEAM = 1 # 狼人阵营可见
+PRIVATE = 2 # 只有owner可见
+
+EmbedFn = Callable[[List[str]], np.ndarray] # 一批文本 -> (文本数, 维度) 的向量
+
+
+# 本地哈希embedding：字符一元和二元组哈希到固定维度，不访问网络
+def hashing_embed(texts: List[str], dim: int = 256) -> np.ndarray:
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        grams = list(text) + [text[idx:idx + 2] for idx in range(len(text) - 1)]
+        if grams:
+            buckets = np.fromiter((zlib.crc32(gram.encode("utf-8")) % dim for gram in grams), dtype=np.int64)
+            vectors[row] = np.bincount(buckets, minlength=dim)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+class GameMemory:
+
+    def __init__(self, game_state: GameState, embed_fn: Optional[EmbedFn] = None, dim: int = 256,
+                 top_k: int = 5, query_cache_size: int = 256):
+        """
+        Args:
+            embed_fn: 批量embedding函数，默认使用本地哈希embedding；返回的向量需已归一化
+            dim: 向量维度，需与embed_fn一致
+            top_k: crewai未指定数量时每次检索返回的条数
+            query_cache_size: 缓存的查询向量数，同一任务描述反复检索时不重复embedding
+        """
+        self.game_state = game_state
+        self.embed_fn = embed_fn or (lambda texts: hashing_embed(texts, dim))
+        self.top_k = top_k
+        self._lock = threading.Lock() # 并发夜晚/投票会在线程中读写记忆
+        self._texts: List[str] = []
+        self._days = np.zeros(64, dtype=np.int32)
+        self._scopes = np.zeros(64, dtype=np.int8)
+        self._owners = np.zeros(64, dtype=np.int32) # 玩家下标，非个人记忆为-1
+        self._vectors = np.zeros((64, dim), dtype=np.float32)
+        self._player_index: Dict[str, int] = {}
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._sync_lock = threading.Lock() # 同步游戏记录时整体加锁，避免同一天被写入两次
+        self._synced_nights: set = set()
+        self._synced_votes: set = set()
+        self.embed_calls = 0
+        self.embedded_texts = 0
+        self.searches = 0
+
+    # 写入一批事件：scope为可见范围，owner为个人记忆的玩家id
+    def add(self, texts: Sequence[str], scope: int = PUBLIC, owner: Optional[str] = None,
+            day: Optional[int] = None) -> None:
+        texts = [text for text in texts if text]
+        if not texts:
+            return
+        vectors = self._embed(texts)
+        owner_idx = self._index_of(owner) if owner is not None else -1
+        with self._lock:
+            start = len(self._texts)
+            self._reserve(start + len(texts))
+            end = start + len(texts)
+            self._vectors[start:end] = vectors
+            self._scopes[start:end] = scope
+            self._owners[start:end] = owner_idx
+            self._days[start:end] = self.game_state.day_count if day is None else day
+            self._texts.extend(texts)
+
+    # 按查看者检索：公开记忆 + 所在阵营的记忆 + 自己的个人记忆，按相似度取前limit条
+    def search(self, query: str, viewer: Optional[str] = None, team: Optional[Team] = None,
+               limit: Optional[int] = None, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        self.sync()
+        query_vector = self._embed_query(query)
+        limit = limit or self.top_k
+        with self._lock:
+            size = len(self._texts)
+            self.searches += 1
+            if not size:
+                return []
+            visible = self._visible_mask(size, viewer, team)
+            scores = self._vectors[:size] @ query_vector
+            scores[~visible] = -np.inf
+            candidates = np.flatnonzero(scores >= min_score)
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [{
+                "content": self._texts[idx],
+                "score": float(scores[idx]),
+                "metadata": {"day": int(self._days[idx]), "scope": int(self._scopes[idx])},
+            } for idx in ranked]
+
+    # 查看者的全部可见记忆，按写入顺序
+    def visible(self, viewer: Optional[str] = None, team: Optional[Team] = None) -> List[str]:
+        self.sync()
+        with self._lock:
+            mask = self._visible_mask(len(self._texts), viewer, team)
+            return [self._texts[idx] for idx in np.flatnonzero(mask)]
+
+    # 绑定到某个查看者的crewai外部记忆
+    def external_memory(self, viewer: Optional[Player] = None, team: Optional[Team] = None) -> ExternalMemory:
+        return ExternalMemory(storage=GameMemoryView(self, viewer, team))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "events": len(self._texts),
+                "public": int(np.count_nonzero(self._scopes[:len(self._texts)] == PUBLIC)),
+                "embed_calls": self.embed_calls,
+                "embedded_texts": self.embedded_texts,
+                "searches": self.searches,
+                "stored_kb": round(self._vectors[:len(self._texts)].nbytes / 1024, 1),
+            }
+
+    ## ----------- 从游戏记录同步事件 -----------
+    def sync(self) -> None:
+        """把night_record/day_vote_record中新增的天数写入记忆：死亡和投票公开，夜间行动按角色私有"""
+        with self._sync_lock:
+            self._sync_records()
+
+    def _sync_records(self) -> None:
+        state = self.game_state
+        for day, night_action in list(state.night_record.night_action.items()):
+            if day in self._synced_nights:
+                continue
+            self._synced_nights.add(day)
+            dead = GameRules.process_night_results(
+                werewolf_target=night_action.werewolf_target,
+                witch_save_target=night_action.witch_save_target,
+                witch_poison_target=night_action.witch_poison_target,
+                guard_protect_target=night_action.guard_protect_target
+            )["dead_players"]
+            self.add([f"第{day}夜{'、'.join(dead)}号死亡" if dead else f"第{day}夜平安夜"], PUBLIC, day=day)
+            if night_action.werewolf_target:
+                self.add([f"第{day}夜狼人选择击杀{night_action.werewolf_target}号"], TEAM, day=day)
+            for role, text in self._private_night_facts(day, night_action):
+                holder = state.find_player_by_role(role)
+                if holder:
+                    self.add([text], PRIVATE, owner=holder.id, day=day)
+        for day, day_vote in list(state.day_vote_record.day_vote.items()):
+            if day in self._synced_votes:
+                continue
+            self._synced_votes.add(day)
+            votes = [f"第{day}天{voter_id}号投票给{vote.target_id}号" for voter_id, vote in day_vote.vote.items()]
+            result = f"{day_vote.voted_out}号被放逐" if day_vote.voted_out else "无人出局"
+            self.add(votes + [f"第{day}天投票结果：{result}"], PUBLIC, day=day)
+
+    def _private_night_facts(self, day: int, night_action) -> List[tuple]:
+        facts = []
+        target = night_action.prophet_check_target
+        checked = self.game_state.get_player(target) if target else None
+        if checked:
+            facts.append((Role.PROPHET, f"第{day}夜查验{target}号，身份是{checked.role.value}"))
+        if night_action.witch_save_target:
+            facts.append((Role.WITCH, f"第{day}夜对{night_action.witch_save_target}号使用了解药"))
+        if night_action.witch_poison_target:
+            facts.append((Role.WITCH, f"第{day}夜对{night_action.witch_poison_target}号使用了毒药"))
+        if night_action.guard_protect_target:
+            facts.append((Role.GUARD, f"第{day}夜守护了{night_action.guard_protect_target}号"))
+        return facts
+
+    ## ----------- 辅助小函数 -----------
+    def _visible_mask(self, size: int, viewer: Optional[str], team: Optional[Team]) -> np.ndarray:
+        scopes = self._scopes[:size]
+        mask = scopes == PUBLIC
+        if team == Team.WEREWOLF:
+            mask |= scopes == TEAM
+        if viewer is not None and self._index_of(viewer) >= 0:
+            mask |= (scopes == PRIVATE) & (self._owners[:size] == self._index_of(viewer))
+        return mask
+
+    def _index_of(self, player_id: str) -> int:
+        # 玩家可能在记忆创建之后才加入
+        if player_id not in self._player_index:
+            self._player_index = {player.id: idx for idx, player in enumerate(self.game_state.players)}
+        return self._player_index.get(player_id, -1)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+        with self._lock:
+            self.embed_calls += 1
+            self.embedded_texts += len(texts)
+        return vectors
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        with self._lock:
+            vector = self._query_cache.get(query)
+            if vector is not None:
+                self._query_cache.move_to_end(query)
+                return vector
+        vector = self._embed([query])[0]
+        with self._lock:
+            self._query_cache[query] = vector
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return vector
+
+    def _reserve(self, size: int) -> None:
+        """容量不足时按倍数扩容"""
+        capacity = len(self._scopes)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._days = np.resize(self._days, capacity)
+        self._scopes = np.resize(self._scopes, capacity)
+        self._owners = np.resize(self._owners, capacity)
+        vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=np.float32)
+        vectors[:len(self._texts)] = self._vectors[:len(self._texts)]
+        self._vectors = vectors
+
+
+# crewai Storage适配：绑定查看者，保存的内容按查看者决定可见范围
+class GameMemoryView(Storage):
+
+    def __init__(self, memory: GameMemory, viewer: Optional[Player] = None, team: Optional[Team] = None):
+        """
+        Args:
+            viewer: 单个玩家的crew，保存为该玩家的个人记忆
+            team: 阵营crew（如狼人群组），保存为阵营记忆；两者都不传时为公开讨论，保存为公开记忆
+        """
+        self.memory = memory
+        self.viewer = viewer
+        self.team = team if team is not None else (viewer.team if viewer else None)
+
+    def save(self, value: Any, metadata: Dict[str, Any]) -> None:
+        if self.viewer is not None:
+            self.memory.add([str(value)], PRIVATE, owner=self.viewer.id)
+        elif self.team == Team.WEREWOLF:
+            self.memory.add([str(value)], TEAM)
+        else:
+            self.memory.add([str(value)], PUBLIC)
+
+    # crewai的score_threshold针对模型embedding，本地哈希embedding的相似度不在同一量纲，这里只按相似度排序取前limit条
+    def search(self, query: str, limit: int = 5, score_threshold: float = 0.6) -> List[Dict[str, Any]]:
+        viewer_id = self.viewer.id if self.viewer else None
+        return self.memory.search(query, viewer=viewer_id, team=self.team, limit=limit)
+
+    def reset(self) -> None:
+        pass
@@ -1,59 +1,153 @@
-﻿import yaml
+﻿import threading
+import time
+from contextlib import ExitStack
+import yaml
 from crewai import Agent, Crew, Task, Process
 from typing import Dict, List, Any, Optional
-from game_state import Role, GameState, Player, PlayerStatus, Team, ItemManager
+from game_state import Role, GameState, Player, Team
+from game_memory import GameMemory
+from discussion import StreamingDiscussion
 from game_task import GameTask
+from game_context import GameContextBuilder
+from crew_pool import CrewPool
+from llm_registry import LLMRegistry
+from tools.rollout_tool import RolloutTool
 import logging
 logger = logging.getLogger(__name__)
 
 
 # 游戏房间
 class GameRoom:
-    config: Dict[str, Any] = {}
-    game_state: GameState = GameState([])
-    werewolf_crew: Crew | None = None # 狼人讨论群组
-    discussion_crew: Crew | None = None # 公开讨论群组
+    """一局游戏的全部状态都挂在实例上，同一进程中的多个房间互不影响"""
 
-    def __init__(self, config_file: str = "config/werewolf_config.yaml"):
+    def __init__(self, config_file: str = "config/werewolf_config.yaml", game_state: Optional[GameState] = None,
+                 llm_registry: Optional[LLMRegistry] = None):
         self.config = self._load_config(config_file)
+        # 同一模型的玩家共享LLM实例、连接池与限流，可在多个房间间共享
+        self.llm_registry = llm_registry or LLMRegistry(self.config.get('llm_settings'))
+        # 每个房间独立的游戏状态，可由flow传入以共用同一份状态
+        self.game_state = game_state if game_state is not None else GameState()
+        self.crew_pool = CrewPool() # 跨回合复用的crew
+        self.werewolf_crew: Optional[Crew] = None # 狼人讨论群组
+        # agent在玩家第一次行动时才创建，玩家死亡后释放
+        self._player_infos: Dict[str, Dict[str, Any]] = {} # 玩家id -> 配置中的玩家信息
+        self._agents: Dict[str, Agent] = {} # 玩家id -> 已创建的agent
+        self._agent_lock = threading.Lock() # 并发夜晚/投票会在线程中取agent
+        # 每个玩家一把锁：复用的crew执行前会替换tasks，超时被放弃的投票线程可能仍在使用同一玩家的crew和agent
+        self._player_locks: Dict[str, threading.Lock] = {}
+        self.agents_built = 0
+        self.agents_released = 0
+        self.agent_build_seconds = 0.0
+        game_settings = self.config.get('game_settings', {})
+        self.memory = game_settings.get('memory', True) # 关闭后不检索记忆（基准测试用）
+        # 整局共享一个记忆库，按公开 / 狼人阵营 / 个人划分可见范围，各crew不再各自维护memory
+        self.game_memory: Optional[GameMemory] = GameMemory(self.game_state) if self.memory else None
+        self.verbose = game_settings.get('verbose', True)
+        self.discussion_settings = game_settings.get('discussion', {}) # StreamingDiscussion的参数
+        self.context_settings = game_settings.get('context', {}) # GameContextBuilder的token预算
+        self.rollout_tool = game_settings.get('rollout_tool', True) # 狼人和女巫agent可调用胜率评估工具
 
 
     # 初始化游戏房间
     def init_room(self) -> None:
-        """根据配置初始化游戏"""
+        """根据配置初始化游戏，只创建玩家，agent和crew在第一次用到时创建"""
         player_infos = self.config['game_settings']['player_info']
         
         for player_info in player_infos:
             player = self._create_player(player_info)
-            self.game_state.players.append(player)
+            self.game_state.add_player(player)
+        # 规则描述依赖玩家表，玩家加入后再按配置创建上下文
+        GameContextBuilder.of(self.game_state, **self.context_settings)
 
-        self.werewolf_crew = self._create_werewolf_crew()
-        self.discussion_crew = self._create_discussion_crew()
+    # 获取玩家的agent，不存在时创建
+    def get_agent(self, player: Player) -> Agent:
+        with self._agent_lock:
+            agent = self._agents.get(player.id)
+            if agent is None:
+                start_time = time.perf_counter()
+                agent = self._create_agent(player.id, player.role, self._player_infos[player.id]['llm'])
+                self.agent_build_seconds += time.perf_counter() - start_time
+                self.agents_built += 1
+                self._agents[player.id] = agent
+            player.agent = agent
+            return agent
 
     # 狼人群组讨论投票
     def werewolf_vote(self) -> str:
         return self._werewolf_vote()
 
-    # 单个agent执行动作（比如预言家，女巫，守卫）
-    def single_agent_action(self, agent: Agent, task: Task) -> str:
-        new_crew = Crew(
-            agents=[agent],
-            tasks=[task],
-            verbose=True
+    # 单个玩家的agent执行动作（比如预言家，女巫，守卫）
+    def single_agent_action(self, player: Player, task: Task) -> str:
+        agent = self.get_agent(player)
+        crew = self.crew_pool.get(
+            f"agent-{player.id}", [player.id],
+            lambda: Crew(agents=[agent], tasks=[], verbose=self.verbose,
+                         external_memory=self._external_memory(viewer=player))
         )
-        result = new_crew.kickoff()
+        # 复用crew，只替换任务；同一玩家的行动串行执行
+        with self._player_lock(player.id):
+            task.agent = agent
+            crew.tasks = [task]
+            result = crew.kickoff()
         return result.raw
 
+    def _player_lock(self, player_id: str) -> threading.Lock:
+        with self._agent_lock:
+            return self._player_locks.setdefault(player_id, threading.Lock())
+
+    # 玩家使用的LLM（流式发言直接调用，不经过agent）
+    def player_llm(self, player: Player) -> Any:
+        return self.llm_registry.get(self._player_infos[player.id]['llm'])
+
+    # 玩家的身份与角色设定
+    def player_backstory(self, player: Player) -> str:
+        role_config = self.config['roles'][player.role.value]
+        return Player.get_player_status_description(player.id, player.role) + role_config['backstory']
+
+    # 释放死亡玩家的agent（连同其记忆），并淘汰包含死亡玩家的crew
+    def release_dead_players(self) -> int:
+        alive_ids = {player.id for player in self.game_state.alive_players}
+        with self._agent_lock:
+            for player_id in [player_id for player_id in self._agents if player_id not in alive_ids]:
+                del self._agents[player_id]
+                self.game_state.get_player(player_id).agent = None
+                self.agents_released += 1
+        # 群组每次使用前都会从缓存池重新获取，这里只去掉对旧群组的引用
+        self.werewolf_crew = None
+        return self.crew_pool.prune(alive_ids)
+
+    # agent创建与释放统计
+    def agent_stats(self) -> Dict[str, float]:
+        with self._agent_lock:
+            return {
+                "live_agents": len(self._agents),
+                "built": self.agents_built,
+                "released": self.agents_released,
+                "build_seconds": round(self.agent_build_seconds, 4),
+            }
+
+    # 各模型调用统计
+    def llm_metrics(self) -> Dict[str, Dict[str, float]]:
+        return self.llm_registry.metrics()
+
+    # 共享记忆统计
+    def memory_stats(self) -> Dict[str, int]:
+        return self.game_memory.stats() if self.game_memory else {}
+
+    # crew复用统计
+    def crew_pool_stats(self) -> Dict[str, float]:
+        return self.crew_pool.stats()
+
     # 检查游戏是否结束
     def check_game_end(self) -> bool:
         """检查游戏是否结束"""
-        werewolves = self.game_state.alive_werewolves
-        good_players = self.game_state.alive_villagers
+        werewolves = self.game_state.alive_count(Team.WEREWOLF)
+        good_players = self.game_state.alive_count(Team.GOOD)
         
         if not werewolves:
             print("好人阵营胜利！")
             return True
-        elif len(good_players) <= len(werewolves):
+        elif good_players <= werewolves:
             print("狼人阵营胜利！")
             return True
         
@@ -68,7 +162,7 @@ class GameRoom:
     
     def _create_player(self, player_info: Dict[str, Any]) -> Player:
         """
-        动态创建玩家agent
+        创建玩家，agent延迟到get_agent时创建
         
         Args:
             player_info: 玩家信息字典，包含player_id, player_role, llm
@@ -76,30 +170,37 @@ class GameRoom:
         Returns:
             Player: 创建的玩家
         """
-        player_id = player_info['player_id']
-        role = Role(player_info['player_role'])
-        llm_model = player_info['llm']
-        
-        role_config = self.config['roles'][role]
+        player_id = str(player_info['player_id'])
+        self._player_infos[player_id] = player_info
+        return Player(
+            id=player_id,
+            role=Role(player_info['player_role'])
+        )
+
+    def _create_agent(self, player_id: str, role: Role, llm_model: str) -> Agent:
+        """动态创建玩家agent"""
+        role_config = self.config['roles'][role.value]
         
         agent = Agent(
             role=f"狼人杀玩家-{player_id}号",
             goal=role_config['goal'],
-            backstory=Player.get_player_status_description(player_id, role) + role_config['backstory'],
-            llm=llm_model,
-            verbose=True,
-            memory=True,  # Agent级别的记忆
+            backstory=self.player_backstory(self.game_state.get_player(player_id)),
+            llm=self.llm_registry.get(llm_model),
+            tools=self._agent_tools(player_id, role),
+            verbose=self.verbose,
             allow_delegation=False,
             max_iter=10
         )
-        # 添加额外信息
-        agent.metadata["player_id"] = player_id
-        
-        return Player(
-            id=player_id,
-            agent=agent,
-            role=role
-        )
+        return agent
+
+    # 狼人（击杀、投票）和女巫（毒杀、投票）可以在决策前评估各目标的胜率，工具只使用该玩家已知的信息
+    def _agent_tools(self, player_id: str, role: Role) -> List[Any]:
+        if not self.rollout_tool or role not in (Role.WEREWOLF, Role.WITCH):
+            return []
+        # 狼人知道所有同伴的身份，女巫除自己外一无所知
+        known_roles = {player.id: Role.WEREWOLF for player in self.game_state.players_by_role(Role.WEREWOLF)
+                       if player.id != player_id} if role == Role.WEREWOLF else {}
+        return [RolloutTool(game_state=self.game_state, player_id=player_id, known_roles=known_roles)]
 
     # 创建狼人讨论群组
     def _create_werewolf_crew(self) -> Crew:
@@ -110,62 +211,44 @@ class GameRoom:
             raise ValueError("没有存活的狼人,游戏应该结束了")
 
         return Crew(
-            agents=[player.agent for player in werewolves],
+            agents=[self.get_agent(player) for player in werewolves],
             tasks=[],
             process=Process.sequential,
-            memory=True,  # 启用crew级别的共享记忆
-            verbose=True,
-            max_rpm=100  # 控制请求频率
+            external_memory=self._external_memory(team=Team.WEREWOLF),  # 狼人阵营可见的共享记忆
+            verbose=self.verbose  # 请求频率由llm_registry按模型限制
         )
     
-    # 创建公开讨论群组
-    def _create_discussion_crew(self) -> Crew:
-        """创建公开讨论crew实例（只创建一次）"""
-        return Crew(
-            agents=[player.agent for player in self.game_state.alive_players],
-            tasks=[],
-            process=Process.sequential,
-            memory=True,  # 启用crew级别的共享记忆
-            verbose=True,
-            max_rpm=100  # 控制请求频率
-        )
 
-    # 保留crew中存活的agent
-    def _update_crew_agent(self, crew: Crew):
-        for agent in crew.agents:
-            if agent.metadata.get("player_id") not in [player.id for player in self.game_state.alive_players]:
-                crew.agents.remove(agent) # 删除死亡的agent
+    def _external_memory(self, viewer: Optional[Player] = None, team: Optional[Team] = None):
+        return self.game_memory.external_memory(viewer, team) if self.game_memory else None
+
+    # 按存活成员从缓存池获取群组，成员变化时重建
+    def _get_werewolf_crew(self) -> Crew:
+        return self.crew_pool.get(
+            "werewolf", [player.id for player in self.game_state.alive_werewolves],
+            self._create_werewolf_crew
+        )
     
     # 狼人投票
     def _werewolf_vote(self) -> str:
-        self._update_crew_agent(self.werewolf_crew)
-        
-        # 更新任务描述，包含当前游戏状态
-        current_context = self.game_state.get_game_state_description
-        
-        # 创建新的任务但使用相同的crew
-        vote_task = GameTask.get_werewolf_vote_task(self.game_state)
-        
-        # 更新crew的任务
-        self.werewolf_crew.tasks = [vote_task]
-        
-        result = self.werewolf_crew.kickoff()
+        self.werewolf_crew = self._get_werewolf_crew()
+
+        # 每个狼人一个投票任务，按顺序执行时后面的狼人能看到前面的意见，最后一个任务的输出为最终决定
+        vote_tasks = []
+        for agent in self.werewolf_crew.agents:
+            vote_task = GameTask.get_werewolf_vote_task(self.game_state)
+            vote_task.agent = agent
+            vote_tasks.append(vote_task)
+        
+        # 更新crew的任务，按座位顺序取得所有狼人的锁，避免与仍在运行的单人行动同时使用agent
+        with ExitStack() as stack:
+            for werewolf in self.game_state.alive_werewolves:
+                stack.enter_context(self._player_lock(werewolf.id))
+            self.werewolf_crew.tasks = vote_tasks
+            result = self.werewolf_crew.kickoff()
         return result.raw
-    
-    def day_discussion(self) -> str:
-        """白天讨论（使用持久化crew）"""
-        if not self.discussion_crew:
-            return "没有存活的玩家"
-        
-        current_context = f"第{self.game_state['day_count']}天白天，存活玩家：{[p.player_id for p in self.get_alive_players()]}"
-        
-        discussion_task = Task(
-            description=f"白天阶段，所有玩家依次发言，分析昨晚的情况，寻找狼人线索。{current_context}",
-            expected_output="发言内容和怀疑对象",
-            agent=self.discussion_crew.agents[0]
-        )
-        
-        self.discussion_crew.tasks = [discussion_task]
-        
-        result = self.discussion_crew.kickoff()
-        return result.raw
\ No newline at end of file
+
+    # 白天讨论：返回流式讨论，async for 逐块得到 (玩家, 文本块)
+    def day_discussion(self, **kwargs: Any) -> StreamingDiscussion:
+        settings = {**self.discussion_settings, **kwargs}
+        return StreamingDiscussion(self, **settings)
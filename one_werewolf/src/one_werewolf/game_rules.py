@@ -0,0 +1,65 @@
+# 狼人杀规则引擎
+# 只依赖GameState，flow与无头模拟器共用同一套结算逻辑
+from typing import Dict, Any, List, Optional
+from game_state import GameState, Team
+import logging
+logger = logging.getLogger(__name__)
+
+
+class GameRules:
+
+    # 结算夜间行动
+    @staticmethod
+    def process_night_results(werewolf_target: Optional[str],
+                              witch_save_target: Optional[str],
+                              witch_poison_target: Optional[str],
+                              guard_protect_target: Optional[str]) -> Dict[str, Any]:
+        """处理夜间行动结果"""
+        dead_players = []
+        protection_successful = False
+
+        # 处理狼人击杀（目标可能是玩家id或紧凑状态中的座位下标0）
+        if werewolf_target is not None:
+            # 如果被女巫救或被守卫守护，则不会死亡
+            if werewolf_target == witch_save_target or werewolf_target == guard_protect_target:
+                protection_successful = True
+            else:
+                dead_players.append(werewolf_target)
+
+        # 处理女巫毒杀
+        if witch_poison_target is not None and witch_poison_target not in dead_players:
+            dead_players.append(witch_poison_target)
+
+        return {
+            "dead_players": dead_players,
+            "protection_successful": protection_successful
+        }
+
+    # 将玩家标记为死亡
+    @staticmethod
+    def apply_deaths(game_state: GameState, dead_players: List[str]) -> None:
+        for player_id in dead_players:
+            game_state.kill_player(player_id)
+
+    # 根据存活人数判定胜负
+    @staticmethod
+    def check_winner(alive_werewolves: int, alive_villagers: int) -> Optional[Team]:
+        if alive_werewolves == 0:
+            return Team.GOOD
+        elif alive_werewolves >= alive_villagers:
+            return Team.WEREWOLF
+        return None
+
+    # 检查游戏是否结束
+    @staticmethod
+    def check_game_end(game_state: GameState) -> bool:
+        """检查游戏是否结束，结束时写入winner"""
+        winner = GameRules.check_winner(
+            game_state.alive_count(Team.WEREWOLF),
+            game_state.alive_count(Team.GOOD)
+        )
+        if winner is None:
+            return False
+        game_state.game_over = True
+        game_state.winner = winner
+        return True
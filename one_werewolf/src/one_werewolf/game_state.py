@@ -2,8 +2,8 @@
 # 1. game_state.py - 游戏状态管理
 from __future__ import annotations
 from crewai import Agent
-from pydantic import BaseModel
-from typing import Dict, List, Optional, Set
+from pydantic import BaseModel, PrivateAttr
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 from enum import Enum
 import logging
 logger = logging.getLogger(__name__)
@@ -46,19 +46,28 @@ class Item(Enum):
 
 class Player(BaseModel):
     id: str
-    agent: Agent
+    agent: Optional[Agent] = None # 无头模拟时没有agent
     status: PlayerStatus
     role: Role
     team: Team
     items: Dict[Item, int] = {}
 
-    def __init__(self, id: str, agent: Agent, role: Role):
-        self.id = id
-        self.agent = agent
-        self.status = PlayerStatus.ALIVE
-        self.role = role
-        self.team = Team.get_team(role)
-        self.items = ItemManager.get_role_items(role)
+    def __init__(self, id: str, role: Role, agent: Optional[Agent] = None):
+        super().__init__(
+            id=str(id),
+            agent=agent,
+            status=PlayerStatus.ALIVE,
+            role=role,
+            team=Team.get_team(role),
+            items=ItemManager.get_role_items(role)
+        )
+
+    # flow每个阶段都会深拷贝状态；agent是运行时对象（持有模型连接和锁），拷贝时共享同一个
+    def __deepcopy__(self, memo: Optional[Dict[int, Any]] = None) -> "Player":
+        memo = {} if memo is None else memo
+        if self.agent is not None:
+            memo[id(self.agent)] = self.agent
+        return super().__deepcopy__(memo)
 
     def use_item(self, item: Item):
         if item not in self.items:
@@ -74,10 +83,10 @@ class Player(BaseModel):
     def get_player_status_description(id: str, role: Role) -> str:
         return f"你的玩家id是{id}，角色是{role}，阵营是{Team.get_team(role)}"
 
-    # 获取物品剩余数量描述
+    # 获取物品剩余数量描述（传入玩家当前的items，已用完的物品不列出）
     @staticmethod
-    def get_item_description(role: Role) -> str:
-        items = ItemManager.get_role_items(role)
+    def get_item_description(items: Dict[Item, int]) -> str:
+        items = {item: count for item, count in items.items() if count > 0}
         if items:
             item_str = "，".join([f"{item.value}（{count}个）" for item, count in items.items()])
             return f"你拥有以下物品：{item_str}"
@@ -90,6 +99,7 @@ class NightAction(BaseModel):
     witch_poison_target: Optional[str] = None # 女巫毒杀目标
     witch_save_target: Optional[str] = None # 女巫救助目标
     guard_protect_target: Optional[str] = None # 守卫守护目标
+    prophet_check_target: Optional[str] = None # 预言家查验目标
 
     night_result: Optional[str] = None # 夜间行动结果
 
@@ -105,6 +115,7 @@ class Vote(BaseModel):
     voter_id: str # 投票人
     target_id: str # 投票目标
     reason: str # 投票理由
+    weight: float = 1.0 # 票权（如警长1.5票）
 
     # 获取表述
     def get_description(self):
@@ -113,6 +124,10 @@ class Vote(BaseModel):
 # 当天白天投票数据
 class DayVote(BaseModel):
     vote: Dict[str, Vote] = {} # voter_id -> vote
+    abstentions: List[str] = [] # 弃票（超时或无效）的玩家id
+    pk_vote: Dict[str, Vote] = {} # 平票PK轮的投票 voter_id -> vote
+    pk_abstentions: List[str] = [] # PK轮弃票的玩家id
+    voted_out: Optional[str] = None # 最终出局的玩家，由投票结算写入
     
     def add_vote_record(self, voter_id: str, vote: Vote):
         self.vote[voter_id] = vote
@@ -144,6 +159,55 @@ class ItemManager():
         else:
             return {}
 
+# 玩家索引：按角色、阵营、状态维护存活玩家，玩家死亡/复活时增量更新
+class PlayerIndex():
+
+    def __init__(self, players: Optional[List[Player]] = None):
+        self.by_id: Dict[str, Player] = {}
+        self.seat: Dict[str, int] = {} # 座位顺序，保证列表输出顺序稳定
+        self.by_role: Dict[Role, List[Player]] = {role: [] for role in Role}
+        # None -> 全部存活玩家；Role/Team -> 该角色/阵营的存活玩家
+        self.alive: Dict[object, Dict[str, Player]] = {key: {} for key in [None, *Role, *Team]}
+        self._alive_lists: Dict[object, Tuple[Player, ...]] = {}
+        for player in players or []:
+            self.add(player)
+
+    def add(self, player: Player) -> None:
+        if player.id in self.by_id:
+            raise ValueError(f"玩家 {player.id} 已存在")
+        self.by_id[player.id] = player
+        self.seat[player.id] = len(self.seat)
+        self.by_role[player.role].append(player)
+        if player.status == PlayerStatus.ALIVE:
+            self._set_alive(player, True)
+
+    # 更新玩家状态，状态未变化时返回False
+    def set_status(self, player: Player, status: PlayerStatus) -> bool:
+        if player.status == status:
+            return False
+        player.status = status
+        self._set_alive(player, status == PlayerStatus.ALIVE)
+        return True
+
+    # 存活玩家（按座位排序）；结果被缓存并在多处共享，返回元组防止调用方修改，需要修改时先list()
+    def alive_list(self, key: object = None) -> Tuple[Player, ...]:
+        alive_list = self._alive_lists.get(key)
+        if alive_list is None:
+            alive_list = tuple(sorted(self.alive[key].values(), key=lambda player: self.seat[player.id]))
+            self._alive_lists[key] = alive_list
+        return alive_list
+
+    def alive_count(self, key: object = None) -> int:
+        return len(self.alive[key])
+
+    def _set_alive(self, player: Player, alive: bool) -> None:
+        for key in (None, player.role, player.team):
+            if alive:
+                self.alive[key][player.id] = player
+            else:
+                self.alive[key].pop(player.id, None)
+            self._alive_lists.pop(key, None)
+
 # 游戏状态
 class GameState(BaseModel):
     # 基础游戏信息
@@ -162,24 +226,72 @@ class GameState(BaseModel):
     # 白天投票数据
     day_vote: DayVote = DayVote()
     day_vote_record: DayVoteRecord = DayVoteRecord()
+
+    # 玩家索引，玩家状态变化必须通过 kill_player / revive_player 以保持一致
+    _index: PlayerIndex = PrivateAttr(default_factory=PlayerIndex)
+    # 增量prompt上下文，见 game_context.GameContextBuilder
+    _context_builder: Any = PrivateAttr(default=None)
     
-    def __init__(self, players: List[Player]):
-        self.players = players
+    def __init__(self, players: Optional[List[Player]] = None, **data):
+        super().__init__(players=players or [], **data)
+
+    def model_post_init(self, __context) -> None:
+        self._index = PlayerIndex(self.players)
+
+    # 添加玩家
+    def add_player(self, player: Player) -> None:
+        self._index.add(player)
+        self.players.append(player)
+
+    # 按id查找玩家
+    def get_player(self, player_id: str) -> Optional[Player]:
+        return self._index.by_id.get(player_id)
+
+    # 按角色查找玩家
+    def players_by_role(self, role: Role, alive_only: bool = False) -> Sequence[Player]:
+        if alive_only:
+            return self._index.alive_list(role)
+        return self._index.by_role[role]
+
+    def find_player_by_role(self, role: Role, alive_only: bool = False) -> Optional[Player]:
+        players = self.players_by_role(role, alive_only)
+        return players[0] if players else None
+
+    def is_alive(self, player_id: str) -> bool:
+        return player_id in self._index.alive[None]
+
+    # 存活人数，可按角色或阵营过滤
+    def alive_count(self, key: Optional[Role | Team] = None) -> int:
+        return self._index.alive_count(key)
+
+    # 玩家死亡，返回状态是否发生变化
+    def kill_player(self, player_id: str) -> bool:
+        player = self.get_player(player_id)
+        if player is None:
+            logger.warning(f"玩家 {player_id} 不存在")
+            return False
+        return self._index.set_status(player, PlayerStatus.DEAD)
+
+    # 玩家复活，返回状态是否发生变化
+    def revive_player(self, player_id: str) -> bool:
+        player = self.get_player(player_id)
+        if player is None:
+            logger.warning(f"玩家 {player_id} 不存在")
+            return False
+        return self._index.set_status(player, PlayerStatus.ALIVE)
     
-    # 存活玩家列表
+    # 存活玩家列表（来自索引缓存，只读）
     @property
-    def alive_players(self) -> List[Player]:
-        return [player for player in self.players if player.status == PlayerStatus.ALIVE]
+    def alive_players(self) -> Tuple[Player, ...]:
+        return self._index.alive_list()
     
     @property
-    def alive_werewolves(self) -> List[Player]:
-        return [player for player in self.alive_players 
-                if player.role == Role.WEREWOLF]
+    def alive_werewolves(self) -> Tuple[Player, ...]:
+        return self._index.alive_list(Team.WEREWOLF)
     
     @property
-    def alive_villagers(self) -> List[Player]:
-        return [player for player in self.alive_players 
-                if player.role != Role.WEREWOLF]
+    def alive_villagers(self) -> Tuple[Player, ...]:
+        return self._index.alive_list(Team.GOOD)
 
     # 获取当前游戏状态描述
     @property
@@ -187,5 +299,5 @@ class GameState(BaseModel):
         return f"""
             第{self.day_count}天{self.current_phase == GamePhase.NIGHT and "夜晚" or "白天"}
             当前游戏状态：{self.current_phase.value["description"]}
-            存活玩家：{[player.agent.role for player in self.alive_players]}
+            存活玩家：{[f'{player.id}号' for player in self.alive_players]}
         """
\ No newline at end of file
@@ -1,41 +1,70 @@
 ﻿# 定义了狼人杀中各种task
-from game_state import GameState, Player, Role
+from game_state import GameState, Player
+from game_context import GameContextBuilder
+from task_output import (WerewolfVoteOutput, ProphetCheckOutput, WitchActionOutput,
+                         GuardProtectOutput, DayVoteOutput)
 from crewai import Task
+from typing import List, Optional
 
 class GameTask:
     
+    # 所有任务共用同一段缓存的游戏上下文，角色指令放在上下文之后
     @staticmethod
     def get_game_state_description(game_state: GameState) -> str:
-        return game_state.get_game_state_description
+        return GameContextBuilder.of(game_state).render()
+
+    @staticmethod
+    def _describe(game_state: GameState, instruction: str) -> str:
+        return f"{GameTask.get_game_state_description(game_state)}\n\n{instruction}"
     
     # 狼人投票任务
     @staticmethod
     def get_werewolf_vote_task(game_state: GameState) -> Task:
         return Task(
-            description=f"作为狼人，你需要和其他狼人协商决定今晚击杀的目标。{game_state.get_game_state_description}",
-            expected_output="选择的击杀目标玩家ID和理由,格式为json:{{'target_id': '玩家ID', 'reason': '理由'}}",
+            description=GameTask._describe(game_state, "作为狼人，你需要和其他狼人协商决定今晚击杀的目标。"),
+            expected_output=f"选择的击杀目标玩家ID和理由。{WerewolfVoteOutput.format_hint()}",
         )
 
     # 预言家任务
     @staticmethod
     def get_prophet_task(game_state: GameState) -> Task:
         return Task(
-            description=f"作为预言家，你需要预言一个玩家的身份。{game_state.get_game_state_description}",
-            expected_output="预言的玩家ID和身份,格式为json:{{'target_id': '玩家ID'}",
+            description=GameTask._describe(game_state, "作为预言家，你需要预言一个玩家的身份。"),
+            expected_output=f"查验的玩家ID。{ProphetCheckOutput.format_hint()}",
         )
 
     # 女巫任务
     @staticmethod
-    def get_witch_task(game_state: GameState) -> Task:
+    def get_witch_task(game_state: GameState, witch: Player, werewolf_target: Optional[str] = None) -> Task:
+        killed = f"今晚狼人击杀的是{werewolf_target}号玩家。" if werewolf_target else "今晚没有玩家被狼人击杀。"
+        return Task(
+            description=GameTask._describe(game_state, f"作为女巫，你需要使用解药或毒药。{killed}{Player.get_item_description(witch.items)}"),
+            expected_output=f"使用的药物（解药、毒药，不用药则为null）和目标玩家ID。{WitchActionOutput.format_hint()}",
+        )
+
+    # 白天投票任务
+    @staticmethod
+    def get_vote_task(game_state: GameState, voter: Player, candidates: Optional[List[str]] = None) -> Task:
+        instruction = f"白天投票阶段，作为{voter.id}号玩家，你需要投票放逐一名你怀疑的玩家。"
+        if candidates:
+            instruction += f"现在是平票PK，你只能在{'、'.join(c + '号' for c in candidates)}中投票。"
+        return Task(
+            description=GameTask._describe(game_state, instruction),
+            expected_output=f"投票的玩家ID和理由。{DayVoteOutput.format_hint()}",
+        )
+
+    # 输出无法解析时的修复任务
+    @staticmethod
+    def get_repair_task(repair_prompt: str) -> Task:
         return Task(
-            description=f"作为女巫，你需要使用解药或毒药。{game_state.get_game_state_description}, {Player.get_item_description(Role.WITCH)}",
-            expected_output="使用的解药或毒药,格式为json:{{'item': '解药'或'毒药', 'target_id': '玩家ID'}}",
+            description=repair_prompt,
+            expected_output="符合格式要求的json对象",
         )
 
     # 守卫任务
     @staticmethod
     def get_guard_task(game_state: GameState) -> Task:
         return Task(
-            description=f"作为守卫，你需要守护一个玩家。{game_state.get_game_state_description}",
-            expected_output="守护的玩家ID,格式为json:{{'target_id': '玩家ID'}}",
+            description=GameTask._describe(game_state, "作为守卫，你需要守护一个玩家。"),
+            expected_output=f"守护的玩家ID。{GuardProtectOutput.format_hint()}",
         )
\ No newline at end of file
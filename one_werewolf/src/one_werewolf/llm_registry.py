@@ -0,0 +1,225 @@
+# LLM客户端注册表
+# 使用同一模型的玩家共享一个LLM实例，所有请求走同一个keep-alive连接池；
+# 按模型限制并发数和RPM（替代crew上写死的max_rpm），并统计每个模型的token与延迟
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, Optional
+import httpx
+import litellm
+from crewai import LLM
+from scheduler import FairScheduler, current_room
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+# 单个模型的并发与RPM限制
+class ModelLimiter:
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, rpm: Optional[int] = None,
+                 scheduler: Optional[FairScheduler] = None):
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.scheduler = scheduler # 多房间共享的并发预算，先按房间公平排队再占用模型并发
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._window: deque = deque() # 最近60秒内的请求时间
+        self.queued = 0 # 正在排队等待的请求数
+
+    def __enter__(self) -> float:
+        """获取调用许可，返回等待秒数"""
+        start_time = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+        try:
+            if self.scheduler is not None:
+                self.scheduler.acquire()
+            self._semaphore.acquire()
+            self._wait_rpm()
+        finally:
+            with self._lock:
+                self.queued -= 1
+        return time.perf_counter() - start_time
+
+    def __exit__(self, *exc_info) -> None:
+        self._semaphore.release()
+        if self.scheduler is not None:
+            # 同一线程内contextvar不变，即为acquire时的房间
+            self.scheduler.release(current_room.get())
+
+    def _wait_rpm(self) -> None:
+        if not self.rpm:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) < self.rpm:
+                    self._window.append(now)
+                    return
+                delay = 60 - (now - self._window[0])
+            time.sleep(delay)
+
+
+# 单个模型的调用指标
+class ModelMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def record_call(self, latency: float, wait: float, error: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.latency_seconds += latency
+            self.wait_seconds += wait
+
+    # litellm风格的回调，crewai在拿到usage后调用
+    def log_success_event(self, kwargs: Any, response_obj: Dict[str, Any], start_time: Any, end_time: Any) -> None:
+        usage = response_obj.get("usage")
+        if usage is None:
+            return
+        with self._lock:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "avg_latency_seconds": round(self.latency_seconds / self.calls, 3) if self.calls else 0.0,
+                "avg_wait_seconds": round(self.wait_seconds / self.calls, 3) if self.calls else 0.0,
+            }
+
+
+# 带限流和统计的LLM，同一模型的所有agent共享一个实例
+class PooledLLM(LLM):
+
+    def __init__(self, model: str, limiter: ModelLimiter, metrics: ModelMetrics, **kwargs: Any):
+        super().__init__(model=model, **kwargs)
+        self.limiter = limiter
+        self.metrics = metrics
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None):
+        with self.limiter as wait:
+            start_time = time.perf_counter()
+            error = False
+            try:
+                return super().call(
+                    messages, tools=tools, callbacks=[*(callbacks or []), self.metrics],
+                    available_functions=available_functions, from_task=from_task, from_agent=from_agent
+                )
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.metrics.record_call(time.perf_counter() - start_time, wait, error)
+
+    def stream_text(self, messages, stop: Optional[threading.Event] = None,
+                    max_tokens: Optional[int] = None) -> Iterator[str]:
+        """流式生成纯文本（不经过agent），逐块返回内容；stop被设置时关闭连接提前结束"""
+        params = self._prepare_completion_params(messages)
+        params["stream"] = True
+        params["stream_options"] = {"include_usage": True}
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+        usage = None
+        with self.limiter as wait:
+            start_time = time.perf_counter()
+            error = False
+            try:
+                response = litellm.completion(**params)
+                try:
+                    for chunk in response:
+                        if stop is not None and stop.is_set():
+                            break
+                        usage = getattr(chunk, "usage", None) or usage
+                        choices = getattr(chunk, "choices", None)
+                        content = choices[0].delta.content if choices else None
+                        if content:
+                            yield content
+                finally:
+                    close = getattr(response, "close", None)
+                    if close is not None:
+                        close()
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.metrics.record_call(time.perf_counter() - start_time, wait, error)
+                self.metrics.log_success_event({}, {"usage": usage}, start_time, time.perf_counter())
+
+
+class LLMRegistry:
+    """
+    按模型名共享LLM实例
+
+    settings 示例（来自 werewolf_config.yaml 的 llm_settings）：
+        {"deepseek/deepseek-chat": {"max_concurrency": 8, "rpm": 300}}
+    """
+
+    _pool_lock = threading.Lock()
+    _pool_installed = False
+
+    def __init__(self, settings: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_keepalive_connections: int = 20, max_connections: int = 100,
+                 scheduler: Optional[FairScheduler] = None):
+        self.settings = settings or {}
+        self.scheduler = scheduler # 多房间共享时所有模型共用的并发预算
+        self._lock = threading.Lock()
+        self._llms: Dict[str, Any] = {}
+        self._install_connection_pool(max_keepalive_connections, max_connections)
+
+    def get(self, model: str) -> Any:
+        with self._lock:
+            llm = self._llms.get(model)
+            if llm is None:
+                model_settings = dict(self.settings.get(model, {}))
+                limiter = ModelLimiter(
+                    max_concurrency=model_settings.pop("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+                    rpm=model_settings.pop("rpm", None),
+                    scheduler=self.scheduler,
+                )
+                if model.startswith("mock/"):
+                    # 本地确定性模型，用于基准测试，不访问网络
+                    from mock_llm import MockLLM
+                    llm = MockLLM(model, limiter, ModelMetrics(), **model_settings)
+                else:
+                    # 其余配置（temperature等）直接传给LLM
+                    llm = PooledLLM(model, limiter, ModelMetrics(), **model_settings)
+                self._llms[model] = llm
+            return llm
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """各模型的token、延迟和排队指标"""
+        with self._lock:
+            llms = dict(self._llms)
+        return {model: {**llm.metrics.snapshot(), "queued": llm.limiter.queued}
+                for model, llm in llms.items()}
+
+    # litellm的全局httpx客户端，所有模型共用keep-alive连接
+    @classmethod
+    def _install_connection_pool(cls, max_keepalive_connections: int, max_connections: int) -> None:
+        with cls._pool_lock:
+            if cls._pool_installed:
+                return
+            limits = httpx.Limits(max_keepalive_connections=max_keepalive_connections,
+                                  max_connections=max_connections)
+            if litellm.client_session is None:
+                litellm.client_session = httpx.Client(limits=limits)
+            if litellm.aclient_session is None:
+                litellm.aclient_session = httpx.AsyncClient(limits=limits)
+            cls._pool_installed = True
@@ -0,0 +1,151 @@
+# 本地确定性模型
+# 根据prompt里的格式说明生成符合输出模型的回答，不访问网络；同一个种子和prompt总是得到同样的回答
+# 在配置里把玩家的llm设为 "mock/<名字>" 即可使用，可配置人工延迟和格式错误率，用于测量游戏循环本身的开销
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+from crewai.llms.base_llm import BaseLLM
+from llm_registry import ModelLimiter, ModelMetrics
+from game_context import estimate_tokens
+from scheduler import current_room
+import logging
+logger = logging.getLogger(__name__)
+
+MOCK_PREFIX = "mock/"
+
+_FORMAT_HINT = re.compile(r"格式为：(\{.*?\})")
+_ALIVE_PLAYERS = re.compile(r"存活玩家：([^\n】]*)")
+_SELF_ID = re.compile(r"你的玩家id是(\d+)")
+
+
+# 模拟的usage，字段与litellm一致
+class MockUsage:
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class MockLLM(BaseLLM):
+
+    def __init__(self, model: str, limiter: ModelLimiter, metrics: ModelMetrics, seed: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, malformed_rate: float = 0.0,
+                 chunk_latency: float = 0.0, chunk_chars: int = 4, **kwargs: Any):
+        """
+        Args:
+            seed: 随机种子，与prompt一起决定回答
+            latency: 每次调用的人工延迟秒数
+            jitter: 延迟的随机浮动秒数（±jitter）
+            malformed_rate: 返回无法解析的回答的概率，用于触发修复调用
+            chunk_latency: 流式输出时每块之间的人工延迟秒数（latency为首块延迟）
+            chunk_chars: 流式输出时每块的字符数
+        """
+        super().__init__(model=model, temperature=kwargs.get("temperature"))
+        self.limiter = limiter
+        self.metrics = metrics
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.malformed_rate = malformed_rate
+        self.chunk_latency = chunk_latency
+        self.chunk_chars = chunk_chars
+        self.sleep_seconds = 0.0 # 累计人工延迟，用于从阶段耗时中扣除
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None) -> str:
+        prompt = self._prompt_text(messages)
+        # 多房间共享同一个实例时，不同房间的对局也各不相同
+        rng = random.Random(f"{self.seed}:{current_room.get()}:{zlib.crc32(prompt.encode('utf-8'))}")
+
+        with self.limiter as wait:
+            start_time = time.perf_counter()
+            delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+            if delay:
+                time.sleep(delay)
+            answer = self.answer(prompt, rng)
+            latency = time.perf_counter() - start_time
+        self.sleep_seconds += delay
+
+        usage = MockUsage(estimate_tokens(prompt), estimate_tokens(answer))
+        for callback in [*(callbacks or []), self.metrics]:
+            if hasattr(callback, "log_success_event"):
+                callback.log_success_event({}, {"usage": usage}, start_time, time.perf_counter())
+        self.metrics.record_call(latency, wait, False)
+        # crewai的agent按ReAct格式解析回答
+        return f"Thought: 我已经有答案了\nFinal Answer: {answer}"
+
+    def stream_text(self, messages, stop: Optional[threading.Event] = None,
+                    max_tokens: Optional[int] = None) -> Iterator[str]:
+        """流式输出纯文本回答，每块之间按chunk_latency延迟；stop被设置时提前结束"""
+        prompt = self._prompt_text(messages)
+        rng = random.Random(f"{self.seed}:{current_room.get()}:{zlib.crc32(prompt.encode('utf-8'))}")
+        sent = ""
+        with self.limiter as wait:
+            start_time = time.perf_counter()
+            delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+            answer = self.answer(prompt, rng)
+            for offset in range(0, len(answer), self.chunk_chars):
+                pause = delay if not offset else self.chunk_latency
+                if pause:
+                    time.sleep(pause)
+                    self.sleep_seconds += pause
+                if stop is not None and stop.is_set():
+                    break
+                chunk = answer[offset:offset + self.chunk_chars]
+                sent += chunk
+                yield chunk
+                if max_tokens and estimate_tokens(sent) >= max_tokens:
+                    break
+            latency = time.perf_counter() - start_time
+        usage = MockUsage(estimate_tokens(prompt), estimate_tokens(sent))
+        self.metrics.log_success_event({}, {"usage": usage}, start_time, time.perf_counter())
+        self.metrics.record_call(latency, wait, False)
+
+    def answer(self, prompt: str, rng: random.Random) -> str:
+        """按prompt中的格式说明生成回答，没有格式说明时返回一段发言"""
+        alive = self._alive_players(prompt)
+        self_id = _SELF_ID.search(prompt)
+        candidates = [player_id for player_id in alive if not self_id or player_id != self_id.group(1)] or alive
+
+        if rng.random() < self.malformed_rate:
+            return "让我再想想……"
+
+        hints = _FORMAT_HINT.findall(prompt)
+        if not hints:
+            target = f"{rng.choice(candidates)}号" if candidates else "某位玩家"
+            return f"我觉得{target}的发言有些可疑，大家可以留意一下。"
+
+        try:
+            fields = json.loads(hints[-1])
+        except json.JSONDecodeError:
+            fields = {"target_id": None}
+        answer: Dict[str, Optional[str]] = {}
+        for field in fields:
+            if field == "target_id":
+                answer[field] = rng.choice(candidates) if candidates else None
+            elif field == "item":
+                answer[field] = rng.choice(["antidote", "poison", None, None])
+            else:
+                answer[field] = "根据目前的信息做出的判断"
+        return json.dumps(answer, ensure_ascii=False)
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    @staticmethod
+    def _prompt_text(messages) -> str:
+        if isinstance(messages, str):
+            return messages
+        return "\n".join(str(message.get("content", "")) for message in messages)
+
+    @staticmethod
+    def _alive_players(prompt: str) -> List[str]:
+        matches = _ALIVE_PLAYERS.findall(prompt)
+        if not matches:
+            return []
+        return re.findall(r"(\d+)号", matches[-1])
@@ -0,0 +1,262 @@
+# 蒙特卡洛rollout引擎
+# 从当前GameState出发，按某个玩家已知的信息随机补全其他人的身份，用随机策略把对局模拟到结束，
+# 统计每个候选目标对应的己方胜率。N局rollout用NumPy按 (局数, 玩家数) 的矩阵同时推进，
+# 夜间结算与胜负判定与 GameRules.process_night_results / check_winner 的规则逐条对应
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from game_state import GameState, Role, Item
+from compact_state import CompactGameState, ROLES, ROLE_CODE, ROLE_TEAM_CODE, WEREWOLF_TEAM, GOOD_TEAM
+from voting import VoteTally, TIE_FIRST
+import logging
+logger = logging.getLogger(__name__)
+
+# 可评估的行动
+KILL = "kill" # 狼人击杀目标
+PROTECT = "protect" # 守卫守护目标
+POISON = "poison" # 女巫毒杀目标
+VOTE = "vote" # 白天投票目标
+ACTIONS = (KILL, PROTECT, POISON, VOTE)
+# 只有对应角色才能执行的行动，投票所有存活玩家都可以
+ACTION_ROLES: Dict[str, Role] = {KILL: Role.WEREWOLF, PROTECT: Role.GUARD, POISON: Role.WITCH}
+
+_NONE = -1 # 无目标
+_WEREWOLF = ROLE_CODE[Role.WEREWOLF]
+_WITCH = ROLE_CODE[Role.WITCH]
+_GUARD = ROLE_CODE[Role.GUARD]
+_IS_WEREWOLF = np.array([ROLE_TEAM_CODE[code] == WEREWOLF_TEAM for code in range(len(ROLES))])
+
+
+class RolloutEngine:
+
+    def __init__(self, n_rollouts: int = 10000, time_budget: float = 0.2, max_days: int = 20,
+                 batch_size: int = 256, save_prob: float = 0.5, poison_prob: float = 0.2,
+                 tie_rule: str = TIE_FIRST, seed: Optional[int] = None):
+        """
+        Args:
+            n_rollouts: 所有候选目标合计的rollout数
+            time_budget: 时间预算（秒），每批结束后检查，超出后不再开始新的批次；每个候选目标至少完成一批
+            max_days: rollout最多模拟的天数，超出算作未分胜负
+            batch_size: 每个候选目标每批的rollout数
+            save_prob / poison_prob: 随机策略中女巫用解药 / 毒药的概率
+            tie_rule: 白天投票平票规则，批量计票没有PK轮，TIE_PK按无人出局处理
+        """
+        self.n_rollouts = n_rollouts
+        self.time_budget = time_budget
+        self.max_days = max_days
+        self.batch_size = batch_size
+        self.save_prob = save_prob
+        self.poison_prob = poison_prob
+        self.rng = np.random.default_rng(seed)
+        self.vote_tally = VoteTally(tie_rule, seed=seed)
+        self.last_stats: Dict[str, float] = {}
+
+    def evaluate(self, game_state: GameState, player_id: str, action: str,
+                 candidates: Optional[Sequence[str]] = None,
+                 known_roles: Optional[Dict[str, Role]] = None) -> Dict[str, float]:
+        """
+        评估player_id执行action时各候选目标的己方胜率
+
+        Args:
+            action: KILL / PROTECT / POISON 从今晚开始模拟，VOTE 从今天投票开始模拟
+            candidates: 候选目标，默认为所有存活的其他玩家（击杀时不含已知的狼人）
+            known_roles: 该玩家已知的身份（如预言家的查验结果），自己的身份总是已知，
+                狼人额外知道所有狼人同伴；其余玩家的身份按角色配置随机补全
+        Returns:
+            {目标玩家id: 胜率}
+        Raises:
+            ValueError: 未知的行动、玩家已出局，或该玩家的角色不能执行该行动（见ACTION_ROLES）
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"未知的行动: {action}")
+        start_time = time.perf_counter()
+        compact = CompactGameState.from_game_state(game_state)
+        seat = compact.index_of(player_id)
+        if not compact.alive[seat]:
+            raise ValueError(f"{player_id}号玩家已出局，不能执行{action}")
+        required_role = ACTION_ROLES.get(action)
+        if required_role is not None and compact.role(seat) != required_role:
+            raise ValueError(f"只有{required_role.value}可以执行{action}，{player_id}号玩家是{compact.role(seat).value}")
+        team = ROLE_TEAM_CODE[compact.roles[seat]]
+        known = self._known_roles(compact, seat, known_roles or {})
+        if candidates is None:
+            # 狼人不会击杀已知的狼人同伴
+            candidates = [compact.player_ids[idx] for idx in compact.alive_indices()
+                          if idx != seat and not (action == KILL and known[idx] == _WEREWOLF)]
+        if not candidates:
+            return {}
+        targets = [compact.index_of(candidate) for candidate in candidates]
+
+        wins = np.zeros(len(targets))
+        counts = np.zeros(len(targets))
+        per_batch = max(1, min(self.batch_size, self.n_rollouts // len(targets)))
+        rounds = 0
+        out_of_time = False
+        while counts.sum() < self.n_rollouts and not out_of_time:
+            round_count = counts.sum()
+            for idx, target in enumerate(targets):
+                winners = self._simulate(compact, known, seat, action, target, per_batch)
+                wins[idx] += np.count_nonzero(winners == team)
+                counts[idx] += len(winners)
+                if rounds and time.perf_counter() - start_time > self.time_budget:
+                    out_of_time = True
+                    break
+            rounds += 1
+            # 没有任何与已知信息相容的身份组合（例如对局已经结束）
+            if counts.sum() == round_count or time.perf_counter() - start_time > self.time_budget:
+                break
+
+        self.last_stats = {
+            "rollouts": int(counts.sum()),
+            "elapsed_seconds": round(time.perf_counter() - start_time, 4),
+        }
+        return {candidate: float(wins[idx] / counts[idx]) if counts[idx] else 0.0
+                for idx, candidate in enumerate(candidates)}
+
+    def best_target(self, game_state: GameState, player_id: str, action: str,
+                    candidates: Optional[Sequence[str]] = None,
+                    known_roles: Optional[Dict[str, Role]] = None) -> Optional[str]:
+        """胜率最高的目标"""
+        win_rates = self.evaluate(game_state, player_id, action, candidates, known_roles)
+        return max(win_rates, key=win_rates.get) if win_rates else None
+
+    ## ----------- 向量化模拟 -----------
+    def _known_roles(self, compact: CompactGameState, seat: int,
+                     known_roles: Dict[str, Role]) -> np.ndarray:
+        """每个座位已知的角色编码，未知为-1"""
+        known = np.full(len(compact.player_ids), _NONE, dtype=np.int8)
+        known[seat] = compact.roles[seat]
+        if ROLE_TEAM_CODE[compact.roles[seat]] == WEREWOLF_TEAM:
+            for idx, role_code in enumerate(compact.roles):
+                if role_code == _WEREWOLF:
+                    known[idx] = role_code
+        for player_id, role in known_roles.items():
+            known[compact.index_of(player_id)] = ROLE_CODE[role]
+        return known
+
+    def _sample_roles(self, compact: CompactGameState, known: np.ndarray, n: int) -> np.ndarray:
+        """按角色配置随机补全未知身份，返回 (n, 玩家数) 的角色编码矩阵"""
+        roles = np.tile(known, (n, 1))
+        unknown = np.flatnonzero(known == _NONE)
+        if len(unknown):
+            pool = list(compact.roles)
+            for role_code in known[known != _NONE]:
+                pool.remove(role_code)
+            pool = np.array(pool, dtype=np.int8)
+            order = np.argsort(self.rng.random((n, len(unknown))), axis=1)
+            roles[:, unknown] = pool[order]
+        return roles
+
+    def _choose(self, mask: np.ndarray) -> np.ndarray:
+        """每行在mask为True的位置中均匀随机选一个，没有可选时为-1"""
+        scores = self.rng.random(mask.shape, dtype=np.float32)
+        scores *= mask
+        choice = scores.argmax(axis=-1)
+        none = np.take_along_axis(scores, choice[..., None], axis=-1)[..., 0] == 0
+        choice[none] = _NONE
+        return choice
+
+    def _simulate(self, compact: CompactGameState, known: np.ndarray, seat: int, action: str,
+                  target: int, n: int) -> np.ndarray:
+        """模拟n局，返回每局的获胜阵营编码（未分胜负为-1）；已结束的对局每步都从矩阵中移除"""
+        roles = self._sample_roles(compact, known, n)
+        n_players = roles.shape[1]
+        alive = np.tile(np.frombuffer(bytes(compact.alive), dtype=np.uint8).astype(bool), (n, 1))
+        is_werewolf = _IS_WEREWOLF[roles]
+        witch_seat = np.where((roles == _WITCH).any(axis=1), (roles == _WITCH).argmax(axis=1), _NONE)
+        guard_seat = np.where((roles == _GUARD).any(axis=1), (roles == _GUARD).argmax(axis=1), _NONE)
+        antidote, poison = self._potions(compact, known, n)
+
+        # 已经满足结束条件的身份组合与“游戏仍在进行”矛盾，不计入统计
+        valid = self._winner(alive, is_werewolf) == _NONE
+        alive, is_werewolf, witch_seat, guard_seat, antidote, poison = (
+            alive[valid], is_werewolf[valid], witch_seat[valid], guard_seat[valid], antidote[valid], poison[valid])
+        result = np.full(len(alive), _NONE)
+        ids = np.arange(len(alive)) # 当前矩阵每一行对应的rollout
+        # 投票时玩家不能投自己，狼人不投狼人
+        not_self = ~np.eye(n_players, dtype=bool)
+
+        day = compact.day_count
+        forced = action
+        phase_is_night = action != VOTE
+        while len(ids) and day <= self.max_days:
+            rows = np.arange(len(ids))
+            if phase_is_night:
+                # ---- 夜晚：狼人击杀非狼人，守卫随机守护，女巫按概率用药 ----
+                kill = self._choose(alive & ~is_werewolf)
+                protect = self._choose(alive)
+                has_witch = witch_seat >= 0
+                poison_mask = alive.copy()
+                poison_mask[rows[has_witch], witch_seat[has_witch]] = False
+                poison_target = self._choose(poison_mask)
+                if forced == KILL:
+                    kill[:] = target
+                elif forced == PROTECT:
+                    protect[:] = target
+
+                witch_alive = has_witch & alive[rows, np.maximum(witch_seat, 0)]
+                guard_alive = (guard_seat >= 0) & alive[rows, np.maximum(guard_seat, 0)]
+                protect[~guard_alive] = _NONE
+
+                save = witch_alive & antidote & (kill >= 0) & (self.rng.random(len(rows)) < self.save_prob)
+                use_poison = witch_alive & poison & ~save & (self.rng.random(len(rows)) < self.poison_prob)
+                if forced == POISON:
+                    use_poison = witch_alive & poison
+                    poison_target[:] = target
+                antidote &= ~save
+                poison &= ~use_poison
+                forced = None
+
+                # 与GameRules.process_night_results一致：被救或被守护则不死，毒杀目标总是死亡
+                killed = (kill >= 0) & ~save & (kill != protect)
+                alive[rows[killed], kill[killed]] = False
+                poisoned = use_poison & (poison_target >= 0)
+                alive[rows[poisoned], poison_target[poisoned]] = False
+                day += 1
+            else:
+                # ---- 白天：每个存活玩家随机投票（狼人只投非狼人） ----
+                vote_mask = alive[:, None, :] & not_self[None, :, :]
+                vote_mask &= ~(is_werewolf[:, :, None] & is_werewolf[:, None, :])
+                votes = self._choose(vote_mask)
+                if forced == VOTE:
+                    votes[:, seat] = target
+                forced = None
+                votes[~alive] = _NONE
+
+                # 所有rollout一次批量计票（按座位顺序投票）
+                voted_out, _ = self.vote_tally.tally_batch(votes)
+                out = voted_out >= 0
+                alive[rows[out], voted_out[out]] = False
+            phase_is_night = not phase_is_night
+
+            # 结束的对局写入结果并移出矩阵
+            winner = self._winner(alive, is_werewolf)
+            done = winner != _NONE
+            if done.any():
+                result[ids[done]] = winner[done]
+                keep = ~done
+                alive, is_werewolf, witch_seat, guard_seat, antidote, poison, ids = (
+                    alive[keep], is_werewolf[keep], witch_seat[keep], guard_seat[keep],
+                    antidote[keep], poison[keep], ids[keep])
+
+        return result
+
+    def _potions(self, compact: CompactGameState, known: np.ndarray, n: int):
+        """女巫剩余药物：知道女巫是谁时用真实数量，否则按未使用处理"""
+        witch_seats = np.flatnonzero(known == _WITCH)
+        if len(witch_seats):
+            witch = int(witch_seats[0])
+            has_antidote = compact.item_count(witch, Item.ANTIDOTE) > 0
+            has_poison = compact.item_count(witch, Item.POISON) > 0
+        else:
+            has_antidote = has_poison = True
+        return np.full(n, has_antidote), np.full(n, has_poison)
+
+    @staticmethod
+    def _winner(alive: np.ndarray, is_werewolf: np.ndarray) -> np.ndarray:
+        """与GameRules.check_winner一致：狼人全灭好人胜，狼人数不少于好人数狼人胜"""
+        werewolves = (alive & is_werewolf).sum(axis=1)
+        good = (alive & ~is_werewolf).sum(axis=1)
+        return np.where(werewolves == 0, GOOD_TEAM, np.where(werewolves >= good, WEREWOLF_TEAM, _NONE))
@@ -0,0 +1,228 @@
+# 多房间游戏服务
+# 在同一个asyncio事件循环上运行大量互相隔离的WerewolfGameFlow，每个房间有独立的GameRoom和GameState，
+# 所有房间共享一个LLMRegistry（连接池 + 按模型限流）和一个FairScheduler（总并发预算，按房间轮转放行）
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from flow import WerewolfGameFlow
+from llm_registry import LLMRegistry
+from scheduler import FairScheduler, current_room
+from benchmark import PhaseTimer, make_mock_config, resident_memory_kb
+import logging
+logger = logging.getLogger(__name__)
+
+# 房间状态
+WAITING = "waiting"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class RoomSession:
+    """一个房间：独立的flow和游戏状态，以及运行信息"""
+
+    def __init__(self, room_id: str, flow: WerewolfGameFlow):
+        self.room_id = room_id
+        self.flow = flow
+        self.timer = PhaseTimer(flow)
+        self.status = WAITING
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def summary(self) -> Dict[str, Any]:
+        state = self.flow.state
+        return {
+            "room_id": self.room_id,
+            "status": self.status,
+            "day": state.day_count,
+            "winner": state.winner.value if state.winner else None,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "first_night_seconds": round(self.flow.time_to_first_night or 0.0, 4),
+            "error": self.error,
+        }
+
+
+class RoomManager:
+
+    def __init__(self, config_file: str = "config/werewolf_config.yaml", llm_budget: int = 32,
+                 max_active_rooms: Optional[int] = None, vote_concurrency: int = 4,
+                 max_days: int = 20, executor_workers: Optional[int] = None):
+        """
+        Args:
+            llm_budget: 所有房间同时进行的LLM调用上限
+            max_active_rooms: 同时运行的房间数上限，超出的房间排队等待，默认不限制
+            executor_workers: 执行阻塞LLM调用的线程数，默认为llm_budget的4倍
+                （排队中的调用也占用线程，需要明显多于预算）
+        """
+        self.config_file = config_file
+        with open(config_file, "r", encoding="utf-8") as file:
+            config = yaml.safe_load(file)
+        self.scheduler = FairScheduler(llm_budget)
+        self.llm_registry = LLMRegistry(config.get("llm_settings"), scheduler=self.scheduler)
+        self.vote_concurrency = vote_concurrency
+        self.max_days = max_days
+        self.executor_workers = executor_workers or llm_budget * 4
+        self._room_slots = asyncio.Semaphore(max_active_rooms) if max_active_rooms else None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.rooms: Dict[str, RoomSession] = {}
+        self._baseline_memory_kb = resident_memory_kb() # 创建房间前的常驻内存，用于估算每个房间的内存
+
+    def create_room(self, room_id: Optional[str] = None) -> RoomSession:
+        """创建房间并在当前事件循环上开始运行"""
+        self._ensure_executor()
+        room_id = room_id or uuid.uuid4().hex[:8]
+        if room_id in self.rooms:
+            raise ValueError(f"房间 {room_id} 已存在")
+        # 房间内的夜晚决策走asyncio.to_thread，避免同步的LLM调用阻塞事件循环
+        flow = WerewolfGameFlow(config_file=self.config_file, concurrent_night=True,
+                                vote_concurrency=self.vote_concurrency, max_days=self.max_days,
+                                llm_registry=self.llm_registry)
+        room = RoomSession(room_id, flow)
+        self.rooms[room_id] = room
+        room.task = asyncio.create_task(self._run_room(room), name=f"room-{room_id}")
+        return room
+
+    async def run_rooms(self, n_rooms: int) -> List[Dict[str, Any]]:
+        """创建n_rooms个房间并等待全部结束"""
+        rooms = [self.create_room() for _ in range(n_rooms)]
+        await asyncio.gather(*(room.task for room in rooms))
+        return [room.summary() for room in rooms]
+
+    async def wait_all(self) -> None:
+        tasks = [room.task for room in self.rooms.values() if room.task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """房间级指标：房间数、各阶段耗时分布、排队中的LLM调用"""
+        status_counts: Dict[str, int] = defaultdict(int)
+        phases: Dict[str, List[float]] = defaultdict(list)
+        for room in self.rooms.values():
+            status_counts[room.status] += 1
+            for phase, times in room.timer.phase_seconds.items():
+                phases[phase].extend(times)
+
+        finished = [room.wall_seconds for room in self.rooms.values() if room.status == FINISHED]
+        first_nights = [room.flow.time_to_first_night for room in self.rooms.values()
+                        if room.flow.time_to_first_night is not None]
+        live_rooms = status_counts[RUNNING] + status_counts[WAITING]
+        scheduler_stats = self.scheduler.stats()
+        return {
+            "rooms": dict(status_counts),
+            "active_rooms": status_counts[RUNNING],
+            "room_wall_seconds_p50": round(statistics.median(finished), 3) if finished else 0.0,
+            "first_night_seconds_p50": round(statistics.median(first_nights), 4) if first_nights else 0.0,
+            # 进程常驻内存增量按未结束的房间平均，房间全部结束后按全部房间平均
+            "resident_kb_per_room": round((resident_memory_kb() - self._baseline_memory_kb)
+                                          / max(1, live_rooms or len(self.rooms)), 1),
+            "queued_llm_calls": scheduler_stats["queued"],
+            "running_llm_calls": scheduler_stats["running"],
+            "llm_calls_granted": scheduler_stats["granted"],
+            "phase_latency_ms": {
+                phase: {
+                    "calls": len(times),
+                    "p50": round(statistics.median(times) * 1000, 3),
+                    "p95": round(sorted(times)[int(len(times) * 0.95)] * 1000, 3),
+                    "max": round(max(times) * 1000, 3),
+                }
+                for phase, times in sorted(phases.items()) if times
+            },
+            "llm": self.llm_registry.metrics(),
+        }
+
+    async def _run_room(self, room: RoomSession) -> None:
+        # 房间id写入contextvar，房间内的所有任务和线程都能读到，用于公平调度
+        current_room.set(room.room_id)
+        if self._room_slots is not None:
+            await self._room_slots.acquire()
+        try:
+            room.status = RUNNING
+            room.started_at = time.perf_counter()
+            await room.flow.kickoff_async()
+            room.status = FINISHED
+        except Exception as e:
+            logger.exception(f"房间 {room.room_id} 运行失败")
+            room.status = FAILED
+            room.error = repr(e)
+        finally:
+            room.finished_at = time.perf_counter()
+            if self._room_slots is not None:
+                self._room_slots.release()
+
+    def _ensure_executor(self) -> None:
+        # 默认线程池只有 min(32, CPU+4) 个线程，几百个房间会在线程池里排队，绕过公平调度
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix="room-llm")
+            asyncio.get_running_loop().set_default_executor(self._executor)
+
+
+async def serve(n_rooms: int, config_file: str, llm_budget: int, max_active_rooms: Optional[int],
+                report_interval: float = 5.0) -> Dict[str, Any]:
+    manager = RoomManager(config_file, llm_budget=llm_budget, max_active_rooms=max_active_rooms)
+    start_time = time.perf_counter()
+    runner = asyncio.create_task(manager.run_rooms(n_rooms))
+    while not runner.done():
+        await asyncio.wait([runner], timeout=report_interval)
+        if not runner.done():
+            metrics = manager.metrics()
+            logger.info(f"活跃房间 {metrics['active_rooms']}，排队LLM调用 {metrics['queued_llm_calls']}")
+    results = runner.result()
+    manager.close()
+    metrics = manager.metrics()
+    metrics["wall_seconds"] = round(time.perf_counter() - start_time, 3)
+    metrics["winners"] = {str(winner): sum(1 for result in results if result["winner"] == winner)
+                          for winner in {result["winner"] for result in results}}
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在一个进程中同时运行多个狼人杀房间")
+    parser.add_argument("-n", "--rooms", type=int, default=100, help="房间数")
+    parser.add_argument("-b", "--llm-budget", type=int, default=32, help="所有房间共享的LLM并发上限")
+    parser.add_argument("--max-active-rooms", type=int, default=None, help="同时运行的房间数上限")
+    parser.add_argument("-c", "--config", default="config/werewolf_config.yaml", help="游戏配置文件")
+    parser.add_argument("--mock-latency", type=float, default=None,
+                        help="使用本地mock模型并设置每次调用的延迟秒数（不访问网络）")
+    args = parser.parse_args()
+
+    config_file = args.config
+    if args.mock_latency is not None:
+        config = make_mock_config(args.config, seed=0, latency=args.mock_latency, jitter=args.mock_latency / 2,
+                                  malformed_rate=0.0, max_concurrency=args.llm_budget)
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml", encoding="utf-8", delete=False) as file:
+            yaml.safe_dump(config, file, allow_unicode=True)
+            config_file = file.name
+
+    try:
+        metrics = asyncio.run(serve(args.rooms, config_file, args.llm_budget, args.max_active_rooms))
+    finally:
+        if config_file != args.config:
+            os.unlink(config_file)
+    print(json.dumps(metrics, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
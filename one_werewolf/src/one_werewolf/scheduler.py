@@ -0,0 +1,78 @@
+# 多房间共享的LLM并发预算
+# 所有房间的模型调用共用一个并发额度，空出额度时按房间轮转分配，避免请求多的房间饿死其它房间
+# 当前房间通过contextvar传递：asyncio任务和asyncio.to_thread都会复制上下文，LLM调用线程里可以直接读到
+import threading
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+current_room: ContextVar[Optional[str]] = ContextVar("current_room", default=None)
+
+
+class FairScheduler:
+
+    def __init__(self, budget: int = 32):
+        """
+        Args:
+            budget: 所有房间同时进行的LLM调用上限
+        """
+        self.budget = budget
+        self._cond = threading.Condition()
+        self._running = 0
+        self._queues: "OrderedDict[Optional[str], Deque[threading.Event]]" = OrderedDict() # 房间 -> 等待中的调用
+        self._running_by_room: Dict[Optional[str], int] = {}
+        self.granted = 0
+
+    # 获取一个调用额度，返回持有额度的房间
+    def acquire(self, room_id: Optional[str] = None) -> Optional[str]:
+        room_id = current_room.get() if room_id is None else room_id
+        ticket = threading.Event()
+        with self._cond:
+            self._queues.setdefault(room_id, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.is_set():
+                self._cond.wait()
+        return room_id
+
+    def release(self, room_id: Optional[str]) -> None:
+        with self._cond:
+            self._running -= 1
+            self._running_by_room[room_id] -= 1
+            if not self._running_by_room[room_id]:
+                del self._running_by_room[room_id]
+            self._dispatch()
+
+    def queued(self, room_id: Optional[str] = None) -> int:
+        """排队中的调用数，不传room_id时为所有房间合计"""
+        with self._cond:
+            if room_id is not None:
+                return len(self._queues.get(room_id, ()))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                "budget": self.budget,
+                "running": self._running,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "granted": self.granted,
+                "queued_by_room": {str(room): len(queue) for room, queue in self._queues.items()},
+            }
+
+    def _dispatch(self) -> None:
+        """有空闲额度时按房间轮转放行，每轮每个房间最多放行一个调用"""
+        granted = False
+        while self._running < self.budget and self._queues:
+            room_id, queue = next(iter(self._queues.items()))
+            queue.popleft().set()
+            self._running += 1
+            self._running_by_room[room_id] = self._running_by_room.get(room_id, 0) + 1
+            self.granted += 1
+            granted = True
+            # 放行后该房间移到队尾，排空的房间直接移除
+            del self._queues[room_id]
+            if queue:
+                self._queues[room_id] = queue
+        if granted:
+            self._cond.notify_all()
+
@@ -0,0 +1,441 @@
+# 无头批量模拟器
+# 用脚本化决策器替代LLM crew，多进程并行运行大量对局，统计胜率、对局长度和死亡顺序
+# 夜间结算和胜负判定走GameRules，投票统计走VoteTally（平票规则可配置），与WerewolfGameFlow保持一致
+import argparse
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+import yaml
+
+from game_state import GameState, Player, Role, Team, Item, NightAction, DayVote, Vote
+from game_rules import GameRules
+from game_log import GameEventLog
+from rollout import RolloutEngine, KILL, PROTECT, VOTE
+from voting import VoteTally, TIE_FIRST, TIE_NONE, TIE_RULES
+import logging
+logger = logging.getLogger(__name__)
+
+
+# 决策器基类：每个方法对应flow中的一个LLM决策点
+class Decider(ABC):
+    """脚本化决策器，替代 werewolf_night_action、voting_phase 等阶段的LLM crew"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    # 狼人击杀目标
+    @abstractmethod
+    def werewolf_target(self, game_state: GameState) -> Optional[str]:
+        ...
+
+    # 预言家查验目标
+    @abstractmethod
+    def prophet_target(self, game_state: GameState, prophet: Player) -> Optional[str]:
+        ...
+
+    # 女巫行动，返回 (救助目标, 毒杀目标)
+    @abstractmethod
+    def witch_action(self, game_state: GameState, witch: Player,
+                     werewolf_target: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        ...
+
+    # 守卫守护目标
+    @abstractmethod
+    def guard_target(self, game_state: GameState, guard: Player) -> Optional[str]:
+        ...
+
+    # 白天投票目标
+    @abstractmethod
+    def vote_target(self, game_state: GameState, voter: Player) -> Optional[str]:
+        ...
+
+    # PK轮投票：只能投给平票者，默认沿用白天投票的选择，不在平票者中时随机选一个
+    def pk_vote_target(self, game_state: GameState, voter: Player, candidates: List[str]) -> Optional[str]:
+        target = self.vote_target(game_state, voter)
+        if target in candidates:
+            return target
+        return self._choice([game_state.get_player(player_id) for player_id in candidates])
+
+    # 通知决策器预言家的查验结果
+    def on_prophet_result(self, prophet: Player, target: Player) -> None:
+        pass
+
+    def _choice(self, players: Sequence[Player]) -> Optional[str]:
+        if not players:
+            return None
+        return self.rng.choice(players).id
+
+
+# 随机决策器：所有决策均匀随机
+class RandomDecider(Decider):
+
+    def __init__(self, seed: Optional[int] = None, save_prob: float = 0.5, poison_prob: float = 0.2):
+        super().__init__(seed)
+        self.save_prob = save_prob
+        self.poison_prob = poison_prob
+
+    def werewolf_target(self, game_state: GameState) -> Optional[str]:
+        return self._choice(game_state.alive_players)
+
+    def prophet_target(self, game_state: GameState, prophet: Player) -> Optional[str]:
+        return self._choice([p for p in game_state.alive_players if p.id != prophet.id])
+
+    def witch_action(self, game_state: GameState, witch: Player,
+                     werewolf_target: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        # 每晚最多使用一瓶药
+        if werewolf_target and witch.items.get(Item.ANTIDOTE, 0) > 0 \
+                and self.rng.random() < self.save_prob:
+            return werewolf_target, None
+        if witch.items.get(Item.POISON, 0) > 0 and self.rng.random() < self.poison_prob:
+            return None, self._choice([p for p in game_state.alive_players if p.id != witch.id])
+        return None, None
+
+    def guard_target(self, game_state: GameState, guard: Player) -> Optional[str]:
+        return self._choice(game_state.alive_players)
+
+    def vote_target(self, game_state: GameState, voter: Player) -> Optional[str]:
+        return self._choice([p for p in game_state.alive_players if p.id != voter.id])
+
+
+# 简单策略决策器：狼人不自刀不投同伴，预言家查到的狼人会被好人集中投票
+class HeuristicDecider(RandomDecider):
+
+    def __init__(self, seed: Optional[int] = None, save_prob: float = 1.0, poison_prob: float = 0.2):
+        super().__init__(seed, save_prob, poison_prob)
+        self.known_werewolves: List[str] = [] # 预言家查验出的狼人
+        self.checked: set = set() # 已查验的玩家
+
+    def werewolf_target(self, game_state: GameState) -> Optional[str]:
+        return self._choice(game_state.alive_villagers)
+
+    def prophet_target(self, game_state: GameState, prophet: Player) -> Optional[str]:
+        return self._choice([p for p in game_state.alive_players
+                             if p.id != prophet.id and p.id not in self.checked])
+
+    def on_prophet_result(self, prophet: Player, target: Player) -> None:
+        self.checked.add(target.id)
+        if target.role == Role.WEREWOLF:
+            self.known_werewolves.append(target.id)
+
+    def vote_target(self, game_state: GameState, voter: Player) -> Optional[str]:
+        if voter.role == Role.WEREWOLF:
+            return self._choice(game_state.alive_villagers)
+        for werewolf_id in self.known_werewolves:
+            if game_state.is_alive(werewolf_id):
+                return werewolf_id
+        return super().vote_target(game_state, voter)
+
+
+# rollout决策器：狼人击杀、守卫守护和白天投票选择rollout胜率最高的目标，其余同HeuristicDecider
+class RolloutDecider(HeuristicDecider):
+
+    def __init__(self, seed: Optional[int] = None, n_rollouts: int = 1000):
+        super().__init__(seed)
+        self.engine = RolloutEngine(n_rollouts=n_rollouts, seed=seed)
+
+    def werewolf_target(self, game_state: GameState) -> Optional[str]:
+        werewolves = game_state.alive_werewolves
+        if not werewolves:
+            return None
+        return self.engine.best_target(game_state, werewolves[0].id, KILL,
+                                       [p.id for p in game_state.alive_villagers])
+
+    def guard_target(self, game_state: GameState, guard: Player) -> Optional[str]:
+        return self.engine.best_target(game_state, guard.id, PROTECT,
+                                       [p.id for p in game_state.alive_players])
+
+    def vote_target(self, game_state: GameState, voter: Player) -> Optional[str]:
+        if voter.role == Role.WEREWOLF:
+            return self.engine.best_target(game_state, voter.id, VOTE,
+                                           [p.id for p in game_state.alive_villagers])
+        # 预言家公开的查验结果所有好人都知道
+        known_roles = {werewolf_id: Role.WEREWOLF for werewolf_id in self.known_werewolves}
+        return self.engine.best_target(game_state, voter.id, VOTE, known_roles=known_roles)
+
+
+DECIDERS: Dict[str, Type[Decider]] = {
+    "random": RandomDecider,
+    "heuristic": HeuristicDecider,
+    "rollout": RolloutDecider,
+}
+
+
+# 单局模拟
+class GameSimulator:
+
+    def __init__(self, player_roles: List[Role], decider: Decider, max_days: int = 20,
+                 event_log: Optional[GameEventLog] = None, tie_rule: str = TIE_FIRST, seed: Optional[int] = None):
+        self.decider = decider
+        self.max_days = max_days
+        self.event_log = event_log
+        self.vote_tally = VoteTally(tie_rule, seed=seed) # TIE_RANDOM时使用
+        self.game_state = GameState([
+            Player(id=str(i + 1), role=role) for i, role in enumerate(player_roles)
+        ])
+        self.deaths: List[Dict[str, Any]] = [] # 按死亡顺序记录
+        if self.event_log:
+            self.event_log.record_init(self.game_state)
+
+    def run(self) -> Dict[str, Any]:
+        """运行一局游戏直到结束或达到最大天数"""
+        state = self.game_state
+        while not state.game_over and state.day_count <= self.max_days:
+            if self._night() or self._day():
+                break
+            state.day_count += 1
+            if self.event_log:
+                self.event_log.record_day(state)
+
+        return {
+            "winner": state.winner.value if state.winner else None,
+            "days": state.day_count,
+            "deaths": self.deaths,
+            "votes": self._vote_stats(),
+        }
+
+    # 夜晚：狼人 -> 预言家 -> 女巫 -> 守卫 -> 结算
+    def _night(self) -> bool:
+        state = self.game_state
+        decider = self.decider
+        action = NightAction()
+
+        action.werewolf_target = decider.werewolf_target(state)
+
+        prophet = self._alive_by_role(Role.PROPHET)
+        if prophet:
+            action.prophet_check_target = decider.prophet_target(state, prophet)
+            if action.prophet_check_target:
+                decider.on_prophet_result(prophet, state.get_player(action.prophet_check_target))
+
+        witch = self._alive_by_role(Role.WITCH)
+        if witch:
+            save_target, poison_target = decider.witch_action(state, witch, action.werewolf_target)
+            if save_target and witch.use_item(Item.ANTIDOTE):
+                action.witch_save_target = save_target
+            if poison_target and witch.use_item(Item.POISON):
+                action.witch_poison_target = poison_target
+
+        guard = self._alive_by_role(Role.GUARD)
+        if guard:
+            action.guard_protect_target = decider.guard_target(state, guard)
+
+        night_result = GameRules.process_night_results(
+            werewolf_target=action.werewolf_target,
+            witch_save_target=action.witch_save_target,
+            witch_poison_target=action.witch_poison_target,
+            guard_protect_target=action.guard_protect_target
+        )
+        for player_id in night_result["dead_players"]:
+            cause = "poison" if player_id == action.witch_poison_target else "werewolf"
+            self._record_death(player_id, cause)
+        GameRules.apply_deaths(state, night_result["dead_players"])
+        state.night_record.add_night_action_record(state.day_count, action)
+        if self.event_log:
+            self.event_log.record_night(state.day_count, action)
+
+        return GameRules.check_game_end(state)
+
+    # 白天：投票 -> 结算
+    def _day(self) -> bool:
+        state = self.game_state
+        day_vote = DayVote()
+        for voter in state.alive_players:
+            target = self.decider.vote_target(state, voter)
+            if target is None:
+                continue
+            day_vote.add_vote_record(voter.id, Vote(voter_id=voter.id, target_id=target, reason="模拟投票"))
+
+        result = self.vote_tally.tally(day_vote)
+        voted_out = result.voted_out
+        if result.pk_candidates:
+            # PK轮：平票者不投票，其余玩家只能在平票者中投票，再次平票则无人出局
+            for voter in state.alive_players:
+                if voter.id in result.pk_candidates:
+                    continue
+                target = self.decider.pk_vote_target(state, voter, result.pk_candidates)
+                if target is not None:
+                    day_vote.pk_vote[voter.id] = Vote(voter_id=voter.id, target_id=target, reason="模拟PK投票")
+                else:
+                    day_vote.pk_abstentions.append(voter.id)
+            voted_out = self.vote_tally.tally(day_vote.pk_vote, tie_rule=TIE_NONE).voted_out
+        day_vote.voted_out = voted_out
+        if self.event_log:
+            self.event_log.record_votes(state.day_count, day_vote)
+        if voted_out:
+            self._record_death(voted_out, "vote")
+            GameRules.apply_deaths(state, [voted_out])
+        state.day_vote_record.add_day_vote_record(state.day_count, day_vote)
+
+        return GameRules.check_game_end(state)
+
+    def _vote_stats(self) -> Dict[str, Optional[float]]:
+        """狼人得票占比，以及狼人两两投给同一目标的天数占比（抱团投票）"""
+        state = self.game_state
+        player_ids = [player.id for player in state.players]
+        days, matrix = VoteTally.vote_matrix(state.day_vote_record, player_ids)
+        werewolf = np.array([player.role == Role.WEREWOLF for player in state.players])
+        received = VoteTally.votes_received(matrix).sum(axis=0)
+        co_voting = VoteTally.co_voting(matrix)[np.ix_(werewolf, werewolf)]
+        pairs = np.triu_indices(len(co_voting), k=1)
+        return {
+            "werewolf_vote_share": float(received[werewolf].sum() / received.sum()) if received.sum() else None,
+            "werewolf_co_vote_rate": float(co_voting[pairs].mean() / len(days)) if days and len(pairs[0]) else None,
+        }
+
+    def _alive_by_role(self, role: Role) -> Optional[Player]:
+        return self.game_state.find_player_by_role(role, alive_only=True)
+
+    def _record_death(self, player_id: str, cause: str) -> None:
+        player = self.game_state.get_player(player_id)
+        if self.event_log:
+            self.event_log.record_deaths(self.game_state.day_count, [player_id], cause)
+        self.deaths.append({
+            "day": self.game_state.day_count,
+            "player_id": player_id,
+            "role": player.role.value,
+            "cause": cause,
+        })
+
+
+## ----------- 批量运行 -----------
+
+# 从配置文件读取角色分配
+def load_player_roles(config_file: str = "config/werewolf_config.yaml") -> List[Role]:
+    with open(config_file, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    return [Role(info['player_role']) for info in config['game_settings']['player_info']]
+
+
+# 进程池worker：连续运行一批对局
+def _run_chunk(args: Tuple[List[Role], Type[Decider], List[int], int, str]) -> List[Dict[str, Any]]:
+    player_roles, decider_cls, seeds, max_days, tie_rule = args
+    results = []
+    for seed in seeds:
+        # 角色分配按种子打乱，避免玩家id与角色绑定
+        roles = list(player_roles)
+        random.Random(seed).shuffle(roles)
+        simulator = GameSimulator(roles, decider_cls(seed=seed), max_days=max_days,
+                                  tie_rule=tie_rule, seed=seed)
+        results.append(simulator.run())
+    return results
+
+
+def run_batch(n_games: int,
+              decider: Union[str, Type[Decider]] = "random",
+              workers: Optional[int] = None,
+              seed: int = 0,
+              max_days: int = 20,
+              player_roles: Optional[List[Role]] = None,
+              config_file: str = "config/werewolf_config.yaml",
+              tie_rule: str = TIE_FIRST) -> Dict[str, Any]:
+    """
+    多进程批量模拟对局
+
+    Args:
+        n_games: 对局数
+        decider: 决策器名称（见DECIDERS）或Decider子类
+        workers: 进程数，默认CPU核数；1表示在当前进程内运行
+        seed: 起始随机种子，第i局使用 seed + i，结果可复现
+        max_days: 单局最大天数，超过视为平局
+        tie_rule: 白天投票平票规则，见voting.TIE_RULES
+
+    Returns:
+        Dict: 汇总统计，见 summarize
+    """
+    decider_cls = DECIDERS[decider] if isinstance(decider, str) else decider
+    roles = player_roles or load_player_roles(config_file)
+
+    seeds = list(range(seed, seed + n_games))
+    n_chunks = max(1, min(n_games, (workers or 1) * 4))
+    chunks = [(roles, decider_cls, seeds[i::n_chunks], max_days, tie_rule) for i in range(n_chunks)]
+
+    start_time = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    if workers == 1:
+        for chunk in chunks:
+            results.extend(_run_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_results in executor.map(_run_chunk, chunks):
+                results.extend(chunk_results)
+    elapsed = time.perf_counter() - start_time
+
+    stats = summarize(results)
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["games_per_second"] = round(len(results) / elapsed, 1) if elapsed else None
+    return stats
+
+
+# 汇总统计：胜率、对局长度、死亡顺序、投票行为
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    n_games = len(results)
+    if not n_games:
+        return {"games": 0}
+
+    winners = Counter(result["winner"] for result in results)
+    days = [result["days"] for result in results]
+
+    # 各角色平均死亡次序（1表示第一个死亡），存活到最后的不计入
+    death_positions = defaultdict(list)
+    first_death = Counter()
+    death_causes = Counter()
+    for result in results:
+        for position, death in enumerate(result["deaths"], start=1):
+            death_positions[death["role"]].append(position)
+            death_causes[death["cause"]] += 1
+        if result["deaths"]:
+            first_death[result["deaths"][0]["role"]] += 1
+
+    def mean_vote_stat(name: str) -> Optional[float]:
+        values = [result["votes"][name] for result in results if result["votes"][name] is not None]
+        return sum(values) / len(values) if values else None
+
+    return {
+        "games": n_games,
+        "win_rate": {
+            Team.GOOD.value: winners[Team.GOOD.value] / n_games,
+            Team.WEREWOLF.value: winners[Team.WEREWOLF.value] / n_games,
+            "draw": winners[None] / n_games,
+        },
+        "game_length": {
+            "mean": sum(days) / n_games,
+            "min": min(days),
+            "max": max(days),
+            "histogram": dict(sorted(Counter(days).items())),
+        },
+        "death_order": {
+            "mean_position": {role: sum(pos) / len(pos) for role, pos in sorted(death_positions.items())},
+            "first_death_rate": {role: count / n_games for role, count in first_death.most_common()},
+            "causes": dict(death_causes),
+        },
+        "votes": {
+            "werewolf_vote_share": mean_vote_stat("werewolf_vote_share"),
+            "werewolf_co_vote_rate": mean_vote_stat("werewolf_co_vote_rate"),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="狼人杀无头批量模拟")
+    parser.add_argument("-n", "--games", type=int, default=1000, help="对局数")
+    parser.add_argument("-d", "--decider", choices=sorted(DECIDERS), default="random", help="决策器")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="进程数，默认CPU核数")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="起始随机种子")
+    parser.add_argument("--max-days", type=int, default=20, help="单局最大天数")
+    parser.add_argument("--tie-rule", choices=TIE_RULES, default=TIE_FIRST, help="白天投票平票规则")
+    parser.add_argument("-c", "--config", default="config/werewolf_config.yaml", help="游戏配置文件")
+    args = parser.parse_args()
+
+    stats = run_batch(args.games, decider=args.decider, workers=args.workers,
+                      seed=args.seed, max_days=args.max_days, config_file=args.config, tie_rule=args.tie_rule)
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# 游戏任务的结构化输出
+# 每个任务一个pydantic输出模型；先用宽松的本地解析（单引号、代码块、中文标点），失败时才发起一次修复调用
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+from pydantic import BaseModel, ValidationError, field_validator
+import logging
+logger = logging.getLogger(__name__)
+
+
+# 带目标玩家的输出，target_id统一成字符串id（"3号" / 3 -> "3"）
+class TargetOutput(BaseModel):
+    target_id: Optional[str] = None
+
+    @field_validator("target_id", mode="before")
+    @classmethod
+    def normalize_target(cls, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        match = re.search(r"\d+", str(value))
+        return match.group(0) if match else None
+
+    # 给expected_output用的格式说明
+    @classmethod
+    def format_hint(cls) -> str:
+        example = {name: f"<{name}>" for name in cls.model_fields}
+        return "只输出一个json对象，格式为：" + json.dumps(example, ensure_ascii=False)
+
+
+class WerewolfVoteOutput(TargetOutput):
+    target_id: str
+    reason: str = ""
+
+
+class ProphetCheckOutput(TargetOutput):
+    target_id: str
+
+
+class GuardProtectOutput(TargetOutput):
+    target_id: str
+
+
+class DayVoteOutput(TargetOutput):
+    target_id: str
+    reason: str = ""
+
+
+class WitchActionOutput(TargetOutput):
+    item: Optional[str] = None # "antidote" / "poison" / None（不用药）
+
+    @field_validator("item", mode="before")
+    @classmethod
+    def normalize_item(cls, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        text = str(value).lower()
+        # "不用药" / "不救" / "none" 等表示不用药
+        if re.search(r"不|没|无|none|null|^no\b", text):
+            return None
+        if "解" in text or "救" in text or "antidote" in text or "save" in text:
+            return "antidote"
+        if "毒" in text or "poison" in text:
+            return "poison"
+        return None
+
+
+# 中文标点 -> json标点
+_PUNCTUATION = str.maketrans({
+    "：": ":", "，": ",", "“": '"', "”": '"', "‘": "'", "’": "'",
+    "｛": "{", "｝": "}", "【": "[", "】": "]",
+})
+_CODE_FENCE = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.I)
+_DECODER = json.JSONDecoder()
+
+OutputT = TypeVar("OutputT", bound=BaseModel)
+
+
+# 宽松解析为dict，失败返回None
+def loose_json(raw: str) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    text = raw.strip()
+    fence = _CODE_FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+    text = text.translate(_PUNCTUATION)
+
+    # 从每个"{"开始尝试解析完整的json对象（可以包含嵌套对象和"}"）
+    for attempt in (text, text.replace("'", '"')):
+        start = attempt.find("{")
+        while start != -1:
+            try:
+                data, _ = _DECODER.raw_decode(attempt, start)
+            except json.JSONDecodeError:
+                data = None
+            if isinstance(data, dict):
+                return data
+            start = attempt.find("{", start + 1)
+
+    # 兜底：逐个提取 key: value
+    pairs = re.findall(r"[\"']?(\w+)[\"']?\s*:\s*[\"']?([^,\"'}\n]+)", text)
+    return {key: value.strip() for key, value in pairs} or None
+
+
+class OutputParser:
+    """按阶段统计解析成功率和修复次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def parse(self, raw: str, model: Type[OutputT], phase: str,
+              repair: Optional[Callable[[str], str]] = None) -> Optional[OutputT]:
+        """
+        解析agent输出
+
+        Args:
+            raw: agent原始输出
+            model: 输出模型
+            phase: 阶段名，用于统计
+            repair: 修复调用，参数为修复提示，返回新的原始输出；只在本地解析失败时调用一次
+        """
+        result = self._parse_local(raw, model)
+        if result is not None:
+            self._count(phase, "fast_path")
+            return result
+
+        if repair is not None:
+            self._count(phase, "retries")
+            result = self._parse_local(repair(self.repair_prompt(raw, model)), model)
+            if result is not None:
+                self._count(phase, "repaired")
+                return result
+
+        logger.warning(f"[{phase}] 无法解析agent输出: {raw}")
+        self._count(phase, "failed")
+        return None
+
+    @staticmethod
+    def repair_prompt(raw: str, model: Type[BaseModel]) -> str:
+        hint = model.format_hint() if issubclass(model, TargetOutput) else ""
+        return f"你上一次的回答无法解析：\n{raw}\n请重新回答。{hint}"
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """各阶段解析统计：成功率和平均重试次数"""
+        with self._lock:
+            report = {}
+            for phase, counts in self.stats.items():
+                total = counts.get("fast_path", 0) + counts.get("repaired", 0) + counts.get("failed", 0)
+                report[phase] = dict(counts)
+                report[phase]["success_rate"] = round(
+                    (counts.get("fast_path", 0) + counts.get("repaired", 0)) / total, 3) if total else 0.0
+                report[phase]["retries_per_call"] = round(counts.get("retries", 0) / total, 3) if total else 0.0
+            return report
+
+    def _parse_local(self, raw: str, model: Type[OutputT]) -> Optional[OutputT]:
+        data = loose_json(raw)
+        if data is not None and not (data.keys() & (set(model.model_fields) | {"target"})):
+            # 兜底的 key: value 可能来自普通文字（如“理由：……”），没有任何输出字段时视为没有解析出结果
+            data = None
+        if data is None and "target_id" in model.model_fields:
+            # 没有json但只提到了一个玩家，例如“我选择3号”
+            mentioned = set(re.findall(r"(\d+)\s*号", raw or ""))
+            if len(mentioned) == 1:
+                data = {"target_id": mentioned.pop()}
+        if data is None:
+            return None
+        # 兼容旧的 target 键
+        if "target_id" in model.model_fields and "target_id" not in data and "target" in data:
+            data["target_id"] = data["target"]
+        try:
+            return model.model_validate(data)
+        except ValidationError:
+            return None
+
+    def _count(self, phase: str, key: str) -> None:
+        with self._lock:
+            counts = self.stats.setdefault(phase, {})
+            counts[key] = counts.get(key, 0) + 1
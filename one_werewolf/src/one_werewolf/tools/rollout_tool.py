@@ -0,0 +1,60 @@
+from typing import Any, Dict, List, Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, ConfigDict, Field
+
+from game_state import GameState, Role
+from rollout import RolloutEngine, ACTIONS, ACTION_ROLES
+from task_output import TargetOutput
+
+
+class RolloutToolInput(BaseModel):
+    """Input schema for RolloutTool."""
+
+    action: str = Field(..., description=f"要评估的行动，可选：{', '.join(ACTIONS)}")
+    candidates: Optional[List[str]] = Field(None, description="候选目标玩家ID列表，默认为所有存活的其他玩家")
+
+
+class RolloutTool(BaseTool):
+    """绑定到一名玩家的胜率评估工具，只使用该玩家已知的信息"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str = "胜率评估"
+    description: str = (
+        "对当前局面做大量随机模拟，返回你选择每个候选目标时己方阵营的胜率。"
+        "在决定击杀（狼人，kill）、守护（守卫，protect）、毒杀（女巫，poison）或投票（vote）目标前使用，"
+        "只能评估你的角色能执行的行动。"
+    )
+    args_schema: Type[BaseModel] = RolloutToolInput
+
+    game_state: GameState
+    player_id: str
+    known_roles: Dict[str, Role] = {} # 该玩家额外知道的身份，例如预言家的查验结果
+    engine: Any = Field(default_factory=RolloutEngine)
+
+    def _run(self, action: str, candidates: Optional[List[str]] = None) -> str:
+        if action not in ACTIONS:
+            return f"未知的行动 {action}，可选：{', '.join(ACTIONS)}"
+        player = self.game_state.get_player(self.player_id)
+        required_role = ACTION_ROLES.get(action)
+        if required_role is not None and player.role != required_role:
+            allowed = [name for name in ACTIONS if ACTION_ROLES.get(name) in (None, player.role)]
+            return f"你的角色不能执行 {action}，可评估的行动：{', '.join(allowed)}"
+        if candidates is not None:
+            # 模型可能给出"3号"之类的写法或不存在、已出局的玩家，统一成存活玩家id并去重
+            normalized = [TargetOutput.normalize_target(candidate) for candidate in candidates]
+            candidates = list(dict.fromkeys(candidate for candidate in normalized
+                                            if candidate and self.game_state.is_alive(candidate)))
+            if not candidates:
+                alive = "、".join(f"{player.id}号" for player in self.game_state.alive_players)
+                return f"候选目标中没有存活的玩家，存活玩家：{alive}"
+        try:
+            win_rates = self.engine.evaluate(self.game_state, self.player_id, action,
+                                             candidates, self.known_roles)
+        except ValueError as e:
+            return f"无法评估：{e}"
+        if not win_rates:
+            return "没有可选的目标"
+        ranked = sorted(win_rates.items(), key=lambda item: -item[1])
+        return "；".join(f"{target}号：胜率{rate:.1%}" for target, rate in ranked)
@@ -0,0 +1,241 @@
+# 白天投票引擎
+# AsyncVotingEngine：每个存活玩家一个投票请求并发执行，限制并发数和单票超时，白天耗时取决于最慢的投票者而不是所有投票之和
+# VoteTally：带票权的计票与平票规则（PK / 不出局 / 随机 / 先被投者），并支持用NumPy数组批量计票和跨天投票矩阵
+import asyncio
+import random
+import threading
+import time
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from game_state import GameState, Player, Vote, DayVote, DayVoteRecord
+import logging
+logger = logging.getLogger(__name__)
+
+# 投票函数：给定投票人和可投目标（None为任意存活玩家），返回Vote或目标玩家id，None表示弃票
+VoteFn = Callable[[Player, Optional[List[str]]], Union[Vote, str, None]]
+
+# 平票规则
+TIE_FIRST = "first" # 先被投票者出局
+TIE_PK = "pk" # 平票者进入PK轮，其余玩家在平票者中重新投票
+TIE_NONE = "none" # 平票无人出局
+TIE_RANDOM = "random" # 平票者中随机一人出局
+TIE_RULES = (TIE_FIRST, TIE_PK, TIE_NONE, TIE_RANDOM)
+
+
+class AsyncVotingEngine:
+
+    def __init__(self, vote_fn: VoteFn, max_concurrency: int = 4, vote_timeout: float = 60.0):
+        """
+        Args:
+            vote_fn: 同步投票函数，在线程池中执行（通常是一次LLM调用）
+            max_concurrency: 同时进行的投票请求上限
+            vote_timeout: 单票超时秒数，超时视为弃票
+        """
+        self.vote_fn = vote_fn
+        self.max_concurrency = max_concurrency
+        self.vote_timeout = vote_timeout
+        self.last_latency: Dict[str, float] = {} # 最近一次投票各玩家耗时
+        # 超时被放弃、线程仍在运行的投票：玩家id -> 线程结束事件
+        # 线程无法取消，这些玩家在线程结束前不再发起新的投票（例如紧接着的PK轮），直接记为弃票
+        self._abandoned: Dict[str, threading.Event] = {}
+
+    async def collect(self, game_state: GameState, candidates: Optional[List[str]] = None) -> DayVote:
+        """
+        向所有存活玩家并发发起投票，收集为DayVote
+
+        Args:
+            candidates: PK轮的平票者，只能投给他们，平票者本人不投票
+        """
+        eligible = [voter for voter in game_state.alive_players if not candidates or voter.id not in candidates]
+        if not eligible:
+            eligible = list(game_state.alive_players)
+        voters = [voter for voter in eligible if not self.is_abandoned(voter.id)]
+        for voter in eligible:
+            if voter not in voters:
+                logger.warning(f"玩家 {voter.id} 上一次超时的投票仍在进行，本轮视为弃票")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        day_vote = DayVote()
+        self.last_latency = {}
+
+        async def request_vote(voter: Player) -> Optional[Vote]:
+            # 排队时间不计入超时
+            async with semaphore:
+                start_time = time.perf_counter()
+                finished = threading.Event()
+                try:
+                    result = await asyncio.wait_for(asyncio.to_thread(self._run_vote, voter, candidates, finished),
+                                                    self.vote_timeout)
+                except asyncio.TimeoutError:
+                    # 线程无法取消，超时后结果直接丢弃，并记下该玩家直到线程结束
+                    logger.warning(f"玩家 {voter.id} 投票超时，视为弃票")
+                    self._abandoned[voter.id] = finished
+                    result = None
+                except Exception as e:
+                    logger.warning(f"玩家 {voter.id} 投票失败，视为弃票: {e}")
+                    result = None
+                finally:
+                    self.last_latency[voter.id] = time.perf_counter() - start_time
+            return self._to_vote(game_state, voter, result, candidates)
+
+        tasks = [asyncio.create_task(request_vote(voter)) for voter in voters]
+        for finished in asyncio.as_completed(tasks):
+            vote = await finished
+            if vote is not None:
+                day_vote.add_vote_record(vote.voter_id, vote)
+
+        # 完成顺序不确定，按座位顺序重排投票和弃票，保证统计结果可复现
+        day_vote.vote = {voter.id: day_vote.vote[voter.id] for voter in voters if voter.id in day_vote.vote}
+        day_vote.abstentions = [voter.id for voter in eligible if voter.id not in day_vote.vote]
+        return day_vote
+
+    def is_abandoned(self, player_id: str) -> bool:
+        """该玩家是否有超时被放弃、但线程仍在运行的投票"""
+        finished = self._abandoned.get(player_id)
+        if finished is None:
+            return False
+        if finished.is_set():
+            del self._abandoned[player_id]
+            return False
+        return True
+
+    def _run_vote(self, voter: Player, candidates: Optional[List[str]], finished: threading.Event) -> Union[Vote, str, None]:
+        try:
+            return self.vote_fn(voter, candidates)
+        finally:
+            finished.set()
+
+    def _to_vote(self, game_state: GameState, voter: Player, result: Union[Vote, str, None],
+                 candidates: Optional[List[str]] = None) -> Optional[Vote]:
+        """校验投票结果，目标无效时弃票"""
+        if isinstance(result, Vote):
+            vote = result
+        elif result:
+            vote = Vote(voter_id=voter.id, target_id=str(result), reason="")
+        else:
+            return None
+
+        if vote.target_id == voter.id or not game_state.is_alive(vote.target_id) \
+                or (candidates and vote.target_id not in candidates):
+            logger.warning(f"玩家 {voter.id} 的投票目标 {vote.target_id} 无效，视为弃票")
+            return None
+        vote.voter_id = voter.id
+        return vote
+
+
+# 单局计票结果
+class TallyResult:
+
+    def __init__(self, counts: Dict[str, float], leaders: List[str], voted_out: Optional[str],
+                 pk_candidates: Optional[List[str]] = None):
+        self.counts = counts # 目标 -> 票数（含票权）
+        self.leaders = leaders # 票数最多的玩家，按第一次被投票的顺序
+        self.voted_out = voted_out # 出局玩家，平票按规则处理后仍可能为None
+        self.pk_candidates = pk_candidates or [] # 需要PK的平票者
+
+    @property
+    def is_tie(self) -> bool:
+        return len(self.leaders) > 1
+
+
+class VoteTally:
+
+    def __init__(self, tie_rule: str = TIE_PK, seed: Optional[int] = None):
+        if tie_rule not in TIE_RULES:
+            raise ValueError(f"未知的平票规则: {tie_rule}")
+        self.tie_rule = tie_rule
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+
+    def tally(self, day_vote: Union[DayVote, Dict[str, Vote]], tie_rule: Optional[str] = None) -> TallyResult:
+        """统计一局投票（按投票顺序一次遍历），tie_rule默认使用构造时的规则"""
+        tie_rule = tie_rule or self.tie_rule
+        votes = day_vote.vote if isinstance(day_vote, DayVote) else day_vote
+        counts: Dict[str, float] = {}
+        for vote in votes.values():
+            counts[vote.target_id] = counts.get(vote.target_id, 0.0) + vote.weight
+        if not counts:
+            return TallyResult(counts, [], None)
+
+        max_votes = max(counts.values())
+        leaders = [target for target, count in counts.items() if count == max_votes] # dict保持第一次被投的顺序
+        if len(leaders) == 1 or tie_rule == TIE_FIRST:
+            return TallyResult(counts, leaders, leaders[0])
+        if tie_rule == TIE_RANDOM:
+            return TallyResult(counts, leaders, self.rng.choice(leaders))
+        if tie_rule == TIE_PK:
+            return TallyResult(counts, leaders, None, pk_candidates=leaders)
+        return TallyResult(counts, leaders, None)
+
+    def tally_batch(self, votes: np.ndarray, weights: Optional[np.ndarray] = None,
+                    tie_rule: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量计票，不逐局循环
+
+        Args:
+            votes: (局数, 玩家数) 每个座位投给的座位下标，-1为弃票；投票顺序即座位顺序
+            weights: 票权，形状为 (玩家数,) 或 (局数, 玩家数)，默认每人1票
+            tie_rule: 批量计票无法进行PK轮，TIE_PK与TIE_NONE相同（平票局可通过返回的ties另行处理）
+        Returns:
+            (出局座位下标数组，-1为无人出局; 是否平票的布尔数组)
+        """
+        tie_rule = tie_rule or self.tie_rule
+        n_games, n_players = votes.shape
+        if weights is None:
+            weights = np.ones(n_players)
+        weights = np.broadcast_to(weights, votes.shape)
+
+        cast = votes >= 0
+        flat_index = (np.arange(n_games)[:, None] * n_players + votes)[cast]
+        counts = np.bincount(flat_index, weights=weights[cast],
+                             minlength=n_games * n_players).reshape(n_games, n_players)
+        first_seen = np.full(n_games * n_players, n_players)
+        np.minimum.at(first_seen, flat_index, np.broadcast_to(np.arange(n_players), votes.shape)[cast])
+        first_seen = first_seen.reshape(n_games, n_players)
+
+        max_votes = counts.max(axis=1)
+        leaders = (counts == max_votes[:, None]) & (max_votes[:, None] > 0)
+        ties = leaders.sum(axis=1) > 1
+        if tie_rule == TIE_RANDOM:
+            scores = self.np_rng.random(leaders.shape) * leaders
+            voted_out = scores.argmax(axis=1)
+        else:
+            voted_out = np.where(leaders, first_seen, n_players).argmin(axis=1)
+            if tie_rule in (TIE_PK, TIE_NONE):
+                voted_out = np.where(ties, -1, voted_out)
+        voted_out = np.where(max_votes > 0, voted_out, -1)
+        return voted_out, ties
+
+    ## ----------- 跨天投票分析 -----------
+    @staticmethod
+    def vote_matrix(record: DayVoteRecord, player_ids: Sequence[str]) -> Tuple[List[int], np.ndarray]:
+        """
+        把投票历史转为 (天数, 投票人, 目标) 的票权矩阵，PK轮不计入
+
+        Returns:
+            (按顺序排列的天数, 矩阵)
+        """
+        days = sorted(record.day_vote)
+        ballots = [list(record.day_vote[day].vote.values()) for day in days]
+        votes = list(chain.from_iterable(ballots))
+        # 先取出投票人、目标和票权数组，座位号用排序后的二分查找一次换算，最后一次性累加进矩阵
+        ids = np.array(player_ids)
+        order = np.argsort(ids)
+        voters = order[np.searchsorted(ids, np.array([vote.voter_id for vote in votes], dtype=ids.dtype), sorter=order)]
+        targets = order[np.searchsorted(ids, np.array([vote.target_id for vote in votes], dtype=ids.dtype), sorter=order)]
+        weights = np.fromiter((vote.weight for vote in votes), dtype=float, count=len(votes))
+        day_index = np.repeat(np.arange(len(days)), [len(day_ballots) for day_ballots in ballots])
+        matrix = np.zeros((len(days), len(player_ids), len(player_ids)))
+        np.add.at(matrix, (day_index, voters, targets), weights)
+        return days, matrix
+
+    @staticmethod
+    def votes_received(matrix: np.ndarray) -> np.ndarray:
+        """(天数, 玩家数) 每天每个玩家得到的票数"""
+        return matrix.sum(axis=1)
+
+    @staticmethod
+    def co_voting(matrix: np.ndarray) -> np.ndarray:
+        """(玩家数, 玩家数) 两名玩家投给同一目标的天数，可用于发现抱团投票"""
+        voted = (matrix > 0).astype(int)
+        return np.einsum("dit,djt->ij", voted, voted)
@@ -3,6 +3,8 @@ from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from typing import List
+import hashlib
+import os
 import re
 
 @CrewBase
@@ -49,6 +51,19 @@ class ContentCrew():
             verbose=True,
         )
 
+    @classmethod
+    def config_fingerprint(cls) -> str:
+        """
+        agents.yaml 和 tasks.yaml 原文的哈希，用作响应缓存键的一部分：
+        修改模型、提示词或任务描述后，之前缓存的章节自动失效
+        """
+        config_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+        digest = hashlib.sha256()
+        for name in ("agents.yaml", "tasks.yaml"):
+            with open(os.path.join(config_dir, name), "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
     @classmethod
     def extract_markdown_content(cls, text: str) -> str:
         """
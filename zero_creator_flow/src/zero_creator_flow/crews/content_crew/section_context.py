@@ -0,0 +1,128 @@
+# src/zero_creator_flow/crews/content_crew/section_context.py
+# 前置章节上下文：紧邻的上一节给全文，更早的章节只给摘要，整体控制在token预算内，
+# 避免每一节都带上之前所有章节的全文（提示词随章节数平方增长）。
+# 每节的摘要在该节完成后立即在后台生成（下一节只需要上一节的全文，摘要要到再下一节才用到），并按内容缓存
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+SummarizeFn = Callable[[str, str, int], str] # (章节标题, 章节内容, 摘要token上限) -> 摘要
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token：中文字符按1个token，其余按4个字符1个token"""
+    cjk = len(re.findall(r"[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]", text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """截断到token预算以内"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+
+def extractive_summary(title: str, content: str, max_tokens: int) -> str:
+    """不调用LLM的摘要：各级小标题加上正文开头"""
+    headings = [line.lstrip("#").strip() for line in content.splitlines() if line.startswith("#")]
+    body = " ".join(line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#"))
+    summary = f"小标题：{' / '.join(headings)}。{body}" if headings else body
+    return truncate_tokens(summary, max_tokens)
+
+
+class SectionContext:
+    """已完成章节的压缩上下文"""
+
+    def __init__(self, token_budget: int = 2000, summary_tokens: int = 150,
+                 summarize_fn: Optional[SummarizeFn] = None, cache_path: Optional[str] = None):
+        """
+        Args:
+            token_budget: 前置章节上下文的token预算，摘要部分最多占一半
+            summary_tokens: 每节摘要的token上限
+            summarize_fn: 摘要函数，默认取小标题和正文开头；失败时退回默认摘要
+            cache_path: 摘要缓存文件，相同内容的章节重新运行时不再生成摘要
+        """
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarize_fn = summarize_fn or extractive_summary
+        self.cache_path = cache_path
+        self._cache: Dict[str, str] = self._load_cache()
+        self._sections: List[Tuple[str, str, Future]] = [] # (标题, 全文, 摘要)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="section-summary")
+        self.summaries_generated = 0
+        self.summary_cache_hits = 0
+
+    def add(self, title: str, content: str) -> None:
+        """记录一节完成的内容，并在后台生成摘要"""
+        key = hashlib.sha256(f"{title}\n{content}".encode("utf-8")).hexdigest()
+        if key in self._cache:
+            self.summary_cache_hits += 1
+            summary: Future = Future()
+            summary.set_result(self._cache[key])
+        else:
+            summary = self._executor.submit(self._summarize, key, title, content)
+        self._sections.append((title, content, summary))
+
+    def render(self) -> str:
+        """下一节的前置章节上下文"""
+        if not self._sections:
+            return "尚未撰写任何章节。"
+        *earlier, (last_title, last_content, _) = self._sections
+        parts = ["# 已完成章节"]
+        budget = self.token_budget
+        if earlier:
+            # 摘要从最近的章节往前取，超出预算的一半时省略更早的章节
+            lines, used = [], 0
+            for title, _, summary in reversed(earlier):
+                line = f"- {title}：{summary.result()}"
+                if used + estimate_tokens(line) > self.token_budget // 2:
+                    break
+                lines.insert(0, line)
+                used += estimate_tokens(line)
+            omitted = len(earlier) - len(lines)
+            header = "## 更早章节摘要" + (f"（另有{omitted}节已省略）" if omitted else "")
+            parts.append("\n".join([header, *lines]))
+            budget -= used
+        parts.append(f"## {last_title}（上一节全文）\n\n{truncate_tokens(last_content, max(budget, 0))}")
+        return "\n\n".join(parts)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._save_cache()
+
+    ## ----------- 辅助小函数 -----------
+    def _summarize(self, key: str, title: str, content: str) -> str:
+        try:
+            summary = self.summarize_fn(title, content, self.summary_tokens)
+        except Exception as e:
+            print(f"章节摘要生成失败，使用默认摘要：{e}")
+            summary = extractive_summary(title, content, self.summary_tokens)
+        summary = truncate_tokens(summary.strip(), self.summary_tokens)
+        self._cache[key] = summary
+        self.summaries_generated += 1
+        return summary
+
+    def _load_cache(self) -> Dict[str, str]:
+        if self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _save_cache(self) -> None:
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f, indent=2, ensure_ascii=False)
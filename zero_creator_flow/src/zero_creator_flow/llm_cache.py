@@ -0,0 +1,160 @@
+# src/zero_creator_flow/llm_cache.py
+# LLM响应缓存：以 模型 + 消息 + 参数 的哈希为键，把响应和token用量存进本地SQLite。
+# 总大小超出上限时按最近使用时间淘汰（LRU），可选过期时间。
+# 同一主题重复运行、只修改部分输入时，未变化的大纲、章节和摘要直接从缓存返回
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from crewai import LLM
+from crewai.agents.agent_builder.utilities.base_token_process import TokenProcess
+from crewai.utilities.token_counter_callback import TokenCalcHandler
+
+
+class LLMResponseCache:
+    """内容寻址的本地LLM响应缓存"""
+
+    def __init__(self, path: str = ".cache/llm_responses.sqlite", max_bytes: int = 200 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None):
+        """
+        Args:
+            path: SQLite文件路径
+            max_bytes: 缓存响应的总大小上限，超出时淘汰最久未使用的条目
+            ttl_seconds: 条目的有效期，None表示不过期
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock() # 并行撰写时多个线程同时读写
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, usage TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+
+    @staticmethod
+    def key(model: str, messages: Any, **params: Any) -> str:
+        payload = json.dumps({"model": model, "messages": messages, "params": params},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中时返回 {"response": 响应, "usage": 生成时的token用量}"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, usage, created_at FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[2] > self.ttl_seconds:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            usage = json.loads(row[1])
+            self.hits += 1
+            self.saved_prompt_tokens += usage.get("prompt_tokens", 0)
+            self.saved_completion_tokens += usage.get("completion_tokens", 0)
+            return {"response": row[0], "usage": usage}
+
+    def put(self, key: str, response: str, usage: Optional[Dict[str, Any]] = None) -> None:
+        """超过总大小上限的单个响应不缓存，否则淘汰时会连同它在内清空整个缓存"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, usage, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response, json.dumps(usage or {}), size, now, now)
+            )
+            self._evict()
+            self._db.commit()
+
+    # 带缓存的 LLM.call：未命中时通过回调记录这次调用的token用量。
+    # validate 在写入缓存前校验响应（例如解析JSON），抛出异常时不缓存并把异常交给调用方；
+    # 命中的旧条目校验不通过时删除后重新请求
+    def call(self, llm: LLM, messages: List[Dict[str, str]],
+             validate: Optional[Callable[[str], Any]] = None) -> str:
+        key = self.request_key(llm, messages)
+        cached = self.get(key)
+        if cached is not None:
+            try:
+                if validate is not None:
+                    validate(cached["response"])
+                return cached["response"]
+            except Exception:
+                self.delete(key)
+        token_process = TokenProcess()
+        response = llm.call(messages=messages, callbacks=[TokenCalcHandler(token_process)])
+        if isinstance(response, str):
+            if validate is not None:
+                validate(response)
+            self.put(key, response, {"prompt_tokens": token_process.prompt_tokens,
+                                     "completion_tokens": token_process.completion_tokens})
+        return response
+
+    def request_key(self, llm: LLM, messages: List[Dict[str, str]]) -> str:
+        """以实际发给模型的请求参数（max_tokens、top_p、base_url、response_format等）为键，不含密钥和回调"""
+        params = llm._prepare_completion_params(messages)
+        for name in ("messages", "api_key", "callbacks"):
+            params.pop(name, None)
+        return self.key(params.pop("model", llm.model), messages, **params)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+            "saved_completion_tokens": self.saved_completion_tokens,
+            "entries": entries,
+            "size_kb": round(size / 1024, 1),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    ## ----------- 辅助小函数 -----------
+    def _evict(self) -> None:
+        """总大小超出上限时，按最近使用时间从旧到新淘汰"""
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evicted += 1
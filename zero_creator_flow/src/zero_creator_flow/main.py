@@ -1,11 +1,19 @@
 #!/usr/bin/env python
+import argparse
+import asyncio
 import json
 import os
-from typing import List, Dict
+import sys
+import time
+from typing import Any, Callable, List, Dict, Optional
 from pydantic import BaseModel, Field
 from crewai import LLM
 from crewai.flow.flow import Flow, listen, start
 from zero_creator_flow.crews.content_crew.content_crew import ContentCrew
+from zero_creator_flow.crews.content_crew.section_context import SectionContext, estimate_tokens
+from zero_creator_flow.llm_cache import LLMResponseCache
+from crewai.crews.crew_output import CrewOutput
+from crewai.types.usage_metrics import UsageMetrics
 
 # 定义结构化数据模型
 class Section(BaseModel):
@@ -36,8 +44,25 @@ class GuideOutline(BaseModel):
 class GuideCreatorState(BaseModel):
     topic: str = ""
     audience_level: str = ""
-    guide_outline: GuideOutline = None
+    guide_outline: Optional[GuideOutline] = None
     sections_content: Dict[str, str] = {}
+    # 并行撰写：各章节以大纲中的兄弟章节简介代替前文，同时撰写，最后做一次轻量的一致性处理
+    parallel: bool = False
+    max_concurrency: int = 3
+    consistency_pass: bool = True
+    consistency_model: str = "deepseek/deepseek-chat"
+    section_seconds: Dict[str, float] = {} # 每节撰写耗时
+    # 串行撰写的前置章节上下文：上一节全文 + 更早章节的摘要，控制在token预算内；关闭时带上所有前置章节全文
+    compact_context: bool = True
+    context_tokens: int = 2000
+    summary_model: str = "deepseek/deepseek-chat"
+    section_tokens: Dict[str, Dict[str, int]] = {} # 每节的前置上下文token与实际提示词token
+    timings: Dict[str, float] = {}
+    # LLM响应缓存：大纲、章节、摘要和一致性处理在输入不变时直接复用之前的结果
+    use_cache: bool = True
+    cache_path: str = ".cache/llm_responses.sqlite"
+    cache_max_mb: float = 200
+    cache_ttl_hours: Optional[float] = None
 
 class GuideCreatorFlow(Flow[GuideCreatorState]):
     """创建综合指南的流程"""
@@ -92,8 +117,8 @@ class GuideCreatorFlow(Flow[GuideCreatorState]):
             """}
         ]
 
-        # 调用 LLM 并获取 JSON 格式响应
-        response = llm.call(messages=messages)
+        # 调用 LLM 并获取 JSON 格式响应，无法解析成大纲的响应不写入缓存
+        response = self._call_llm(llm, messages, validate=lambda text: GuideOutline(**json.loads(text)))
 
         # 解析 JSON 响应
         outline_dict = json.loads(response)
@@ -110,37 +135,17 @@ class GuideCreatorFlow(Flow[GuideCreatorState]):
         return self.state.guide_outline
 
     @listen(create_guide_outline)
-    def write_and_compile_guide(self, outline):
+    async def write_and_compile_guide(self, outline):
         """撰写各章节并汇总生成最终指南"""
         print("正在撰写章节并汇总指南...")
-        completed_sections = []
-
-        # 逐节处理以保持上下文
-        for section in outline.sections:
-            print(f"正在处理章节：{section.title}")
-
-            # 构建前置章节内容
-            if completed_sections:
-                previous_sections_text = "# 已完成章节\n\n"
-                for title in completed_sections:
-                    previous_sections_text += f"## {title}\n\n"
-                    previous_sections_text += self.state.sections_content.get(title, "") + "\n\n"
-            else:
-                previous_sections_text = "尚未撰写任何章节。"
-
-            # 调用 ContentCrew 生成本节内容
-            result = ContentCrew().crew().kickoff(inputs={
-                "section_title": section.title,
-                "section_description": section.description,
-                "audience_level": self.state.audience_level,
-                "previous_sections": previous_sections_text,
-                "draft_content": ""
-            })
-
-            # 存储章节内容
-            self.state.sections_content[section.title] = ContentCrew.extract_markdown_content(result.raw)
-            completed_sections.append(section.title)
-            print(f"章节完成：{section.title}")
+        start_time = time.perf_counter()
+        if self.state.parallel:
+            await self._write_sections_parallel(outline)
+            if self.state.consistency_pass:
+                self._consistency_pass(outline)
+        else:
+            self._write_sections_sequential(outline)
+        self._report_timings(time.perf_counter() - start_time)
 
         # 汇总最终指南
         guide_content = f"# {outline.title}\n\n"
@@ -156,12 +161,229 @@ class GuideCreatorFlow(Flow[GuideCreatorState]):
             f.write(guide_content)
 
         print("\n完整指南已保存至 output/complete_guide.md")
+        self._close_llm_cache()
         return "指南创建完成"
 
+    def _write_sections_sequential(self, outline):
+        completed_sections = []
+        section_context = None
+        if self.state.compact_context:
+            section_context = SectionContext(token_budget=self.state.context_tokens, summarize_fn=self._summarize_section,
+                                             cache_path="output/section_summaries.json")
+
+        try:
+            # 逐节处理以保持上下文
+            for section in outline.sections:
+                print(f"正在处理章节：{section.title}")
+
+                # 构建前置章节内容
+                if section_context is not None:
+                    previous_sections_text = section_context.render()
+                elif completed_sections:
+                    previous_sections_text = "# 已完成章节\n\n"
+                    for title in completed_sections:
+                        previous_sections_text += f"## {title}\n\n"
+                        previous_sections_text += self.state.sections_content.get(title, "") + "\n\n"
+                else:
+                    previous_sections_text = "尚未撰写任何章节。"
+
+                # 调用 ContentCrew 生成本节内容
+                section_start = time.perf_counter()
+                result = self._kickoff_content_crew(self._section_inputs(section, previous_sections_text))
+
+                # 存储章节内容
+                self.state.sections_content[section.title] = ContentCrew.extract_markdown_content(result.raw)
+                self.state.section_seconds[section.title] = time.perf_counter() - section_start
+                completed_sections.append(section.title)
+                if section_context is not None:
+                    section_context.add(section.title, self.state.sections_content[section.title])
+                self._record_section_tokens(section.title, previous_sections_text, result)
+        finally:
+            if section_context is not None:
+                section_context.close()
+                print(f"章节摘要：生成 {section_context.summaries_generated} 个，缓存命中 {section_context.summary_cache_hits} 个")
+
+    async def _write_sections_parallel(self, outline):
+        """各章节只依赖大纲，在并发上限内同时撰写"""
+        semaphore = asyncio.Semaphore(self.state.max_concurrency)
+
+        async def write(section: Section):
+            async with semaphore:
+                print(f"正在处理章节：{section.title}")
+                section_start = time.perf_counter()
+                sibling_context = self._sibling_context(outline, section)
+                result = await asyncio.to_thread(self._kickoff_content_crew, self._section_inputs(section, sibling_context))
+                self.state.sections_content[section.title] = ContentCrew.extract_markdown_content(result.raw)
+                self.state.section_seconds[section.title] = time.perf_counter() - section_start
+                self._record_section_tokens(section.title, sibling_context, result)
+
+        await asyncio.gather(*(write(section) for section in outline.sections))
+
+    def _consistency_pass(self, outline):
+        """
+        并行撰写的章节互相看不到正文，这里用一次LLM调用，根据各章节的标题和开头
+        为每节生成承上启下的过渡语，插在章节标题之后
+        """
+        print("正在进行章节一致性处理...")
+        consistency_start = time.perf_counter()
+        excerpts = []
+        for section in outline.sections:
+            content = self.state.sections_content.get(section.title, "")
+            headings = [line.strip() for line in content.splitlines() if line.startswith("#")]
+            excerpts.append(f"## {section.title}\n小标题：{' / '.join(headings[:8])}\n开头：{content[:300]}")
+        messages = [
+            {"role": "system", "content": "你是一个专门输出 JSON 的助手，不要输出任何解释性文字或额外字符。"},
+            {"role": "user", "content": (
+                f"以下是指南《{outline.title}》（面向 {self.state.audience_level} 级别学习者）各章节的小标题和开头，"
+                f"这些章节是分别撰写的。\n\n" + "\n\n".join(excerpts) + "\n\n"
+                "请为每个章节写一到两句承上启下的过渡语：衔接上一章的内容。"
+                "输出一个 JSON 对象，键为章节标题，值为过渡语。"
+            )}
+        ]
+        try:
+            response = self._call_llm(LLM(model=self.state.consistency_model), messages,
+                                      validate=self._parse_transitions)
+            transitions = self._parse_transitions(response)
+        except Exception as e:
+            print(f"一致性处理失败，保留原章节：{e}")
+            return
+        for title, transition in transitions.items():
+            content = self.state.sections_content.get(title)
+            if content is None or not transition:
+                continue
+            lines = content.splitlines()
+            if lines and lines[0].startswith("#"):
+                self.state.sections_content[title] = "\n".join([lines[0], "", f"*{transition}*", *lines[1:]])
+            else:
+                self.state.sections_content[title] = f"*{transition}*\n\n{content}"
+        self.state.timings["consistency_seconds"] = time.perf_counter() - consistency_start
+
+    @staticmethod
+    def _parse_transitions(response: str) -> Dict[str, str]:
+        transitions = json.loads(response[response.index("{"):response.rindex("}") + 1])
+        if not isinstance(transitions, dict):
+            raise ValueError("过渡语不是 JSON 对象")
+        return transitions
+
+    def _summarize_section(self, title: str, content: str, max_tokens: int) -> str:
+        messages = [
+            {"role": "system", "content": "你是一位教育内容编辑，只输出摘要本身，不要输出其他文字。"},
+            {"role": "user", "content": f"请用不超过{max_tokens}字概括章节「{title}」讲解的关键概念、示例和结论：\n\n{content}"}
+        ]
+        return self._call_llm(LLM(model=self.state.summary_model), messages)
+
+    ## ----------- LLM响应缓存 -----------
+    def _llm_cache(self) -> Optional[LLMResponseCache]:
+        """首次使用时打开缓存，关闭缓存时返回None"""
+        if not self.state.use_cache:
+            return None
+        if getattr(self, "_response_cache", None) is None:
+            ttl = self.state.cache_ttl_hours * 3600 if self.state.cache_ttl_hours else None
+            self._response_cache = LLMResponseCache(self.state.cache_path, int(self.state.cache_max_mb * 1024 * 1024), ttl)
+        return self._response_cache
+
+    def _close_llm_cache(self):
+        if getattr(self, "_response_cache", None) is not None:
+            self._response_cache.close()
+            self._response_cache = None
+
+    def _call_llm(self, llm: LLM, messages: List[Dict[str, str]],
+                  validate: Optional[Callable[[str], Any]] = None) -> str:
+        cache = self._llm_cache()
+        return cache.call(llm, messages, validate) if cache is not None else llm.call(messages=messages)
+
+    def _kickoff_content_crew(self, inputs: Dict[str, str]) -> CrewOutput:
+        """运行 ContentCrew；缓存键包含agent和任务配置文件的哈希（含模型和提示词）以及本节输入"""
+        cache = self._llm_cache()
+        if cache is None:
+            return ContentCrew().crew().kickoff(inputs=inputs)
+        key = cache.key("content_crew", ContentCrew.config_fingerprint(), **inputs)
+        cached = cache.get(key)
+        if cached is not None:
+            return CrewOutput(raw=cached["response"], token_usage=UsageMetrics(**cached["usage"]))
+        result = ContentCrew().crew().kickoff(inputs=inputs)
+        cache.put(key, result.raw, result.token_usage.model_dump())
+        return result
+
+    def _record_section_tokens(self, title: str, previous_sections: str, result):
+        """前置上下文会同时进入撰写和审稿两个任务的提示词"""
+        usage = getattr(result, "token_usage", None)
+        tokens = {
+            "context_tokens": estimate_tokens(previous_sections),
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        }
+        self.state.section_tokens[title] = tokens
+        print(f"章节完成：{title}（前置上下文约 {tokens['context_tokens']} tokens，提示词 {tokens['prompt_tokens']} tokens）")
+
+    def _section_inputs(self, section: Section, previous_sections: str) -> Dict[str, str]:
+        return {
+            "section_title": section.title,
+            "section_description": section.description,
+            "audience_level": self.state.audience_level,
+            "previous_sections": previous_sections,
+            "draft_content": ""
+        }
+
+    @staticmethod
+    def _sibling_context(outline: GuideOutline, current: Section) -> str:
+        """并行撰写时代替前文：整份大纲中各章节的简介"""
+        lines = [f"（各章节同时撰写，以下是指南《{outline.title}》的章节结构，代替已完成章节的正文）", ""]
+        for section in outline.sections:
+            mark = "（本节）" if section is current else ""
+            lines.append(f"- {section.title}{mark}：{section.description}")
+        lines.append("")
+        lines.append("请只撰写本节内容，不要展开其他章节的主题，需要时可以提及相关章节。")
+        return "\n".join(lines)
+
+    def _report_timings(self, elapsed: float):
+        """
+        章节撰写的端到端耗时，串行模式下即实测的串行耗时；
+        并行模式下各节耗时之和只是串行耗时的估算（并发时单节耗时受限流影响，串行时提示词还会包含前文），
+        需要实测时用串行模式再运行一次对比
+        """
+        section_sum = sum(self.state.section_seconds.values())
+        self.state.timings["writing_seconds"] = elapsed
+        if self.state.parallel:
+            self.state.timings["estimated_serial_seconds"] = section_sum
+            print(f"\n章节撰写耗时（并行，并发 {self.state.max_concurrency}）：{elapsed:.1f}s，"
+                  f"各节耗时之和（串行耗时估算，未实测）：{section_sum:.1f}s")
+        else:
+            self.state.timings["serial_seconds"] = elapsed
+            print(f"\n章节撰写耗时（串行，实测）：{elapsed:.1f}s")
+        cache = self._llm_cache()
+        cache_stats = cache.stats() if cache is not None else None
+        if cache_stats:
+            print(f"响应缓存：命中率 {cache_stats['hit_rate']:.0%}（{cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}），"
+                  f"节省 {cache_stats['saved_prompt_tokens']} 提示词 tokens、{cache_stats['saved_completion_tokens']} 输出 tokens")
+        with open("output/guide_timings.json", "w", encoding="utf-8") as f:
+            json.dump({"parallel": self.state.parallel, **self.state.timings,
+                       "section_seconds": self.state.section_seconds,
+                       "section_tokens": self.state.section_tokens,
+                       "cache": cache_stats}, f, indent=2, ensure_ascii=False)
+
 
 def kickoff():
     """启动指南创建流程"""
-    GuideCreatorFlow().kickoff()
+    parser = argparse.ArgumentParser(description="创建综合指南")
+    parser.add_argument("--parallel", action="store_true", help="各章节并发撰写")
+    parser.add_argument("-c", "--concurrency", type=int, default=3, help="并行撰写时同时进行的章节数上限")
+    parser.add_argument("--no-consistency-pass", action="store_true", help="并行撰写后不做章节一致性处理")
+    parser.add_argument("--context-tokens", type=int, default=2000, help="串行撰写时前置章节上下文的token预算")
+    parser.add_argument("--full-context", action="store_true", help="串行撰写时带上所有前置章节的全文")
+    parser.add_argument("--no-cache", action="store_true", help="不使用LLM响应缓存")
+    parser.add_argument("--cache-ttl-hours", type=float, default=None, help="缓存条目的有效期（小时），默认不过期")
+    parser.add_argument("--cache-max-mb", type=float, default=200, help="缓存总大小上限，超出时淘汰最久未使用的条目")
+    args = parser.parse_args(sys.argv[1:])
+    GuideCreatorFlow().kickoff(inputs={
+        "parallel": args.parallel,
+        "max_concurrency": args.concurrency,
+        "consistency_pass": not args.no_consistency_pass,
+        "context_tokens": args.context_tokens,
+        "compact_context": not args.full_context,
+        "use_cache": not args.no_cache,
+        "cache_ttl_hours": args.cache_ttl_hours,
+        "cache_max_mb": args.cache_max_mb,
+    })
     print("\n=== 流程完成 ===")
     print("你的综合指南已保存在 output 目录。")
     print("打开 output/complete_guide.md 查看。")